@@ -1,4 +1,4 @@
-from typing import Optional, Type
+from typing import Any, List, Optional, Type
 from langchain.tools import (
     Tool,
     DuckDuckGoSearchRun,
@@ -21,17 +21,28 @@ from langchain_community.utilities import (
 )
 
 class KnowledgeBaseTool(BaseTool):
+    """在知识库中检索
+
+    集合经 ChromaStore.create_collection 按知识库配置的嵌入模型创建，查询嵌入与知识库搜索、
+    对话检索共用同一份查询缓存；异步调用时未命中的查询经微批合并器计算。
+    """
     name = "knowledge_base_search"
     description = "Search the knowledge base for relevant information"
-    
-    def __init__(self, vector_store):
-        super().__init__()
-        self.vector_store = vector_store
+    store: Any
+    kb_id: str
+    embedding_model: Optional[str] = None
+    k: int = 4
         
     def _run(self, query: str) -> str:
-        results = self.vector_store.similarity_search(query)
+        collection = self.store.create_collection(self.kb_id, self.embedding_model)
+        results = collection.similarity_search(query, k=self.k)
         return "\n".join([doc.page_content for doc in results])
 
+    async def _arun(self, query: str) -> str:
+        results = await self.store.asimilarity_search(self.kb_id, query, k=self.k,
+                                                      embedding_model=self.embedding_model)
+        return "\n".join([result["content"] for result in results])
+
 def get_default_tools() -> List[Tool]:
     """Get a list of default tools for agents."""
     return [
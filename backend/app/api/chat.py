@@ -3,6 +3,7 @@ from pydantic import BaseModel
 from typing import Optional, List, Dict
 import uuid
 from ..services.chat_service import ChatService
+from .knowledge import knowledge_bases_store
 
 router = APIRouter()
 chat_service = ChatService()
@@ -34,13 +35,15 @@ async def chat(
         if not conversation_id:
             conversation_id = str(uuid.uuid4())
             if collection_name:
+                kb = knowledge_bases_store.get(collection_name) or {}
                 chat_service.create_conversation(
                     conversation_id,
-                    collection_name
+                    collection_name,
+                    kb.get("embedding_model")
                 )
         
         # Process message and files
-        response = chat_service.chat(
+        response = await chat_service.chat(
             conversation_id,
             message,
             files
@@ -57,7 +60,7 @@ async def chat(
 async def update_message(message_id: str, update: MessageUpdate):
     """Update a message"""
     try:
-        updated_message = chat_service.update_message(message_id, update.content)
+        updated_message = await chat_service.update_message(message_id, update.content)
         return {"message": updated_message}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,21 +1,39 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-from typing import List, Optional
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import mimetypes
 import os
 import uuid
+import zipfile
 from datetime import datetime
 from ..services.knowledge_service import KnowledgeService
+from ..services.ingest_jobs import IngestWorkerPool
+from ..services.upload_storage import UploadTooLarge, extract_archive, save_upload
+from ..core.config import settings
+from ..core.log import get_logger
+from ..vectorstore.quantized_store import QUANTIZED_STORAGE_TYPES
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from ..database import get_db
 from ..auth import get_current_user, User
 
+logger = get_logger(__name__)
+
 router = APIRouter()
 knowledge_service = KnowledgeService()
+ingest_pool = IngestWorkerPool(settings.ingest_max_jobs, finished_ttl=settings.ingest_job_ttl,
+                               max_finished=settings.ingest_max_finished_jobs)
 
 # Create upload directory if it doesn't exist
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# 入库时随分段一并统计、记录在文档上的文本指标
+DOCUMENT_STAT_FIELDS = ("word_count", "char_count", "cjk_count", "token_count")
+
 # Pydantic models
 class SearchQuery(BaseModel):
     collection_name: str
@@ -39,6 +57,8 @@ class CreateKnowledgeBaseRequest(BaseModel):
     custom_separators: str = ""
     cleaning_rules: Optional[List[str]] = None
     metadata_fields: Optional[List[str]] = None
+    vector_storage: str = "float32"  # float32 / float16 / int8
+    dedup_threshold: float = 0.0  # 近似去重的 SimHash 相似度阈值，0 表示不去重
 
 class KnowledgeBaseResponse(BaseModel):
     id: str
@@ -66,8 +86,17 @@ class DocumentResponse(BaseModel):
     created_at: str
     updated_at: str
     chunk_count: int = 0
+    duplicate_chunks: int = 0
     word_count: int = 0
-    status: str = "completed"
+    char_count: int = 0  # 提取出的文本字符数
+    cjk_count: int = 0  # 其中的 CJK 字符数
+    token_count: int = 0  # WordPiece token 数，按字符数分段且未开启 DOCUMENT_TOKEN_STATS 时为 0
+    encoding: Optional[str] = None  # 文本文件检测到的编码，相同内容再次处理时直接使用
+    content_hash: Optional[str] = None  # 上传内容的 SHA-256
+    reused_from: Optional[str] = None  # 分段和向量复制自的文档 id
+    batch_id: Optional[str] = None  # 批量上传时所属的后台任务 id
+    status: str = "completed"  # processing / completed / failed
+    error: Optional[str] = None
     tags: Optional[List[str]] = None
 
 class KnowledgeBaseListResponse(BaseModel):
@@ -99,6 +128,10 @@ async def create_knowledge_base(
     current_user: User = Depends(get_current_user)
 ):
     """创建知识库"""
+    if request.vector_storage != "float32" and request.vector_storage not in QUANTIZED_STORAGE_TYPES:
+        raise HTTPException(status_code=400, detail=f"不支持的向量存储类型: {request.vector_storage}")
+    if not 0.0 <= request.dedup_threshold <= 1.0:
+        raise HTTPException(status_code=400, detail=f"去重阈值必须在 0 到 1 之间: {request.dedup_threshold}")
     kb_id = str(uuid.uuid4())
     now = datetime.now().isoformat()
     
@@ -126,6 +159,8 @@ async def create_knowledge_base(
         "custom_separators": request.custom_separators,
         "cleaning_rules": ','.join(request.cleaning_rules) if request.cleaning_rules else "",
         "metadata_fields": request.metadata_fields,
+        "vector_storage": request.vector_storage,
+        "dedup_threshold": request.dedup_threshold,
     }
     
     knowledge_bases_store[kb_id] = knowledge_base
@@ -207,7 +242,10 @@ async def delete_knowledge_base(
     kb_docs = [doc_id for doc_id, doc in documents_store.items() 
                if doc["knowledge_base_id"] == kb_id]
     for doc_id in kb_docs:
-        del documents_store[doc_id]
+        batch_id = documents_store.pop(doc_id).get("batch_id")
+        ingest_pool.forget(doc_id)
+        if batch_id:
+            ingest_pool.forget(batch_id)
     
     del knowledge_bases_store[kb_id]
     return {"data": {"message": "Knowledge base deleted successfully"}}
@@ -244,90 +282,337 @@ async def upload_document(
     if kb["owner_id"] != current_user.username:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    file_path = None
+    # 保存文件
+    doc_id = str(uuid.uuid4())
+    file_path = os.path.join(UPLOAD_DIR, f"{doc_id}_{file.filename}")
     try:
-        # 保存文件
-        doc_id = str(uuid.uuid4())
-        file_path = os.path.join(UPLOAD_DIR, f"{doc_id}_{file.filename}")
-        
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
-        # 准备处理参数，确保清洗规则是字符串类型
-        kb_cleaning_rules = kb.get("cleaning_rules", "")
-        if isinstance(kb_cleaning_rules, list):
-            kb_cleaning_rules = ','.join(kb_cleaning_rules)
-        elif not isinstance(kb_cleaning_rules, str):
-            kb_cleaning_rules = str(kb_cleaning_rules) if kb_cleaning_rules else ""
-        
-        # 使用知识库的分段配置处理文档
-        knowledge_service.process_document(
+        # 分块流式写盘并顺带计算内容哈希，超过大小限制时立即拒绝
+        size, content_hash = await save_upload(file, file_path, settings.max_file_size)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Document upload failed: {str(e)}")
+    
+    document, source = register_upload(kb, doc_id, file.filename, file.content_type, file_path, size, content_hash)
+    if document["id"] != doc_id:
+        # 同一知识库中已有相同内容（且分段配置相同）的文档时直接返回该文档
+        return {"data": document}
+    
+    # 文档记录先以 processing 状态返回，解析、分段和嵌入在后台任务池中进行
+    if source is not None:
+        ingest_pool.submit(doc_id, reuse_document, source, kb, file_path, doc_id, content_hash, file.filename,
+                           current_user.username, on_done=_ingest_done(doc_id, kb_id))
+    else:
+        ingest_pool.submit(doc_id, ingest_document, kb, file_path, doc_id, content_hash, file.filename,
+                           current_user.username, on_done=_ingest_done(doc_id, kb_id))
+    return {"data": document}
+
+@router.post("/bases/{kb_id}/documents/batch")
+async def upload_documents_batch(
+    kb_id: str,
+    files: List[UploadFile] = File(...),
+    current_user: User = Depends(get_current_user)
+):
+    """批量上传文档
+
+    接受多个文件或 zip 包（包内允许类型的文件逐个解出）。需要处理的文件合并为一个后台任务，
+    多个文件同时提取和分割，分段共用嵌入批次和一次持久化；重复内容和可复用的文档与单个上传
+    的处理方式相同。按上传顺序返回每个文件的状态：processing、duplicate 或 rejected。
+    """
+    if kb_id not in knowledge_bases_store:
+        raise HTTPException(status_code=404, detail="Knowledge base not found")
+    
+    kb = knowledge_bases_store[kb_id]
+    if kb["owner_id"] != current_user.username:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    allowed_extensions = {f".{ext.lower().lstrip('.')}" for ext in settings.allowed_file_types}
+    entries = []
+    for file in files:
+        filename = os.path.basename(file.filename or "")
+        file_ext = os.path.splitext(filename)[1].lower()
+        if file_ext == ".zip":
+            archive_path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4()}_{filename}")
+            try:
+                await save_upload(file, archive_path, settings.max_archive_size)
+                members = await run_in_threadpool(extract_archive, archive_path, UPLOAD_DIR,
+                                                  allowed_extensions, settings.max_file_size)
+            except (UploadTooLarge, zipfile.BadZipFile) as e:
+                entries.append({"filename": filename, "error": str(e)})
+                continue
+            finally:
+                if os.path.exists(archive_path):
+                    os.remove(archive_path)
+            for member in members:
+                member["content_type"] = mimetypes.guess_type(member["filename"])[0]
+                member["archive"] = filename
+            entries.extend(members)
+            continue
+        if file_ext not in allowed_extensions:
+            entries.append({"filename": filename, "error": f"Unsupported file type: {file_ext or filename}"})
+            continue
+        entry = {"id": str(uuid.uuid4()), "filename": filename, "content_type": file.content_type, "error": None}
+        entry["path"] = os.path.join(UPLOAD_DIR, f"{entry['id']}_{filename}")
+        try:
+            entry["size"], entry["content_hash"] = await save_upload(file, entry["path"], settings.max_file_size)
+        except UploadTooLarge as e:
+            entry["error"] = str(e)
+        entries.append(entry)
+    
+    results = []
+    pending = []
+    for entry in entries:
+        result = {"filename": entry["filename"], "status": "rejected", "document": None, "error": entry["error"]}
+        if entry.get("archive"):
+            result["archive"] = entry["archive"]
+        results.append(result)
+        if entry["error"]:
+            continue
+        document, source = register_upload(kb, entry["id"], entry["filename"], entry["content_type"],
+                                           entry["path"], entry["size"], entry["content_hash"])
+        result["document"] = document
+        if document["id"] != entry["id"]:
+            result["status"] = "duplicate"
+            continue
+        result["status"] = "processing"
+        if source is not None:
+            ingest_pool.submit(document["id"], reuse_document, source, kb, entry["path"], document["id"],
+                               entry["content_hash"], entry["filename"], current_user.username,
+                               on_done=_ingest_done(document["id"], kb_id))
+        else:
+            pending.append(entry)
+    
+    if pending:
+        # 批量任务的进度按 batch_id 记录，各文档在进度接口中共享该任务的阶段和分段进度
+        batch_id = str(uuid.uuid4())
+        for entry in pending:
+            documents_store[entry["id"]]["batch_id"] = batch_id
+        ingest_pool.submit(batch_id, ingest_documents, kb, pending, current_user.username,
+                           on_done=_batch_done([entry["id"] for entry in pending], kb_id))
+    return {"data": {"documents": results}}
+
+def register_upload(kb: dict, doc_id: str, filename: str, content_type: Optional[str], file_path: str,
+                    size: int, content_hash: str) -> Tuple[dict, Optional[dict]]:
+    """登记已写盘的上传文件，返回 (文档记录, 可复用分段的源文档)
+
+    同一知识库已有相同内容（且分段配置相同）时返回已有文档，不创建新记录，并删除上传的文件；
+    否则创建 processing 状态的记录，其他知识库已用相同配置处理过该内容时同时返回源文档。
+    复用时保留上传的文件，源分段已不存在时改为正常入库。
+    """
+    fingerprint = ingest_fingerprint(kb)
+    existing = find_document_by_content(content_hash, fingerprint, kb_id=kb["id"])
+    if existing is not None:
+        os.remove(file_path)
+        return existing, None
+    
+    now = datetime.now().isoformat()
+    document = {
+        "id": doc_id,
+        "knowledge_base_id": kb["id"],
+        "name": filename,
+        "content_type": content_type or "application/octet-stream",
+        "size": size,
+        "content_hash": content_hash,
+        "ingest_fingerprint": fingerprint,
+        "created_at": now,
+        "updated_at": now,
+        "chunk_count": 0,
+        "duplicate_chunks": 0,
+        "encoding": None,
+        "word_count": 0,
+        "char_count": 0,
+        "cjk_count": 0,
+        "token_count": 0,
+        "status": "processing",
+        "error": None,
+        "tags": []
+    }
+    documents_store[doc_id] = document
+    recalculate_kb_stats(kb["id"])
+    
+    # 其他知识库已用相同配置处理过该内容时复制其分段和向量，不再重新提取、分段和嵌入
+    return document, find_document_by_content(content_hash, fingerprint, reusable=True)
+
+def kb_cleaning_rules(kb: dict) -> str:
+    """知识库的清洗规则，统一为逗号分隔的字符串"""
+    rules = kb.get("cleaning_rules", "")
+    if isinstance(rules, list):
+        return ','.join(rules)
+    if not isinstance(rules, str):
+        return str(rules) if rules else ""
+    return rules
+
+def ingest_fingerprint(kb: dict) -> str:
+    """影响分段和向量结果的知识库配置的指纹；内容哈希和指纹都相同的文档可以复用分段"""
+    config = [kb.get("embedding_model"), kb.get("chunk_size", 1000), kb.get("chunk_overlap", 200),
+              kb.get("splitter_type", "recursive"), kb.get("custom_separators", ""),
+              kb.get("length_function", "char_count"), kb.get("keep_separator", True),
+              kb.get("add_start_index", False), kb.get("strip_whitespace", True), kb_cleaning_rules(kb)]
+    return hashlib.sha256(json.dumps(config).encode("utf-8")).hexdigest()
+
+def find_document_by_content(content_hash: str, fingerprint: str, kb_id: Optional[str] = None,
+                             reusable: bool = False) -> Optional[dict]:
+    """按内容哈希和配置指纹查找文档
+
+    指定 kb_id 时只在该知识库中查找（包括仍在处理中的文档）；reusable 时查找可复制分段的
+    源文档：已处理完成，且入库时没有分段被近似去重跳过（否则源集合中的分段不完整）。
+    """
+    for doc in documents_store.values():
+        if doc.get("content_hash") != content_hash or doc.get("ingest_fingerprint") != fingerprint:
+            continue
+        if kb_id is not None:
+            if doc["knowledge_base_id"] == kb_id and doc["status"] != "failed":
+                return doc
+        elif reusable and doc["status"] == "completed" and not doc.get("duplicate_chunks"):
+            return doc
+    return None
+
+def kb_ingest_options(kb: dict) -> dict:
+    """知识库的分段、清洗和向量存储配置，作为 process_document(s) 的关键字参数"""
+    return {
+        "chunk_size": kb.get("chunk_size", 1000),
+        "chunk_overlap": kb.get("chunk_overlap", 200),
+        "splitter_type": kb.get("splitter_type", "recursive"),
+        "custom_separators": kb.get("custom_separators", ""),
+        "length_function": kb.get("length_function", "char_count"),
+        "keep_separator": kb.get("keep_separator", True),
+        "add_start_index": kb.get("add_start_index", False),
+        "strip_whitespace": kb.get("strip_whitespace", True),
+        "cleaning_rules": kb_cleaning_rules(kb),
+        "embedding_model": kb.get("embedding_model"),
+        "vector_storage": kb.get("vector_storage", "float32"),
+        "dedup_threshold": kb.get("dedup_threshold", 0.0),
+    }
+
+def document_stats(result: dict) -> dict:
+    """入库结果中随分段一并统计的文本指标"""
+    return {name: result.get(name, 0) for name in DOCUMENT_STAT_FIELDS}
+
+def remove_upload(file_path: str):
+    """清理临时文件"""
+    if os.path.exists(file_path):
+        try:
+            os.remove(file_path)
+        except Exception as e:
+            logger.warning("Failed to remove temporary file %s: %s", file_path, e)
+
+def ingest_document(kb: dict, file_path: str, doc_id: str, content_hash: str, filename: str, username: str,
+                    progress=None, encoding: Optional[str] = None) -> dict:
+    """后台任务：按知识库的分段配置处理上传文件，返回文档记录需要更新的字段
+
+    encoding 为相同内容此前检测到的文本编码，已知时跳过编码检测。
+    """
+    try:
+        # 使用知识库的分段配置处理文档；document_id 用于之后复用分段
+        ingest_result = knowledge_service.process_document(
             file_path=file_path,
-            collection_name=kb_id,
-            metadata={"filename": file.filename, "uploaded_by": current_user.username},
-            chunk_size=kb.get("chunk_size", 1000),
-            chunk_overlap=kb.get("chunk_overlap", 200),
-            splitter_type=kb.get("splitter_type", "recursive"),
-            custom_separators=kb.get("custom_separators", ""),
-            length_function=kb.get("length_function", "char_count"),
-            keep_separator=kb.get("keep_separator", True),
-            add_start_index=kb.get("add_start_index", False),
-            strip_whitespace=kb.get("strip_whitespace", True),
-            cleaning_rules=kb_cleaning_rules
+            collection_name=kb["id"],
+            metadata={"filename": filename, "uploaded_by": username, "document_id": doc_id,
+                      "content_hash": content_hash},
+            encoding=encoding,
+            progress=progress,
+            **kb_ingest_options(kb)
         )
-        
-        # 创建文档记录
-        now = datetime.now().isoformat()
-        
-        # 计算准确的词数
-        try:
-            # 先尝试UTF-8解码
-            text_content = content.decode('utf-8')
-        except UnicodeDecodeError:
-            # 如果失败，使用错误处理模式
-            text_content = content.decode('utf-8', errors='ignore')
-        
-        # 对于中英文混合文本，使用字符数除以平均字符数来估算词数
-        import re
-        # 计算英文单词数
-        english_words = len(re.findall(r'\b[a-zA-Z]+\b', text_content))
-        # 计算中文字符数（中文字符通常一个字符就是一个词）
-        chinese_chars = len(re.findall(r'[\u4e00-\u9fff]', text_content))
-        # 总词数 = 英文单词数 + 中文字符数
-        total_word_count = english_words + chinese_chars
-        
-        document = {
-            "id": doc_id,
-            "knowledge_base_id": kb_id,
-            "name": file.filename,
-            "content_type": file.content_type or "application/octet-stream",
-            "size": len(content),
-            "created_at": now,
-            "updated_at": now,
-            "chunk_count": 1,  # 简化，实际应该计算
-            "word_count": total_word_count,
-            "status": "completed",
-            "tags": []
+        return {
+            "chunk_count": ingest_result["chunk_count"],
+            "duplicate_chunks": ingest_result["duplicate_chunks"],
+            "encoding": ingest_result["encoding"],
+            **document_stats(ingest_result),
         }
-        
-        documents_store[doc_id] = document
-        
-        # 更新知识库统计
-        recalculate_kb_stats(kb_id)
-        
-        return {"data": document}
-    
-    except Exception as e:
-        print(f"Error processing document {file.filename}: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Document processing failed: {str(e)}")
     finally:
-        # 清理临时文件
-        if file_path and os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-            except Exception as e:
-                print(f"Warning: Failed to remove temporary file {file_path}: {str(e)}")
+        remove_upload(file_path)
+
+def ingest_documents(kb: dict, entries: List[dict], username: str, progress=None) -> List[dict]:
+    """后台任务：一条入库流水线处理批量上传的文件，按 entries 顺序返回各文档记录需要更新的字段"""
+    try:
+        results = knowledge_service.process_documents(
+            [(entry["path"], {"filename": entry["filename"], "uploaded_by": username, "document_id": entry["id"],
+                              "content_hash": entry["content_hash"]}) for entry in entries],
+            collection_name=kb["id"],
+            max_workers=settings.batch_upload_workers,
+            progress=progress,
+            **kb_ingest_options(kb)
+        )
+        return [
+            {
+                "chunk_count": result["chunk_count"],
+                "duplicate_chunks": result["duplicate_chunks"],
+                "encoding": result["encoding"],
+                **document_stats(result),
+                "error": result["error"],
+            }
+            for entry, result in zip(entries, results)
+        ]
+    finally:
+        for entry in entries:
+            remove_upload(entry["path"])
+
+def reuse_document(source: dict, kb: dict, file_path: str, doc_id: str, content_hash: str, filename: str,
+                   username: str, progress=None) -> dict:
+    """后台任务：复制其他知识库中相同内容文档的分段和向量
+
+    源集合中已没有该文档的分段时（例如源知识库的集合被清空）改为按知识库配置正常处理上传文件。
+    """
+    try:
+        result = knowledge_service.copy_document(
+            source_collection=source["knowledge_base_id"],
+            source_document_id=source["id"],
+            target_collection=kb["id"],
+            metadata={"filename": filename, "uploaded_by": username, "document_id": doc_id,
+                      "source": file_path},
+            embedding_model=kb.get("embedding_model"),
+            vector_storage=kb.get("vector_storage", "float32"),
+            dedup_threshold=kb.get("dedup_threshold", 0.0),
+            progress=progress
+        )
+    except Exception:
+        remove_upload(file_path)
+        raise
+    if not result["source_chunks"]:
+        logger.warning("Chunks of document %s are missing from collection %s, processing %s again",
+                       source["id"], source["knowledge_base_id"], filename)
+        return ingest_document(kb, file_path, doc_id, content_hash, filename, username, progress=progress,
+                               encoding=source.get("encoding"))
+    remove_upload(file_path)
+    return {
+        "chunk_count": result["chunk_count"],
+        "duplicate_chunks": result["duplicate_chunks"],
+        "encoding": source.get("encoding"),
+        **document_stats(source),
+        "reused_from": source["id"],
+    }
+
+def _ingest_done(doc_id: str, kb_id: str):
+    """后台任务结束后更新文档记录和知识库统计"""
+    def on_done(result: Optional[dict], error: Optional[BaseException]):
+        document = documents_store.get(doc_id)
+        if document is None:
+            return  # 处理期间文档已被删除
+        if error is not None:
+            document.update({"status": "failed", "error": str(error)})
+        else:
+            document.update(result)
+            document["status"] = "completed"
+        document["updated_at"] = datetime.now().isoformat()
+        recalculate_kb_stats(kb_id)
+    return on_done
+
+def _batch_done(doc_ids: List[str], kb_id: str):
+    """批量任务结束后逐个更新文档记录；单个文件失败只标记该文档"""
+    def on_done(results: Optional[List[dict]], error: Optional[BaseException]):
+        now = datetime.now().isoformat()
+        for index, doc_id in enumerate(doc_ids):
+            document = documents_store.get(doc_id)
+            if document is None:
+                continue  # 处理期间文档已被删除
+            if error is not None:
+                document.update({"status": "failed", "error": str(error)})
+            else:
+                document.update(results[index])
+                document["status"] = "failed" if document["error"] else "completed"
+            document["updated_at"] = now
+        recalculate_kb_stats(kb_id)
+    return on_done
 
 @router.delete("/bases/{kb_id}/documents/{doc_id}")
 async def delete_document(
@@ -346,7 +631,14 @@ async def delete_document(
     if kb["owner_id"] != current_user.username:
         raise HTTPException(status_code=403, detail="Access denied")
     
+    # 同时删除向量库中的分段和近似去重指纹，之后重新上传同一文件可以正常入库
+    try:
+        await run_in_threadpool(knowledge_service.delete_document, kb_id, doc_id, kb.get("embedding_model"))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"删除文档分段失败: {e}")
+    
     del documents_store[doc_id]
+    ingest_pool.forget(doc_id)
     
     # 更新知识库统计
     kb_docs = [d for d in documents_store.values() if d["knowledge_base_id"] == kb_id]
@@ -378,16 +670,23 @@ async def search_knowledge_base(
         if kb["owner_id"] != current_user.username and kb["permission"] != "public":
             raise HTTPException(status_code=403, detail="Access denied")
         
-        results = knowledge_service.search_knowledge_base(
+        results = await knowledge_service.asearch_knowledge_base(
             collection_name=kb_id,
             query=query,
-            k=limit
+            k=limit,
+            embedding_model=kb.get("embedding_model")
         )
         
         return {"data": {"results": results}}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# 嵌入统计API
+@router.get("/embedding-stats")
+async def get_embedding_stats(current_user: User = Depends(get_current_user)):
+    """获取嵌入缓存命中率与查询嵌入延迟统计"""
+    return {"data": knowledge_service.vector_store.embedding_stats()}
+
 # 索引进度API  
 @router.get("/bases/{kb_id}/indexing-progress")
 async def get_indexing_progress(
@@ -398,16 +697,42 @@ async def get_indexing_progress(
     if kb_id not in knowledge_bases_store:
         raise HTTPException(status_code=404, detail="Knowledge base not found")
     
-    # 简化实现，返回完成状态
-    return {
-        "data": {
-            "progress": {
-                "total": 1,
-                "processed": 1,
-                "status": "completed"
-            }
-        }
+    kb = knowledge_bases_store[kb_id]
+    if kb["owner_id"] != current_user.username and kb["permission"] != "public":
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    documents = []
+    for doc in documents_store.values():
+        if doc["knowledge_base_id"] != kb_id:
+            continue
+        job = ingest_pool.progress(doc["id"]) or ingest_pool.progress(doc.get("batch_id")) or {}
+        documents.append({
+            "document_id": doc["id"],
+            "name": doc["name"],
+            "status": doc["status"],
+            "stage": job.get("stage", doc["status"]),
+            "processed": job.get("processed", 0),
+            "total": job.get("total"),
+            "error": doc.get("error"),
+        })
+    
+    processing = sum(1 for doc in documents if doc["status"] == "processing")
+    failed = [doc for doc in documents if doc["status"] == "failed"]
+    if processing:
+        status = "processing"
+    elif failed and len(failed) == len(documents):
+        status = "failed"
+    else:
+        status = "completed"
+    progress = {
+        "total": len(documents),
+        "processed": len(documents) - processing,
+        "status": status,
+        "documents": documents,
     }
+    if failed:
+        progress["error"] = failed[0]["error"]
+    return {"data": {"progress": progress}}
 
 # 保持原有的简单API以兼容
 @router.post("/upload/{collection_name}")
@@ -416,27 +741,34 @@ async def upload_document_simple(
     file: UploadFile = File(...),
     metadata: dict = None
 ):
-    """简单上传文档API（兼容性）"""
+    """简单上传文档API（兼容性）
+
+    处理完成后才返回；处理在后台任务池中进行，不阻塞事件循环，并与其他上传共用并发上限。
+    """
+    job_id = str(uuid.uuid4())
+    file_path = os.path.join(UPLOAD_DIR, f"{job_id}_{file.filename}")
     try:
         # Save file temporarily
-        file_path = os.path.join(UPLOAD_DIR, file.filename)
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
-        # Process document
-        knowledge_service.process_document(
-            file_path=file_path,
-            collection_name=collection_name,
-            metadata=metadata
-        )
-        
-        # Clean up
-        os.remove(file_path)
-        
-        return {"message": "Document processed successfully"}
+        await save_upload(file, file_path, settings.max_file_size)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    
+    def process(progress=None):
+        try:
+            knowledge_service.process_document(file_path=file_path, collection_name=collection_name,
+                                               metadata=metadata, progress=progress)
+        finally:
+            remove_upload(file_path)
+    
+    outcome = {}
+    job = ingest_pool.submit(job_id, process, on_done=lambda result, error: outcome.update(error=error))
+    await asyncio.wrap_future(job)
+    ingest_pool.forget(job_id)
+    if outcome.get("error") is not None:
+        raise HTTPException(status_code=500, detail=str(outcome["error"]))
+    return {"message": "Document processed successfully"}
 
 @router.get("/bases/{kb_id}/documents/{doc_id}/chunks")
 async def get_document_chunks(
@@ -479,7 +811,7 @@ async def get_document_chunks(
 async def search_knowledge_base_simple(query: SearchQuery):
     """简单搜索API（兼容性）"""
     try:
-        results = knowledge_service.search_knowledge_base(
+        results = await knowledge_service.asearch_knowledge_base(
             collection_name=query.collection_name,
             query=query.query,
             k=query.k
@@ -6,6 +6,7 @@ import anthropic
 from google.generativeai import GenerativeModel
 import google.generativeai as genai
 from .config import settings
+from .embedding_batcher import QueryEmbeddingBatcher
 
 
 class RateLimiter:
@@ -128,6 +129,26 @@ class OpenAIClient:
             return response.data[0].embedding
         
         return await RetryManager.retry_with_backoff(_call)
+    
+    async def get_embeddings(
+        self,
+        texts: List[str],
+        model: str = "text-embedding-ada-002"
+    ) -> List[List[float]]:
+        """批量获取文本嵌入向量（一次请求）"""
+        if not self.client:
+            raise ValueError("OpenAI client not initialized. Please check API key.")
+        
+        await self.rate_limiter.acquire()
+        
+        async def _call():
+            response = await self.client.embeddings.create(
+                model=model,
+                input=texts
+            )
+            return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        
+        return await RetryManager.retry_with_backoff(_call)
 
 
 class AnthropicClient:
@@ -231,6 +252,7 @@ class APIClientManager:
         self.openai_client = OpenAIClient()
         self.anthropic_client = AnthropicClient()
         self.google_client = GoogleClient()
+        self.embedding_batchers: Dict[str, QueryEmbeddingBatcher] = {}
     
     def get_client(self, provider: str):
         """获取指定提供商的客户端"""
@@ -266,7 +288,19 @@ class APIClientManager:
         if provider.lower() != "openai":
             raise ValueError("Currently only OpenAI embeddings are supported")
         
-        return await self.openai_client.get_embedding(text, **kwargs)
+        # 并发的单条请求在短时间窗口内合并为一次批量请求
+        model = kwargs.get("model", "text-embedding-ada-002")
+        if model not in self.embedding_batchers:
+            self.embedding_batchers[model] = QueryEmbeddingBatcher(
+                lambda texts: self.openai_client.get_embeddings(texts, model=model),
+                window_ms=settings.query_embedding_batch_window_ms,
+                max_batch_size=settings.query_embedding_max_batch
+            )
+        return await self.embedding_batchers[model].embed(text)
+    
+    def get_embedding_stats(self) -> Dict[str, Dict[str, float]]:
+        """各嵌入模型的请求合并与延迟统计"""
+        return {model: batcher.stats() for model, batcher in self.embedding_batchers.items()}
     
     def get_available_providers(self) -> List[str]:
         """获取可用的提供商列表"""
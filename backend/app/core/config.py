@@ -1,6 +1,10 @@
 import os
 from typing import Optional, List
-from pydantic import BaseSettings, Field
+try:
+    from pydantic_settings import BaseSettings
+except ImportError:  # pydantic v1
+    from pydantic import BaseSettings
+from pydantic import Field
 
 
 class Settings(BaseSettings):
@@ -37,9 +41,54 @@ class Settings(BaseSettings):
         env="CHROMA_COLLECTION_NAME"
     )
     
+    # 嵌入缓存配置
+    embedding_cache_enabled: bool = Field(default=True, env="EMBEDDING_CACHE_ENABLED")
+    embedding_cache_path: Optional[str] = Field(default=None, env="EMBEDDING_CACHE_PATH")  # 默认位于 chroma 持久化目录下
+    embedding_cache_max_entries: int = Field(default=200_000, env="EMBEDDING_CACHE_MAX_ENTRIES")
+    
+    # 并行嵌入配置
+    embedding_pool_size: int = Field(default=0, env="EMBEDDING_POOL_SIZE")  # 0 表示按容器 CPU 配额自动确定
+    embedding_parallel_min_batch: int = Field(default=256, env="EMBEDDING_PARALLEL_MIN_BATCH")
+    
+    # 远程嵌入接口配置
+    embedding_batch_size: int = Field(default=512, env="EMBEDDING_BATCH_SIZE")
+    embedding_max_batch_tokens: int = Field(default=250_000, env="EMBEDDING_MAX_BATCH_TOKENS")
+    embedding_max_concurrency: int = Field(default=4, env="EMBEDDING_MAX_CONCURRENCY")
+    embedding_tokens_per_minute: int = Field(default=0, env="EMBEDDING_TOKENS_PER_MINUTE")  # 0 表示不限制
+    
+    # 查询嵌入微批合并配置
+    query_embedding_batch_window_ms: float = Field(default=5.0, env="QUERY_EMBEDDING_BATCH_WINDOW_MS")
+    query_embedding_max_batch: int = Field(default=64, env="QUERY_EMBEDDING_MAX_BATCH")
+    
+    # 查询嵌入缓存配置
+    query_embedding_cache_size: int = Field(default=1024, env="QUERY_EMBEDDING_CACHE_SIZE")  # 0 表示关闭
+    query_embedding_cache_ttl: float = Field(default=0, env="QUERY_EMBEDDING_CACHE_TTL")  # 秒，0 表示不过期
+    
+    # 文档入库流水线配置
+    ingest_batch_size: int = Field(default=512, env="INGEST_BATCH_SIZE")  # 每批嵌入并写入的分段数
+    ingest_queue_size: int = Field(default=2, env="INGEST_QUEUE_SIZE")  # 嵌入与写入之间的队列容量（批）
+    ingest_max_jobs: int = Field(default=2, env="INGEST_MAX_JOBS")  # 同时在后台处理的上传文档数
+    ingest_job_ttl: int = Field(default=3600, env="INGEST_JOB_TTL")  # 已结束任务的进度保留秒数
+    ingest_max_finished_jobs: int = Field(default=1000, env="INGEST_MAX_FINISHED_JOBS")  # 最多保留进度的已结束任务数
+    batch_upload_workers: int = Field(default=4, env="BATCH_UPLOAD_WORKERS")  # 批量上传时同时提取和分割的文件数
+    max_archive_size: int = Field(default=500 * 1024 * 1024, env="MAX_ARCHIVE_SIZE")  # 批量上传的 zip 包大小上限（500MB）
+    
+    # 分段 token 计数配置
+    tokenizer_vocab_path: Optional[str] = Field(default=None, env="TOKENIZER_VOCAB_PATH")  # BERT vocab.txt 格式，默认使用随代码分发的词表
+    tokenizer_cache_size: int = Field(default=65536, env="TOKENIZER_CACHE_SIZE")  # 按预分词片段缓存的 token 数条目上限
+    document_token_stats: bool = Field(default=False, env="DOCUMENT_TOKEN_STATS")  # 按字符数分段时也统计文档 token 数（额外一遍 WordPiece 计数）
+    
+    # 语义分割配置
+    semantic_breakpoint_percentile: float = Field(default=95.0, env="SEMANTIC_BREAKPOINT_PERCENTILE")  # 相邻句子距离超过该分位数处切开
+    
+    # PDF 提取配置
+    pdf_extract_workers: int = Field(default=0, env="PDF_EXTRACT_WORKERS")  # 0 表示按容器 CPU 配额自动确定
+    pdf_pages_per_task: int = Field(default=16, env="PDF_PAGES_PER_TASK")  # 每个工作进程任务提取的页数
+    pdf_page_timeout: float = Field(default=0, env="PDF_PAGE_TIMEOUT")  # 单页提取超时秒数，0 表示不限制
+    
     # 文档处理配置
     upload_dir: str = Field(default="./uploads", env="UPLOAD_DIR")
-    max_file_size: int = Field(default=10 * 1024 * 1024, env="MAX_FILE_SIZE")  # 10MB
+    max_file_size: int = Field(default=50 * 1024 * 1024, env="MAX_FILE_SIZE")  # 50MB，上传写盘时即检查
     allowed_file_types: List[str] = Field(
         default=["pdf", "docx", "txt", "md"],
         env="ALLOWED_FILE_TYPES"
@@ -64,6 +113,8 @@ class Settings(BaseSettings):
     # 日志配置
     log_level: str = Field(default="INFO", env="LOG_LEVEL")
     log_file: Optional[str] = Field(default=None, env="LOG_FILE")
+    hot_path_log_level: str = Field(default="WARNING", env="HOT_PATH_LOG_LEVEL")  # 入库与检索热路径日志级别
+    hot_path_log_rate: int = Field(default=20, env="HOT_PATH_LOG_RATE")  # 每条消息模板每分钟最多输出条数，0 表示不限制
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,88 @@
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import numpy as np
+
+
+class QueryEmbeddingBatcher:
+    """查询嵌入微批合并器
+
+    在 window_ms 时间窗口内（或累计到 max_batch_size 条时）收集并发的查询，
+    合并为一次批量嵌入请求，再把结果分发给各个等待的协程。
+    """
+
+    def __init__(
+        self,
+        embed_batch: Callable[[List[str]], Awaitable[List[List[float]]]],
+        window_ms: float = 5.0,
+        max_batch_size: int = 64,
+        latency_samples: int = 1000
+    ):
+        self.embed_batch = embed_batch
+        self.window_ms = window_ms
+        self.max_batch_size = max_batch_size
+        self.requests = 0
+        self.batches = 0
+        self._pending: List[Tuple[str, asyncio.Future, float]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+        self._latencies = deque(maxlen=latency_samples)
+
+    async def embed(self, text: str) -> List[float]:
+        """提交一条查询并等待其嵌入向量"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future, time.perf_counter()))
+        self.requests += 1
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_ms / 1000.0, self._flush)
+        return await future
+
+    def _flush(self):
+        """发出当前窗口内收集到的查询"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, []
+        if pending:
+            task = asyncio.ensure_future(self._run(pending))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, pending: List[Tuple[str, asyncio.Future, float]]):
+        self.batches += 1
+        # 相同的查询只嵌入一次
+        unique_texts: Dict[str, int] = {}
+        for text, _, _ in pending:
+            unique_texts.setdefault(text, len(unique_texts))
+
+        try:
+            vectors = await self.embed_batch(list(unique_texts))
+        except Exception as e:
+            for _, future, _ in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        now = time.perf_counter()
+        for text, future, started in pending:
+            if not future.done():
+                future.set_result(vectors[unique_texts[text]])
+            self._latencies.append((now - started) * 1000.0)
+
+    def stats(self) -> Dict[str, float]:
+        """请求数、批次数及最近请求的 p50/p99 延迟（毫秒）"""
+        latencies = np.fromiter(self._latencies, dtype=np.float64)
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "avg_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "window_ms": self.window_ms,
+            "max_batch_size": self.max_batch_size,
+            "p50_ms": float(np.percentile(latencies, 50)) if latencies.size else 0.0,
+            "p99_ms": float(np.percentile(latencies, 99)) if latencies.size else 0.0,
+        }
@@ -0,0 +1,68 @@
+import logging
+import sys
+import threading
+import time
+from typing import Dict, Tuple
+from .config import settings
+
+_handler = None
+_handler_lock = threading.Lock()
+
+
+class RateLimitFilter(logging.Filter):
+    """按 (logger, 消息模板) 限流：每个时间窗口内最多放行 max_records 条
+
+    超出的记录直接丢弃并计数，窗口结束后放行的第一条记录附带被丢弃的条数。
+    """
+
+    def __init__(self, max_records: int, interval: float = 60.0):
+        super().__init__()
+        self.max_records = max_records
+        self.interval = interval
+        self._windows: Dict[Tuple[str, str], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.max_records <= 0:
+            return True
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                self._windows[key] = [now, 1, 0]
+                if suppressed:
+                    record.msg = f"{record.msg} (suppressed {suppressed} similar messages)"
+                return True
+            if window[1] < self.max_records:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+
+def _shared_handler() -> logging.Handler:
+    global _handler
+    with _handler_lock:
+        if _handler is None:
+            _handler = logging.StreamHandler(sys.stderr)
+            _handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        return _handler
+
+
+def get_logger(name: str) -> logging.Logger:
+    """入库和检索热路径使用的日志器
+
+    级别由 HOT_PATH_LOG_LEVEL 控制，默认 WARNING，即只输出警告和错误；
+    每条消息模板每分钟最多输出 HOT_PATH_LOG_RATE 条。消息使用 % 占位符，
+    未启用的级别不会格式化参数。
+    """
+    logger = logging.getLogger(name)
+    if not getattr(logger, "_hot_path_configured", False):
+        logger.setLevel(settings.hot_path_log_level.upper())
+        logger.addFilter(RateLimitFilter(settings.hot_path_log_rate))
+        logger.addHandler(_shared_handler())
+        logger.propagate = False
+        logger._hot_path_configured = True
+    return logger
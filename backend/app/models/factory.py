@@ -2,10 +2,7 @@ from typing import Dict, Type, Optional
 from .base import BaseModelProvider, ModelConfig
 from .openai_provider import OpenAIProvider
 from .anthropic_provider import AnthropicProvider
-from .azure_provider import AzureProvider
 from .gemini_provider import GeminiProvider
-from .qwen_provider import QwenProvider
-from .spark_provider import SparkProvider
 
 class ModelFactory:
     """Factory class for creating model providers"""
@@ -1,4 +1,6 @@
 from typing import List, Dict, Any, Optional
+import asyncio
+import weakref
 import openai
 from .base import BaseModelProvider, ModelConfig, ModelResponse
 
@@ -10,6 +12,16 @@ class OpenAIProvider(BaseModelProvider):
         openai.api_key = config.api_key
         if config.api_base:
             openai.api_base = config.api_base
+        # 嵌入客户端及其连接池按事件循环各建一个并复用（httpx 连接绑定创建它的事件循环）
+        self._embedding_clients = weakref.WeakKeyDictionary()
+    
+    def _embedding_client(self) -> "openai.AsyncOpenAI":
+        loop = asyncio.get_running_loop()
+        client = self._embedding_clients.get(loop)
+        if client is None:
+            client = openai.AsyncOpenAI(api_key=self.config.api_key, base_url=self.config.api_base)
+            self._embedding_clients[loop] = client
+        return client
     
     async def chat(
         self,
@@ -50,7 +62,7 @@ class OpenAIProvider(BaseModelProvider):
     ) -> List[List[float]]:
         """Generate embeddings using OpenAI"""
         try:
-            response = await openai.Embedding.acreate(
+            response = await self._embedding_client().embeddings.create(
                 input=texts,
                 model=model or "text-embedding-ada-002"
             )
@@ -142,7 +154,8 @@ class OpenAIProvider(BaseModelProvider):
             "text-embedding-ada-002": {
                 "name": "Text Embedding Ada",
                 "type": "embedding",
-                "dimensions": 1536
+                "dimensions": 1536,
+                "max_batch_size": 2048
             },
             "whisper-1": {
                 "name": "Whisper",
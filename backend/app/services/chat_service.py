@@ -44,21 +44,27 @@ class ChatService:
             "created_at": str(uuid.uuid4())
         }
         
-    def create_conversation(self, conversation_id: str, collection_name: str):
-        """Create a new conversation with knowledge base context"""
-        # Get vector store
-        vectorstore = self.vector_store.create_collection(collection_name)
+    def create_conversation(self, conversation_id: str, collection_name: str,
+                            embedding_model: Optional[str] = None):
+        """Create a new conversation with knowledge base context
+
+        embedding_model 为知识库配置的嵌入模型，查询向量与知识库中的文档向量使用同一模型。
+        检索的查询嵌入经共享查询缓存和微批合并器，与知识库搜索的并发请求合并计算。
+        """
+        # Get retriever
+        retriever = self.vector_store.as_retriever(collection_name, embedding_model)
         
         # Create memory
         memory = ConversationBufferMemory(
             memory_key="chat_history",
+            output_key="answer",  # 链同时返回 source_documents，记忆只保存回答
             return_messages=True
         )
         
         # Create chain
         chain = ConversationalRetrievalChain.from_llm(
             llm=self.chat_model,
-            retriever=vectorstore.as_retriever(),
+            retriever=retriever,
             memory=memory,
             return_source_documents=True
         )
@@ -83,7 +89,7 @@ class ChatService:
                 attachments.append(attachment)
         
         # Process message
-        response = conversation["chain"]({"question": message})
+        response = await conversation["chain"].acall({"question": message})
         
         # Store message
         message_id = str(uuid.uuid4())
@@ -106,7 +112,7 @@ class ChatService:
             "attachments": attachments
         }
         
-    def update_message(self, message_id: str, content: str) -> Dict[str, Any]:
+    async def update_message(self, message_id: str, content: str) -> Dict[str, Any]:
         """Update a message"""
         if message_id not in self.messages:
             raise ValueError(f"Message {message_id} not found")
@@ -122,7 +128,7 @@ class ChatService:
         
         # Reprocess message
         conversation = self.conversations[conversation_id]
-        response = conversation["chain"]({"question": content})
+        response = await conversation["chain"].acall({"question": content})
         message["response"] = response
         
         return {
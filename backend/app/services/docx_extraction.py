@@ -0,0 +1,102 @@
+from typing import Iterator, List
+from xml.etree.ElementTree import fromstring, iterparse
+import posixpath
+import zipfile
+
+# WordprocessingML 命名空间
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_P, _R, _T, _TAB, _BR, _CR = _W + "p", _W + "r", _W + "t", _W + "tab", _W + "br", _W + "cr"
+_TR, _TC = _W + "tr", _W + "tc"
+# 兼容标记中的替代内容（如文本框的 VML 版本）与 mc:Choice 重复，跳过
+_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+
+_RELATIONSHIP = "{http://schemas.openxmlformats.org/package/2006/relationships}Relationship"
+_OFFICE_DOCUMENT = "/officeDocument"
+
+# 表格行内各单元格文本之间的分隔符
+CELL_SEPARATOR = " | "
+
+
+def _main_part(package: zipfile.ZipFile) -> str:
+    """包关系中登记的主文档部件路径，通常为 word/document.xml"""
+    try:
+        relationships = fromstring(package.read("_rels/.rels"))
+    except KeyError:
+        return "word/document.xml"
+    for relationship in relationships.iter(_RELATIONSHIP):
+        if relationship.get("Type", "").endswith(_OFFICE_DOCUMENT):
+            return posixpath.normpath(relationship.get("Target", "").lstrip("/"))
+    return "word/document.xml"
+
+
+def iter_docx_blocks(file_path: str) -> Iterator[str]:
+    """按文档顺序逐块产出 DOCX 正文的段落和表格行文本
+
+    直接从压缩包中流式解析主文档部件（word/document.xml），不构建完整的文档对象树：每个段落或表格行
+    结束时产出一次，已处理的元素随即从树中移除，内存只与当前块有关。
+    段落内的 w:tab、w:br 分别转为制表符和换行；表格行的各单元格用 CELL_SEPARATOR 连接，
+    单元格内多个段落以换行连接；嵌套表格的行并入外层单元格，文本框中的段落并入所在段落。
+    页眉页脚、脚注和批注不在 document.xml 中，不提取。
+    """
+    paragraphs: List[List[str]] = []  # 未结束的段落（文本框会嵌套段落）
+    cells: List[List[str]] = []  # 未结束的单元格中已结束的段落
+    rows: List[List[str]] = []  # 未结束的表格行中已结束的单元格
+    runs = 0  # 当前所在的 w:r 层数，只收集文本运行中的 w:t/w:tab/w:br
+    fallbacks = 0  # 当前所在的 mc:Fallback 层数
+    depth = 0
+    body = None
+    with zipfile.ZipFile(file_path) as package, package.open(_main_part(package)) as document:
+        for event, elem in iterparse(document, events=("start", "end")):
+            tag = elem.tag
+            if tag == _FALLBACK:
+                fallbacks += 1 if event == "start" else -1
+            if fallbacks:
+                depth += 1 if event == "start" else -1
+                continue
+            if event == "start":
+                depth += 1
+                if depth == 2:
+                    body = elem
+                elif tag == _P:
+                    paragraphs.append([])
+                elif tag == _R:
+                    runs += 1
+                elif tag == _TC:
+                    cells.append([])
+                elif tag == _TR:
+                    rows.append([])
+                continue
+
+            depth -= 1
+            if tag == _R:
+                runs -= 1
+            elif tag == _P and paragraphs:
+                text = "".join(paragraphs.pop())
+                if paragraphs:
+                    paragraphs[-1].append(text)
+                elif cells:
+                    cells[-1].append(text)
+                else:
+                    yield text
+                elem.clear()
+            elif tag == _TC and cells:
+                text = "\n".join(cells.pop()).strip()
+                if rows:
+                    rows[-1].append(text)
+            elif tag == _TR and rows:
+                text = CELL_SEPARATOR.join(rows.pop())
+                if cells:
+                    cells[-1].append(text)
+                else:
+                    yield text
+                elem.clear()
+            elif runs and paragraphs:
+                if tag == _T:
+                    paragraphs[-1].append(elem.text or "")
+                elif tag == _TAB:
+                    paragraphs[-1].append("\t")
+                elif tag in (_BR, _CR):
+                    paragraphs[-1].append("\n")
+            if depth == 2 and body is not None:
+                # 正文的直接子元素处理完毕，从树中移除
+                body.clear()
@@ -0,0 +1,106 @@
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+import threading
+import time
+from ..core.log import get_logger
+
+logger = get_logger(__name__)
+
+ProgressCallback = Callable[..., None]
+
+
+class IngestWorkerPool:
+    """后台入库任务池
+
+    上传接口提交任务后立即返回，任务在最多 max_workers 个线程中执行（嵌入和 PDF 提取
+    自有进程池，线程足以让多个文档同时推进，且共用同一个向量存储实例）。
+    任务通过 progress(stage, processed=None, total=None) 回调发布阶段进度，
+    进度接口按任务 id 读取。阶段依次为 queued、extracting、splitting、embedding、writing，
+    最后是 completed 或 failed；total 为 None 表示总量尚未确定（分段仍在流式产出）。
+    结束的任务保留 finished_ttl 秒、最多 max_finished 个，之后丢弃，进度接口改读文档记录的状态。
+    """
+
+    def __init__(self, max_workers: int, finished_ttl: float = 3600.0, max_finished: int = 1000):
+        self.max_workers = max(1, max_workers)
+        self.finished_ttl = finished_ttl
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ingest-job")
+        self._jobs: Dict[str, dict] = {}
+        # 已结束任务按结束先后排列：job_id -> 结束时间
+        self._finished: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, job_id: str, func: Callable[..., Any], *args: Any,
+               on_done: Optional[Callable[[Optional[Any], Optional[BaseException]], None]] = None,
+               **kwargs: Any) -> Future:
+        """提交任务；func 需接受 progress 关键字参数，完成后以 (结果, 异常) 调用 on_done"""
+        with self._lock:
+            self._jobs[job_id] = {"stage": "queued", "processed": 0, "total": None, "error": None,
+                                  "updated_at": time.time()}
+            self._finished.pop(job_id, None)
+
+        def run():
+            result, error = None, None
+            try:
+                result = func(*args, progress=self.reporter(job_id), **kwargs)
+                self._update(job_id, "completed")
+            except Exception as e:
+                error = e
+                logger.error("Ingest job %s failed: %s", job_id, e)
+                self._update(job_id, "failed", error=str(e))
+            if on_done is not None:
+                try:
+                    on_done(result, error)
+                except Exception as e:
+                    logger.error("Ingest job %s completion handler failed: %s", job_id, e)
+            return result
+
+        return self._executor.submit(run)
+
+    def reporter(self, job_id: str) -> ProgressCallback:
+        def progress(stage: str, processed: Optional[int] = None, total: Optional[int] = None):
+            self._update(job_id, stage, processed, total)
+        return progress
+
+    def _update(self, job_id: str, stage: str, processed: Optional[int] = None,
+                total: Optional[int] = None, error: Optional[str] = None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job["stage"] = stage
+            if processed is not None:
+                job["processed"] = processed
+            if total is not None:
+                job["total"] = total
+            if error is not None:
+                job["error"] = error
+            job["updated_at"] = time.time()
+            if stage in ("completed", "failed"):
+                self._finished[job_id] = job["updated_at"]
+                self._evict_finished(job["updated_at"])
+
+    def _evict_finished(self, now: float):
+        """丢弃超过保留时间或超出保留数量的已结束任务（调用方持有锁）"""
+        while self._finished:
+            job_id, finished_at = next(iter(self._finished.items()))
+            if len(self._finished) <= self.max_finished and now - finished_at <= self.finished_ttl:
+                break
+            del self._finished[job_id]
+            self._jobs.pop(job_id, None)
+
+    def progress(self, job_id: str) -> Optional[dict]:
+        """任务的最新进度副本，未知任务返回 None"""
+        with self._lock:
+            self._evict_finished(time.time())
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def forget(self, job_id: str):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+            self._finished.pop(job_id, None)
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
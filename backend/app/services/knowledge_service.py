@@ -1,165 +1,185 @@
-import pdfplumber
-from docx import Document
-from typing import List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import itertools
 import os
-import chardet
 from ..vectorstore.chroma_store import ChromaStore
+from .docx_extraction import iter_docx_blocks
+from .pdf_extraction import iter_pdf_pages
+from .text_decoding import detect_encoding, iter_decoded_text
+from ..vectorstore.text_cleaning import get_cleaning_pipeline
+from ..vectorstore.text_stats import TextStats
+from ..core.config import settings
+from ..core.log import get_logger
+
+logger = get_logger(__name__)
 
 class KnowledgeService:
-    def __init__(self):
-        self.vector_store = ChromaStore()
+    def __init__(self, vector_store: Optional[ChromaStore] = None):
+        self.vector_store = vector_store or ChromaStore()
         
-    def extract_text_from_pdf(self, file_path: str) -> str:
-        """Extract text from PDF file"""
-        text = ""
+    def iter_pdf_segments(self, file_path: str) -> Iterator[Tuple[Optional[int], str]]:
+        """逐页产出 PDF 的 (页码, 文本)，页面按页段并行提取"""
         try:
-            with pdfplumber.open(file_path) as pdf:
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
+            for page_number, page_text in iter_pdf_pages(file_path):
+                if page_text:
+                    yield page_number, page_text + "\n"
         except Exception as e:
             raise ValueError(f"Failed to extract text from PDF: {str(e)}")
-        return text
     
-    def extract_text_from_docx(self, file_path: str) -> str:
-        """Extract text from DOCX file"""
+    def extract_text_from_pdf(self, file_path: str) -> str:
+        """Extract text from PDF file"""
+        return "".join(text for _, text in self.iter_pdf_segments(file_path))
+    
+    def iter_docx_segments(self, file_path: str) -> Iterator[Tuple[Optional[int], str]]:
+        """按文档顺序流式产出 DOCX 的段落和表格行文本，DOCX 没有页码"""
         try:
-            doc = Document(file_path)
-            return "\n".join([paragraph.text for paragraph in doc.paragraphs])
+            for index, block in enumerate(iter_docx_blocks(file_path)):
+                yield None, block if index == 0 else "\n" + block
         except Exception as e:
             raise ValueError(f"Failed to extract text from DOCX: {str(e)}")
     
-    def extract_text_from_txt(self, file_path: str) -> str:
+    def extract_text_from_docx(self, file_path: str) -> str:
+        """Extract text from DOCX file"""
+        return "".join(text for _, text in self.iter_docx_segments(file_path))
+    
+    def extract_text_from_txt(self, file_path: str, encoding: Optional[str] = None) -> str:
         """Extract text from TXT file with encoding detection"""
+        return "".join(text for _, text in self.iter_txt_segments(file_path, encoding))
+    
+    def iter_txt_segments(self, file_path: str, encoding: Optional[str] = None) -> Iterator[Tuple[Optional[int], str]]:
+        """按块增量解码文本文件；未指定编码时在头、中、尾样本上检测"""
         try:
-            # First, try to detect encoding
-            with open(file_path, 'rb') as file:
-                raw_data = file.read()
-                
-            # Detect encoding
-            result = chardet.detect(raw_data)
-            encoding = result['encoding']
-            confidence = result['confidence']
-            
-            print(f"Detected encoding: {encoding} (confidence: {confidence:.2f})")
-            
-            # Try multiple encodings in order of preference
-            encodings_to_try = []
-            if encoding and confidence > 0.7:
-                encodings_to_try.append(encoding)
-            
-            # Add common encodings
-            common_encodings = ['utf-8', 'gbk', 'gb2312', 'utf-16', 'latin-1', 'cp1252']
-            for enc in common_encodings:
-                if enc not in encodings_to_try:
-                    encodings_to_try.append(enc)
-            
-            # Try each encoding
-            for enc in encodings_to_try:
-                try:
-                    text = raw_data.decode(enc)
-                    print(f"Successfully decoded with encoding: {enc}")
-                    return text
-                except (UnicodeDecodeError, LookupError):
-                    continue
-            
-            # If all encodings fail, use utf-8 with error handling
-            try:
-                text = raw_data.decode('utf-8', errors='replace')
-                print("Warning: Used UTF-8 with error replacement for problematic characters")
-                return text
-            except Exception as e:
-                raise ValueError(f"Failed to decode text file with any encoding: {str(e)}")
-                
+            encoding = encoding or detect_encoding(file_path)
+            logger.debug("Decoding %s with encoding: %s", file_path, encoding)
+            for text in iter_decoded_text(file_path, encoding):
+                yield None, text
         except Exception as e:
             raise ValueError(f"Failed to read text file: {str(e)}")
     
+    def iter_document_segments(self, file_path: str,
+                               encoding: Optional[str] = None) -> Iterator[Tuple[Optional[int], str]]:
+        """按文件类型选择提取器，产出 (页码, 文本) 片段；页码仅 PDF 提供，其余为 None
+
+        encoding 只用于文本文件，为空时自动检测。
+        """
+        file_ext = os.path.splitext(file_path)[1].lower()
+        if file_ext == '.pdf':
+            return self.iter_pdf_segments(file_path)
+        if file_ext == '.docx':
+            return self.iter_docx_segments(file_path)
+        if file_ext in ['.txt', '.md']:
+            return self.iter_txt_segments(file_path, encoding)
+        raise ValueError(f"Unsupported file type: {file_ext}")
+    
+    def _prepare_document(self, file_path: str, splitter_type: str,
+                          encoding: Optional[str] = None) -> Tuple[str, int, Optional[str], str]:
+        """检查文件大小，检测文本编码并解析 auto 分割器，返回 (扩展名, 大小, 编码, 分割器类型)"""
+        # Check file size (MAX_FILE_SIZE)
+        file_size = os.path.getsize(file_path)
+        max_file_size = settings.max_file_size
+        if file_size > max_file_size:
+            raise ValueError(f"File too large: {file_size / (1024*1024):.1f}MB. Maximum allowed: {max_file_size / (1024*1024)}MB")
+        
+        file_ext = os.path.splitext(file_path)[1].lower()
+        if file_ext in ['.txt', '.md']:
+            encoding = encoding or detect_encoding(file_path)
+        else:
+            encoding = None
+        
+        # 根据文件类型自动选择分割器
+        if splitter_type == "auto":
+            if file_ext == '.md':
+                splitter_type = "markdown"
+            elif file_ext == '.py':
+                splitter_type = "python"
+            elif file_ext in ['.html', '.htm']:
+                splitter_type = "html"
+            else:
+                splitter_type = "recursive"
+        return file_ext, file_size, encoding, splitter_type
+    
+    @staticmethod
+    def _document_metadata(file_path: str, file_ext: str, file_size: int, encoding: Optional[str],
+                           splitter_type: str, chunk_size: Optional[int], chunk_overlap: Optional[int],
+                           length_function: str, cleaning_config: str, metadata: Optional[dict]) -> dict:
+        # Prepare metadata - ensure all values are simple types
+        doc_metadata = {
+            'source': file_path,
+            'file_type': file_ext[1:],
+            'file_size': file_size,
+            'chunk_size_config': chunk_size or 1000,
+            'chunk_overlap_config': chunk_overlap or 200,
+            'splitter_type_config': splitter_type,
+            'length_function_config': length_function,
+            'cleaning_rules_config': cleaning_config,
+        }
+        if encoding:
+            doc_metadata['encoding'] = encoding
+        
+        # Add user metadata, ensuring all values are simple types
+        if metadata:
+            for key, value in metadata.items():
+                if isinstance(value, (str, int, float, bool)):
+                    doc_metadata[key] = value
+                else:
+                    doc_metadata[key] = str(value)
+        return doc_metadata
+    
+    def _iter_nonempty_segments(self, file_path: str,
+                                encoding: Optional[str]) -> Iterator[Tuple[Optional[int], str]]:
+        """同 iter_document_segments，提取结束仍没有非空文本时抛出 ValueError"""
+        has_text = False
+        for segment in self.iter_document_segments(file_path, encoding):
+            has_text = has_text or bool(segment[1].strip())
+            yield segment
+        if not has_text:
+            raise ValueError(f"No text content extracted from file: {file_path}")
+    
     def process_document(self, file_path: str, collection_name: str, metadata: Optional[dict] = None,
                         chunk_size: int = None, chunk_overlap: int = None,
                         splitter_type: str = "recursive", custom_separators: str = "",
                         length_function: str = "char_count", keep_separator: bool = True,
                         add_start_index: bool = False, strip_whitespace: bool = True,
-                        cleaning_rules: str = None):  # 改为字符串类型
-        """Process document and store in vector database with advanced segmentation parameters"""
+                        cleaning_rules: str = None,  # 改为字符串类型
+                        embedding_model: Optional[str] = None, vector_storage: Optional[str] = None,
+                        dedup_threshold: float = 0.0, encoding: Optional[str] = None,
+                        progress: Optional[Callable[..., None]] = None) -> Dict[str, Any]:
+        """Process document and store in vector database with advanced segmentation parameters
+
+        encoding 为文本文件已知的编码（如上次处理时记录的值），为空时自动检测。
+        返回写入的分段数、被近似去重跳过的分段数、文本文件使用的编码（其他类型为 None），
+        以及提取文本流经分割器时一并统计的 word_count、char_count、cjk_count 和 token_count
+        （token_count 只在按 token 数分段或开启 document_token_stats 时统计，否则为 0）。
+        progress(stage, processed, total) 接收 extracting 及 add_texts 发布的后续阶段进度。
+        """
         try:
-            # Check file size (max 50MB)
-            file_size = os.path.getsize(file_path)
-            max_file_size = 50 * 1024 * 1024  # 50MB
-            if file_size > max_file_size:
-                raise ValueError(f"File too large: {file_size / (1024*1024):.1f}MB. Maximum allowed: {max_file_size / (1024*1024)}MB")
-            
-            file_ext = os.path.splitext(file_path)[1].lower()
+            if progress is not None:
+                progress("extracting", 0, None)
+            file_ext, file_size, encoding, splitter_type = self._prepare_document(file_path, splitter_type, encoding)
             
-            if file_ext == '.pdf':
-                text = self.extract_text_from_pdf(file_path)
-            elif file_ext == '.docx':
-                text = self.extract_text_from_docx(file_path)
-            elif file_ext in ['.txt', '.md']:
-                text = self.extract_text_from_txt(file_path)
+            # 片段边提取边分割，内存只与当前页/窗口有关；先取到第一个非空片段以便尽早报错
+            segments = self.iter_document_segments(file_path, encoding)
+            head = []
+            for segment in segments:
+                head.append(segment)
+                if segment[1].strip():
+                    break
             else:
-                raise ValueError(f"Unsupported file type: {file_ext}")
-            
-            # Check if text is not empty
-            if not text or not text.strip():
                 raise ValueError(f"No text content extracted from file: {file_path}")
+            segments = itertools.chain(head, segments)
             
-            # Check text length (max 10MB of text)
-            max_text_length = 10 * 1024 * 1024  # 10MB
-            if len(text) > max_text_length:
-                # Truncate text if too long
-                text = text[:max_text_length]
-                print(f"Warning: Text truncated to {max_text_length / (1024*1024):.1f}MB for file: {file_path}")
-            
-            # 根据文件类型自动选择分割器
-            if splitter_type == "auto":
-                if file_ext == '.md':
-                    splitter_type = "markdown"
-                elif file_ext == '.py':
-                    splitter_type = "python"
-                elif file_ext in ['.html', '.htm']:
-                    splitter_type = "html"
-                else:
-                    splitter_type = "recursive"
-            
-            # Convert cleaning_rules to list if it's a string
-            if isinstance(cleaning_rules, str) and cleaning_rules:
-                cleaning_rules_list = [rule.strip() for rule in cleaning_rules.split(',') if rule.strip()]
-            elif isinstance(cleaning_rules, list):
-                cleaning_rules_list = cleaning_rules
-            else:
-                cleaning_rules_list = []
+            # 清洗规则按组合编译并缓存，同一知识库的上传共用同一流水线
+            cleaning = get_cleaning_pipeline(cleaning_rules)
+            doc_metadata = self._document_metadata(file_path, file_ext, file_size, encoding, splitter_type,
+                                                   chunk_size, chunk_overlap, length_function,
+                                                   cleaning.config_string, metadata)
             
-            # Prepare metadata - ensure all values are simple types
-            doc_metadata = {
-                'source': file_path,
-                'file_type': file_ext[1:],
-                'text_length': len(text),
-                'file_size': file_size,
-                'chunk_size_config': chunk_size or 1000,
-                'chunk_overlap_config': chunk_overlap or 200,
-                'splitter_type_config': splitter_type,
-                'length_function_config': length_function,
-                'cleaning_rules_config': ','.join(cleaning_rules_list) if cleaning_rules_list else '',
-            }
-            
-            # Add user metadata, ensuring all values are simple types
-            if metadata:
-                for key, value in metadata.items():
-                    if isinstance(value, (str, int, float, bool)):
-                        doc_metadata[key] = value
-                    else:
-                        doc_metadata[key] = str(value)
-            
-            print(f"Processing document: {file_path} (size: {file_size / 1024:.1f}KB, text: {len(text)} chars)")
-            print(f"Using splitter: {splitter_type}, chunk_size: {chunk_size or 1000}, chunk_overlap: {chunk_overlap or 200}")
-            if cleaning_rules_list:
-                print(f"Applying cleaning rules: {', '.join(cleaning_rules_list)}")
+            logger.info("Processing document: %s (size: %.1fKB, splitter: %s, cleaning: %s)",
+                        file_path, file_size / 1024, splitter_type, cleaning.config_string)
             
             # Store in vector database with advanced segmentation parameters
-            self.vector_store.add_texts(
+            result = self.vector_store.add_texts(
                 collection_name=collection_name,
-                texts=[text],
+                texts=[segments],
                 metadatas=[doc_metadata],
                 splitter_type=splitter_type,
                 chunk_size=chunk_size,
@@ -169,25 +189,160 @@ class KnowledgeService:
                 keep_separator=keep_separator,
                 add_start_index=add_start_index,
                 strip_whitespace=strip_whitespace,
-                cleaning_rules=cleaning_rules_list
+                cleaning_rules=cleaning.rules,
+                embedding_model=embedding_model,
+                vector_storage=vector_storage,
+                dedup_threshold=dedup_threshold,
+                progress=progress,
+                text_stats=True
             )
             
-            print(f"Successfully processed document: {file_path}")
+            logger.info("Processed document: %s", file_path)
+            result.update(result.pop('stats')[0])
+            result['encoding'] = encoding
+            return result
             
         except Exception as e:
-            print(f"Error processing document {file_path}: {str(e)}")
+            logger.error("Error processing document %s: %s", file_path, e)
             raise e
+    
+    def process_documents(self, files: List[Tuple[str, Optional[dict]]], collection_name: str,
+                          chunk_size: int = None, chunk_overlap: int = None,
+                          splitter_type: str = "recursive", custom_separators: str = "",
+                          length_function: str = "char_count", keep_separator: bool = True,
+                          add_start_index: bool = False, strip_whitespace: bool = True,
+                          cleaning_rules: str = None,
+                          embedding_model: Optional[str] = None, vector_storage: Optional[str] = None,
+                          dedup_threshold: float = 0.0, max_workers: Optional[int] = None,
+                          progress: Optional[Callable[..., None]] = None) -> List[Dict[str, Any]]:
+        """批量处理多个文件：(文件路径, 元数据) 列表共用一条嵌入/写入流水线
+
+        最多 max_workers 个线程同时提取和分割不同文件，分段汇入共享的嵌入批次，整批只持久化一次。
+        单个文件失败不影响其他文件；按输入顺序返回每个文件的 chunk_count、duplicate_chunks、
+        encoding、文本统计（同 process_document）和 error（成功时为 None）。分割器为 auto 时按解析结果分组，每组一条流水线。
+        """
+        max_workers = max_workers or settings.batch_upload_workers
+        cleaning = get_cleaning_pipeline(cleaning_rules)
+        results: List[Dict[str, Any]] = [
+            dict(TextStats().as_dict(), chunk_count=0, duplicate_chunks=0, encoding=None, error=None)
+            for _ in files
+        ]
+        groups: Dict[str, List[Tuple[int, dict]]] = {}
+        if progress is not None:
+            progress("extracting", 0, None)
+        for index, (file_path, metadata) in enumerate(files):
+            try:
+                file_ext, file_size, encoding, file_splitter = self._prepare_document(file_path, splitter_type)
+                if file_ext not in ['.pdf', '.docx', '.txt', '.md']:
+                    raise ValueError(f"Unsupported file type: {file_ext}")
+            except Exception as e:
+                logger.warning("Skipping document %s: %s", file_path, e)
+                results[index]['error'] = str(e)
+                continue
+            results[index]['encoding'] = encoding
+            groups.setdefault(file_splitter, []).append((index, self._document_metadata(
+                file_path, file_ext, file_size, encoding, file_splitter, chunk_size, chunk_overlap,
+                length_function, cleaning.config_string, metadata)))
         
-    def search_knowledge_base(self, collection_name: str, query: str, k: int = 4):
+        for group_splitter, members in groups.items():
+            logger.info("Processing %d documents (splitter: %s, workers: %d)",
+                        len(members), group_splitter, max_workers)
+            # 片段迭代器在工作线程中才开始提取
+            texts = [self._iter_nonempty_segments(files[index][0], results[index]['encoding'])
+                     for index, _ in members]
+            outcome = self.vector_store.add_texts(
+                collection_name=collection_name,
+                texts=texts,
+                metadatas=[meta for _, meta in members],
+                splitter_type=group_splitter,
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap,
+                custom_separators=custom_separators,
+                length_function=length_function,
+                keep_separator=keep_separator,
+                add_start_index=add_start_index,
+                strip_whitespace=strip_whitespace,
+                cleaning_rules=cleaning.rules,
+                embedding_model=embedding_model,
+                vector_storage=vector_storage,
+                dedup_threshold=dedup_threshold,
+                progress=progress,
+                max_workers=max_workers,
+                per_document=True,
+                text_stats=True
+            )
+            for (index, _), document, stats in zip(members, outcome['documents'], outcome['stats']):
+                if document['error'] is None:
+                    results[index].update(stats)
+                results[index].update(document)
+        return results
+        
+    def split_document(self, file_path: str, collection_name: str, metadata: Optional[dict] = None,
+                       chunk_size: int = None, chunk_overlap: int = None,
+                       splitter_type: str = "recursive", custom_separators: str = "",
+                       length_function: str = "char_count", keep_separator: bool = True,
+                       add_start_index: bool = False, strip_whitespace: bool = True,
+                       cleaning_rules: str = None, embedding_model: Optional[str] = None) -> Dict[str, Any]:
+        """提取并分段一个文件但不写入集合，返回 chunks、metadatas、encoding 和 stats（文本统计）
+
+        与 process_document 使用相同的元数据和分段配置，供离线批量导入在工作进程中分段、
+        由主进程统一嵌入和写入。
+        """
+        file_ext, file_size, encoding, splitter_type = self._prepare_document(file_path, splitter_type)
+        cleaning = get_cleaning_pipeline(cleaning_rules)
+        doc_metadata = self._document_metadata(file_path, file_ext, file_size, encoding, splitter_type,
+                                               chunk_size, chunk_overlap, length_function,
+                                               cleaning.config_string, metadata)
+        chunk_document = self.vector_store.document_chunker(
+            collection_name, splitter_type=splitter_type, chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+            custom_separators=custom_separators, length_function=length_function,
+            keep_separator=keep_separator, add_start_index=add_start_index,
+            strip_whitespace=strip_whitespace, cleaning_rules=cleaning.rules, embedding_model=embedding_model
+        )
+        chunks, metadatas = [], []
+        stats = TextStats(self.vector_store._stats_token_counter(length_function))
+        for chunk, chunk_meta in chunk_document(self._iter_nonempty_segments(file_path, encoding), doc_metadata,
+                                                stats=stats):
+            chunks.append(chunk)
+            metadatas.append(chunk_meta)
+        return {'chunks': chunks, 'metadatas': metadatas, 'encoding': encoding, 'stats': stats.as_dict()}
+    
+    def copy_document(self, source_collection: str, source_document_id: str, target_collection: str,
+                      metadata: Optional[dict] = None, embedding_model: Optional[str] = None,
+                      vector_storage: Optional[str] = None, dedup_threshold: float = 0.0,
+                      progress: Optional[Callable[..., None]] = None) -> Dict[str, int]:
+        """复用已入库文档的分段和向量：从源集合复制 document_id 对应的分段到目标集合"""
+        if progress is not None:
+            progress("writing", 0, None)
+        return self.vector_store.copy_chunks(
+            source_collection, target_collection, where={"document_id": source_document_id},
+            metadata_updates=metadata, embedding_model=embedding_model, vector_storage=vector_storage,
+            dedup_threshold=dedup_threshold, progress=progress
+        )
+    
+    def delete_document(self, collection_name: str, document_id: str,
+                        embedding_model: Optional[str] = None) -> int:
+        """删除文档在集合中的分段及其近似去重指纹"""
+        return self.vector_store.delete_document_chunks(collection_name, document_id, embedding_model)
+    
+    def search_knowledge_base(self, collection_name: str, query: str, k: int = 4,
+                              embedding_model: Optional[str] = None):
         """Search the knowledge base"""
-        return self.vector_store.similarity_search(collection_name, query, k=k)
+        return self.vector_store.similarity_search(collection_name, query, k=k, embedding_model=embedding_model)
+    
+    async def asearch_knowledge_base(self, collection_name: str, query: str, k: int = 4,
+                                     embedding_model: Optional[str] = None):
+        """Search the knowledge base, batching query embeddings with concurrent searches"""
+        return await self.vector_store.asimilarity_search(
+            collection_name, query, k=k, embedding_model=embedding_model
+        )
     
     def get_document_chunks(self, collection_name: str, document_filename: str):
         """获取指定文档的所有分段"""
         try:
             return self.vector_store.get_document_chunks(collection_name, document_filename)
         except Exception as e:
-            print(f"Error getting document chunks for {document_filename}: {str(e)}")
+            logger.error("Error getting document chunks for %s: %s", document_filename, e)
             raise e
     
     def get_document_chunks_paginated(self, collection_name: str, document_filename: str, 
@@ -214,5 +369,5 @@ class KnowledgeService:
                 "pages": (total_chunks + page_size - 1) // page_size
             }
         except Exception as e:
-            print(f"Error getting paginated document chunks for {document_filename}: {str(e)}")
+            logger.error("Error getting paginated document chunks for %s: %s", document_filename, e)
             raise e 
\ No newline at end of file
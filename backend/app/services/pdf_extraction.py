@@ -0,0 +1,131 @@
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Deque, Iterator, List, Optional, Tuple
+import multiprocessing
+import signal
+import threading
+import pdfplumber
+from ..core.config import settings
+from ..core.log import get_logger
+from ..vectorstore.parallel_embeddings import available_cpus
+
+logger = get_logger(__name__)
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+class PageTimeout(Exception):
+    """单页提取超时"""
+
+
+def _raise_timeout(signum, frame):
+    raise PageTimeout()
+
+
+def _can_use_alarm() -> bool:
+    """SIGALRM 只能在主线程设置；工作进程的任务都在其主线程执行"""
+    return hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+
+
+def _extract_page(page, timeout: float) -> str:
+    if not (timeout > 0 and _can_use_alarm()):
+        return page.extract_text() or ""
+    previous = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return page.extract_text() or ""
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _extract_page_range(file_path: str, start: int, end: int, timeout: float) -> List[str]:
+    """工作进程入口：独立打开文件，提取 [start, end) 页的文本"""
+    texts = []
+    with pdfplumber.open(file_path) as pdf:
+        for number in range(start, end):
+            page = pdf.pages[number]
+            try:
+                texts.append(_extract_page(page, timeout))
+            except PageTimeout:
+                logger.warning("Page %d of %s timed out after %.1fs, skipped", number + 1, file_path, timeout)
+                texts.append("")
+            finally:
+                # 释放页面解析缓存，工作进程内存只跟当前页有关
+                page.flush_cache()
+    return texts
+
+
+def _get_executor(max_workers: int) -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # 使用 spawn，避免在多线程的服务进程中 fork
+            _executor = ProcessPoolExecutor(max_workers=max_workers,
+                                            mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def iter_pdf_pages(file_path: str, max_workers: Optional[int] = None, pages_per_task: Optional[int] = None,
+                   page_timeout: Optional[float] = None) -> Iterator[Tuple[int, str]]:
+    """按页序逐页产出 (页码, 文本)，页码从 1 开始
+
+    页数超过 pages_per_task 且有多个工作进程时，按页段分发到进程池，各进程独立打开文件，
+    结果按页段顺序取回。同时在途的页段最多 2 * max_workers 个，每取回一段再提交下一段，
+    消费方处理较慢时已提取未取走的文本也只有这几段。page_timeout > 0 时单页提取超过该秒数即跳过该页；超时依靠 SIGALRM，
+    因此在非主线程（如入库工作线程）中调用时，即使只有一个页段也交给工作进程提取。
+    """
+    max_workers = max_workers or settings.pdf_extract_workers or available_cpus()
+    pages_per_task = pages_per_task or settings.pdf_pages_per_task
+    page_timeout = settings.pdf_page_timeout if page_timeout is None else page_timeout
+
+    with pdfplumber.open(file_path) as pdf:
+        page_count = len(pdf.pages)
+    ranges = [(start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task)]
+
+    needs_worker = page_timeout > 0 and hasattr(signal, "setitimer") and not _can_use_alarm()
+    if (max_workers > 1 and len(ranges) > 1) or needs_worker:
+        done = 0  # 已产出的页段数，进程池故障时从这里开始在当前进程内继续
+        try:
+            executor = _get_executor(max_workers)
+            pending = iter(ranges)
+            in_flight: Deque[Tuple[int, Future]] = deque()
+
+            def submit_next():
+                for start, end in pending:
+                    in_flight.append((start, executor.submit(_extract_page_range, file_path, start, end,
+                                                             page_timeout)))
+                    return
+
+            for _ in range(2 * max_workers):
+                submit_next()
+            try:
+                while in_flight:
+                    start, future = in_flight.popleft()
+                    texts = future.result()
+                    submit_next()
+                    for offset, text in enumerate(texts):
+                        yield start + offset + 1, text
+                    done += 1
+            finally:
+                for _, future in in_flight:
+                    future.cancel()
+            return
+        except BrokenProcessPool as e:
+            logger.warning("PDF extraction pool failed, falling back to in-process extraction: %s", e)
+            shutdown()
+            ranges = ranges[done:]
+
+    for start, end in ranges:
+        for offset, text in enumerate(_extract_page_range(file_path, start, end, page_timeout)):
+            yield start + offset + 1, text
@@ -0,0 +1,121 @@
+from typing import Iterator, List
+import codecs
+import os
+from chardet.universaldetector import UniversalDetector
+from ..core.log import get_logger
+
+logger = get_logger(__name__)
+
+# 编码检测在文件头、中、尾各取一段样本，检测耗时与文件大小无关
+SAMPLE_SIZE = 64 * 1024
+# 流式解码每次读取的字节数
+READ_BLOCK_SIZE = 1024 * 1024
+
+# chardet 置信度不足时按顺序尝试的编码
+FALLBACK_ENCODINGS = ['utf-8', 'gbk', 'gb2312', 'utf-16', 'latin-1', 'cp1252']
+
+_BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+
+def read_samples(file_path: str, sample_size: int = SAMPLE_SIZE) -> List[bytes]:
+    """读取文件头、中、尾三段样本；文件不大于三段样本时整体作为一段"""
+    size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        if size <= 3 * sample_size:
+            return [f.read()]
+        samples = []
+        for offset in (0, (size - sample_size) // 2, size - sample_size):
+            f.seek(offset)
+            samples.append(f.read(sample_size))
+        return samples
+
+
+def _decodes(samples: List[bytes], encoding: str) -> bool:
+    """样本能否按 encoding 解码；中段和尾段样本可能从多字节字符中间开始"""
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        return False
+    last = len(samples) - 1
+    for index, sample in enumerate(samples):
+        if index == 0:
+            starts = (0,)
+        elif encoding.startswith('utf-8'):
+            # 跳过从上一个字符中间截入的续字节（最多 3 个）
+            skip = 0
+            while skip < 3 and skip < len(sample) and 0x80 <= sample[skip] <= 0xBF:
+                skip += 1
+            starts = (skip,)
+        else:
+            # 其他多字节编码无法定位字符边界，从首字节或第二个字节开始能解码即可
+            starts = (0, 1)
+        if not any(_decodes_from(sample, start, encoding, final=index == last) for start in starts):
+            return False
+    return True
+
+
+def _decodes_from(sample: bytes, start: int, encoding: str, final: bool) -> bool:
+    try:
+        codecs.getincrementaldecoder(encoding)().decode(sample[start:], final=final)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+
+def detect_encoding(file_path: str, sample_size: int = SAMPLE_SIZE) -> str:
+    """在有界样本上检测文本编码
+
+    先检查 BOM，再验证样本是否为合法 UTF-8（最常见的情况，无需 chardet）；
+    否则把样本依次交给 chardet 的增量检测器，置信度不足时按 FALLBACK_ENCODINGS
+    选第一个能解码样本的编码。
+    """
+    samples = read_samples(file_path, sample_size)
+    head = samples[0]
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding
+    if _decodes(samples, 'utf-8'):
+        return 'utf-8'
+
+    detector = UniversalDetector()
+    for sample in samples:
+        detector.feed(sample)
+        if detector.done:
+            break
+    result = detector.close()
+    encoding, confidence = result['encoding'], result['confidence']
+    logger.debug("Detected encoding: %s (confidence: %.2f)", encoding, confidence)
+    if encoding and confidence > 0.7 and _decodes(samples, encoding):
+        return codecs.lookup(encoding).name
+    for encoding in FALLBACK_ENCODINGS:
+        if _decodes(samples, encoding):
+            return encoding
+    return 'utf-8'
+
+
+def iter_decoded_text(file_path: str, encoding: str, block_size: int = READ_BLOCK_SIZE) -> Iterator[str]:
+    """按块读取并增量解码文件，跨块的多字节字符由解码器缓冲
+
+    样本之外出现无法解码的字节时，从该块起改为替换模式继续解码，不再整篇重试其他编码。
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    with open(file_path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            final = not block
+            state = decoder.getstate()
+            try:
+                text = decoder.decode(block, final=final)
+            except UnicodeDecodeError as e:
+                logger.warning("Invalid %s bytes in %s, replacing undecodable characters: %s", encoding, file_path, e)
+                decoder.setstate(state)
+                decoder.errors = 'replace'
+                text = decoder.decode(block, final=final)
+            if text:
+                yield text
+            if final:
+                return
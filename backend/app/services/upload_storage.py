@@ -0,0 +1,94 @@
+from fastapi import UploadFile
+from typing import Collection, List, Tuple
+import hashlib
+import os
+import uuid
+import zipfile
+import aiofiles
+
+# 上传文件每次读取并写盘的字节数，单个上传占用的内存与文件大小无关
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLarge(ValueError):
+    """上传文件超过大小限制"""
+
+    def __init__(self, size: int, limit: int):
+        self.size = size
+        self.limit = limit
+        super().__init__(f"File too large: more than {limit / (1024 * 1024):.1f}MB allowed")
+
+
+async def save_upload(upload: UploadFile, file_path: str, max_size: int,
+                      chunk_size: int = UPLOAD_CHUNK_SIZE) -> Tuple[int, str]:
+    """把上传文件分块流式写入 file_path，返回 (字节数, SHA-256 十六进制摘要)
+
+    已知大小超限时直接拒绝；否则边写边累计，一旦超过 max_size 立即停止并删除已写入的部分。
+    摘要在写入过程中顺带计算，无需再次读取文件。
+    """
+    if upload.size is not None and upload.size > max_size:
+        raise UploadTooLarge(upload.size, max_size)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(file_path, 'wb') as out:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLarge(size, max_size)
+                digest.update(chunk)
+                await out.write(chunk)
+    except BaseException:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+    return size, digest.hexdigest()
+
+
+def extract_archive(archive_path: str, dest_dir: str, allowed_extensions: Collection[str],
+                    max_size: int, chunk_size: int = UPLOAD_CHUNK_SIZE) -> List[dict]:
+    """逐个解出 zip 包中允许类型的文件，返回每个文件的 id、filename、path、size、content_hash 和 error
+
+    成员只取文件名部分，写入 dest_dir/<id>_<文件名>，不会写到目录之外；目录、隐藏文件和
+    不允许的类型直接跳过。每个成员按 max_size 限制流式解压并顺带计算摘要，超限（包括
+    声明大小与实际不符的成员）或解压失败时删除已写入的部分，在 error 中记录原因。
+    """
+    entries = []
+    with zipfile.ZipFile(archive_path) as archive:
+        for member in archive.infolist():
+            filename = os.path.basename(member.filename.replace("\\", "/"))
+            if member.is_dir() or not filename or filename.startswith(".") or "__MACOSX" in member.filename:
+                continue
+            if os.path.splitext(filename)[1].lower() not in allowed_extensions:
+                continue
+            entry_id = str(uuid.uuid4())
+            entry = {"id": entry_id, "filename": filename, "path": None, "size": member.file_size,
+                     "content_hash": None, "error": None}
+            entries.append(entry)
+            if member.file_size > max_size:
+                entry["error"] = str(UploadTooLarge(member.file_size, max_size))
+                continue
+            file_path = os.path.join(dest_dir, f"{entry_id}_{filename}")
+            digest = hashlib.sha256()
+            size = 0
+            try:
+                with archive.open(member) as source, open(file_path, 'wb') as out:
+                    while True:
+                        chunk = source.read(chunk_size)
+                        if not chunk:
+                            break
+                        size += len(chunk)
+                        if size > max_size:
+                            raise UploadTooLarge(size, max_size)
+                        digest.update(chunk)
+                        out.write(chunk)
+            except Exception as e:
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+                entry["error"] = str(e)
+                continue
+            entry.update(path=file_path, size=size, content_hash=digest.hexdigest())
+    return entries
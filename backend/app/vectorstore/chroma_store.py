@@ -9,106 +9,414 @@ from langchain.text_splitter import (
 )
 from langchain_community.vectorstores.utils import filter_complex_metadata
 import chromadb
-from typing import List, Optional, Any, Dict
+from typing import List, Optional, Any, Callable, Dict, Iterable, Iterator, Sequence, Tuple, Union
 import os
+import asyncio
+import json
 import numpy as np
-import re
+from .embedding_cache import (
+    EmbeddingCache, CachedEmbeddings, QueryEmbeddingCache, QueryCachedEmbeddings, query_cache_namespace
+)
+from .text_arrays import ALNUM, SPACE, encode_batch, char_classes, run_bounds, rank_within_rows
+from .parallel_embeddings import ParallelEmbeddings
+from .remote_embeddings import RemoteEmbeddings, resolve_embedding_provider
+from .hashing_embeddings import HashingEmbeddings, IdfStatistics, parse_hashing_model
+from .quantized_store import QuantizedIndex, QuantizedChroma, QUANTIZED_STORAGE_TYPES
+from .ingest_pipeline import (
+    MIN_SPLIT_WINDOW, iter_segment_windows, iter_chunk_spans, iter_concurrently, batched, embed_and_write
+)
+from .tokenizer import WordPieceTokenCounter, get_token_counter
+from .text_cleaning import get_cleaning_pipeline
+from .near_dedup import NearDuplicateIndex, max_hamming_distance
+from .semantic_splitter import SemanticTextSplitter
+from .text_stats import TextStats
+from .retriever import CollectionRetriever
+import shutil
+import uuid
+from ..core.config import settings
+from ..core.embedding_batcher import QueryEmbeddingBatcher
+from ..core.log import get_logger
+
+logger = get_logger(__name__)
 
 # 简单的演示嵌入模型（不需要API密钥）
 class DemoEmbeddings(Embeddings):
-    """演示用的简单嵌入模型，基于文本哈希"""
-    
+    """演示用的简单嵌入模型，基于文本哈希
+
+    整批文本在一个 float32 矩阵中完成计数和按行归一化，
+    输出与逐条计算的旧实现保持一致，已有集合无需重建索引。
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self.model_id = f"demo-{dim}"
+
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         """为文档列表生成嵌入向量"""
-        embeddings = []
-        for text in texts:
-            # 使用简单的哈希和字符统计生成向量
-            vector = self._text_to_vector(text)
-            embeddings.append(vector)
-        return embeddings
-    
+        if not texts:
+            return []
+        # Chroma 只接受 list[list[float]]，整块矩阵一次性转换
+        return self.embed_documents_array(texts).tolist()
+
     def embed_query(self, text: str) -> List[float]:
         """为查询文本生成嵌入向量"""
-        return self._text_to_vector(text)
-    
-    def _text_to_vector(self, text: str, dim: int = 384) -> List[float]:
-        """将文本转换为向量（演示用简单实现）"""
-        # 清理文本
-        text = text.lower().strip()
-        
-        # 使用字符统计和简单哈希创建向量
-        vector = [0.0] * dim
-        
-        # 基于字符频率
-        char_counts = {}
-        for char in text:
-            if char.isalnum():
-                char_counts[char] = char_counts.get(char, 0) + 1
-        
-        # 填充向量的前部分
-        for i, (char, count) in enumerate(char_counts.items()):
-            if i < dim // 2:
-                vector[i] = count / len(text)
-        
+        return self.embed_documents_array([text])[0].tolist()
+
+    def embed_documents_array(self, texts: List[str]) -> np.ndarray:
+        """批量生成嵌入矩阵，返回 C 连续的 (len(texts), dim) float32 数组"""
+        dim = self.dim
+        char_slots = dim // 2
+        word_slots = dim // 4
+        matrix = np.zeros((len(texts), dim), dtype=np.float32)
+        if not texts:
+            return matrix
+
+        # 清理文本，整批拼接为一个码点数组（以空格分隔各行）
+        codes, row_ids, lengths = encode_batch([text.lower().strip() for text in texts])
+        classes = char_classes(codes)
+
+        # 基于字符频率：按 (行, 字符) 计数，并按字符首次出现的顺序填充向量前半部分
+        positions = np.flatnonzero(classes & ALNUM)
+        if positions.size:
+            keys = (row_ids[positions] << 21) | codes[positions]
+            by_key = np.argsort(keys)
+            keys = keys[by_key]
+            group_starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+            counts = np.diff(np.append(group_starts, keys.size))
+            first_seen = np.minimum.reduceat(positions[by_key], group_starts)
+            order = np.argsort(first_seen)
+            rows = keys[group_starts][order] >> 21
+            slots = rank_within_rows(rows)
+            keep = slots < char_slots
+            rows = rows[keep]
+            matrix[rows, slots[keep]] = counts[order][keep] / lengths[rows]
+
         # 基于单词特征填充后半部分
-        words = text.split()
-        for i, word in enumerate(words[:dim//4]):
-            if i + dim//2 < dim:
-                vector[i + dim//2] = len(word) / 10.0
-        
-        # 标准化向量
-        magnitude = sum(x*x for x in vector) ** 0.5
-        if magnitude > 0:
-            vector = [x / magnitude for x in vector]
-        
-        return vector
+        in_word = (classes & SPACE) == 0
+        if in_word.any():
+            starts, ends = run_bounds(in_word)
+            rows = row_ids[starts]
+            slots = rank_within_rows(rows)
+            keep = slots < word_slots
+            matrix[rows[keep], char_slots + slots[keep]] = (ends - starts)[keep] / 10.0
+
+        # 按行标准化
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+
+
+_query_cache: Optional[QueryEmbeddingCache] = None
+
+
+def get_query_cache() -> Optional[QueryEmbeddingCache]:
+    """进程内共享的查询嵌入缓存，知识库检索、对话检索和 Agent 工具共用同一份"""
+    global _query_cache
+    if settings.query_embedding_cache_size <= 0:
+        return None
+    if _query_cache is None:
+        _query_cache = QueryEmbeddingCache(
+            max_entries=settings.query_embedding_cache_size,
+            ttl_seconds=settings.query_embedding_cache_ttl
+        )
+    return _query_cache
+
 
 class ChromaStore:
     def __init__(self, persist_directory: str = "chroma_data"):
         self.persist_directory = persist_directory
-        # 使用演示嵌入模型而不是OpenAI
-        self.embeddings = DemoEmbeddings()
+        self.embedding_cache = None
+        if settings.embedding_cache_enabled:
+            self.embedding_cache = EmbeddingCache(
+                settings.embedding_cache_path or os.path.join(persist_directory, "embedding_cache.sqlite3"),
+                max_entries=settings.embedding_cache_max_entries
+            )
+        self._embeddings_by_model: Dict[str, Embeddings] = {}
+        self._query_batchers: Dict[str, QueryEmbeddingBatcher] = {}
+        self._quantized_indexes: Dict[str, QuantizedIndex] = {}
+        self._text_splitters: Dict[tuple, Any] = {}
+        self._dedup_indexes: Dict[str, NearDuplicateIndex] = {}
+        self._embedder_records: Dict[str, Dict[str, Any]] = {}
+        # 已确认没有旧向量、无需推断嵌入模型的集合
+        self._unindexed_collections: set = set()
+        self.query_cache = get_query_cache()
+        # 未指定嵌入模型时使用演示嵌入模型而不是OpenAI
+        self.embeddings = self.get_embeddings()
         # 默认文本分割器配置（可以被覆盖）
         self.default_chunk_size = 1000
         self.default_chunk_overlap = 200
         
         # Ensure persist directory exists
         os.makedirs(persist_directory, exist_ok=True)
+    
+    def get_embeddings(self, embedding_model: Optional[str] = None,
+                       collection_name: Optional[str] = None) -> Embeddings:
+        """获取集合使用的 Embeddings
+
+        集合写入过向量后总是按 embedder_record 中记录的模型解析，查询与已写入的向量处于同一空间；
+        请求的模型与记录不一致、或记录的提供商已不可用时直接报错，不静默换用其他模型。
+        尚未写入的集合按 embedding_model 解析，未配置提供商时使用演示嵌入模型，首次写入时记录下来。
+        引入记录之前写入的集合按已存向量的维度推断嵌入模型并补写记录。
+        """
+        record = self.embedder_record(collection_name) if collection_name else None
+        if record is None and collection_name:
+            record = self._infer_embedder_record(collection_name, embedding_model)
+        if record is None:
+            return self._resolve_embeddings(embedding_model, collection_name)
+        if embedding_model and embedding_model != record["embedding_model"]:
+            raise ValueError(
+                f"Collection {collection_name} was indexed with embedding model "
+                f"{record['embedding_model'] or 'default'} ({record['model_id']}); "
+                f"re-index it before switching to {embedding_model}"
+            )
+        return self._resolve_embeddings(record["embedding_model"] or None, collection_name, record["model_id"])
+    
+    def _resolve_embeddings(self, embedding_model: Optional[str], collection_name: Optional[str],
+                            model_id: Optional[str] = None) -> Embeddings:
+        """按模型名解析 Embeddings；model_id 为集合记录的实际模型，解析结果必须与之一致"""
+        hashing = parse_hashing_model(embedding_model) if embedding_model else None
+        if hashing:
+            return self._get_hashing_embeddings(embedding_model, collection_name, *hashing)
+        if not embedding_model or (model_id or "").startswith("demo-"):
+            return self._demo_embeddings()
+        
+        embeddings = self._embeddings_by_model.get(embedding_model)
+        if embeddings is None:
+            remote = self._build_remote_embeddings(embedding_model)
+            if remote is None:
+                if model_id is not None:
+                    raise ValueError(
+                        f"Embedding model {embedding_model} ({model_id}) used by collection {collection_name} "
+                        f"has no configured provider"
+                    )
+                # 回退不按模型缓存，配置提供商后新集合无需重启即可使用
+                logger.warning("No configured provider for embedding model %s, using demo embeddings", embedding_model)
+                return self._demo_embeddings()
+            embeddings = self._embeddings_by_model[embedding_model] = self._with_document_cache(remote)
+        if model_id is not None and embeddings.model_id != model_id:
+            raise ValueError(
+                f"Collection {collection_name} was indexed with {model_id}, "
+                f"but embedding model {embedding_model} now resolves to {embeddings.model_id}"
+            )
+        return embeddings
+    
+    def _demo_embeddings(self) -> Embeddings:
+        """演示嵌入模型，大批量嵌入分发到进程池"""
+        if "" not in self._embeddings_by_model:
+            embeddings = ParallelEmbeddings(
+                DemoEmbeddings(),
+                max_workers=settings.embedding_pool_size,
+                min_batch_size=settings.embedding_parallel_min_batch
+            )
+            self._embeddings_by_model[""] = self._with_document_cache(embeddings)
+        return self._embeddings_by_model[""]
+    
+    def _with_document_cache(self, embeddings: Embeddings) -> Embeddings:
+        if self.embedding_cache is None:
+            return embeddings
+        return CachedEmbeddings(embeddings, self.embedding_cache, embeddings.model_id)
+    
+    def _embedder_path(self, collection_name: str) -> str:
+        return os.path.join(self.persist_directory, "embedders", f"{collection_name}.json")
+    
+    def embedder_record(self, collection_name: str) -> Optional[Dict[str, Any]]:
+        """集合首次写入向量时记录的嵌入模型：embedding_model（知识库配置的模型名）、model_id、dimension"""
+        record = self._embedder_records.get(collection_name)
+        if record is None:
+            path = self._embedder_path(collection_name)
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    record = self._embedder_records[collection_name] = json.load(f)
+        return record
+    
+    def _save_embedder_record(self, collection_name: str, record: Dict[str, Any]):
+        path = self._embedder_path(collection_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(record, f)
+        os.replace(tmp_path, path)
+        self._embedder_records[collection_name] = record
+    
+    def _infer_embedder_record(self, collection_name: str, embedding_model: Optional[str]) -> Optional[Dict[str, Any]]:
+        """没有记录但已有向量的集合：按已存向量的维度推断嵌入模型
+
+        引入记录之前只有 384 维演示嵌入模型写入过向量，推断结果记在知识库配置的模型名下，
+        之后按该模型名检索和写入都使用演示模型，不会换成维度不同的远程模型。
+        未指定模型名时只返回推断结果，不写入记录。集合为空或不存在时返回 None。
+        """
+        if collection_name in self._unindexed_collections:
+            return None
+        client = chromadb.PersistentClient(path=self.persist_directory)
+        try:
+            stored = client.get_collection(collection_name).get(limit=1, include=["embeddings"])
+        except ValueError:
+            stored = {"ids": []}
+        if not stored["ids"]:
+            self._unindexed_collections.add(collection_name)
+            return None
+        dimension = len(stored["embeddings"][0])
+        demo = DemoEmbeddings()
+        if dimension != demo.dim:
+            raise ValueError(
+                f"Collection {collection_name} holds {dimension}-dim vectors from an unrecorded embedding model; "
+                f"re-index it"
+            )
+        record = {"embedding_model": embedding_model or "", "model_id": demo.model_id, "dimension": dimension}
+        if embedding_model:
+            logger.info("Collection %s has no embedder record, inferred %s from stored vectors",
+                        collection_name, demo.model_id)
+            self._save_embedder_record(collection_name, record)
+        return record
+    
+    def _record_embedder(self, collection_name: str, embedding_model: Optional[str], embeddings: Embeddings,
+                         vectors: Sequence[Sequence[float]]):
+        """写入向量前记录或核对集合的嵌入模型和维度"""
+        if not len(vectors):
+            return
+        dimension = len(vectors[0])
+        record = self.embedder_record(collection_name)
+        if record is None:
+            self._save_embedder_record(collection_name, {"embedding_model": embedding_model or "",
+                                                         "model_id": embeddings.model_id, "dimension": dimension})
+        elif record["model_id"] != embeddings.model_id or record["dimension"] != dimension:
+            raise ValueError(
+                f"Collection {collection_name} holds {record['dimension']}-dim vectors from {record['model_id']}, "
+                f"refusing to write {dimension}-dim vectors from {embeddings.model_id}"
+            )
+    
+    def _get_hashing_embeddings(self, embedding_model: str, collection_name: Optional[str],
+                                dim: int, use_idf: bool) -> HashingEmbeddings:
+        """离线特征哈希嵌入模型；IDF 统计按集合保存
+
+        写入的每个分段都要计入文档频率，因此不经过文档嵌入缓存；整批在 NumPy 中计算，不分发到进程池。
+        """
+        use_idf = use_idf and bool(collection_name)
+        key = f"{embedding_model}:{collection_name}" if use_idf else embedding_model
+        if key not in self._embeddings_by_model:
+            idf = IdfStatistics(self._idf_path(collection_name), dim) if use_idf else None
+            self._embeddings_by_model[key] = HashingEmbeddings(dim=dim, idf=idf, model_id=key)
+        return self._embeddings_by_model[key]
+    
+    def _idf_path(self, collection_name: str) -> str:
+        return os.path.join(self.persist_directory, "hashing_idf", f"{collection_name}.json")
+    
+    def get_query_batcher(self, embedding_model: Optional[str] = None,
+                          collection_name: Optional[str] = None) -> QueryEmbeddingBatcher:
+        """获取嵌入模型对应的查询微批合并器"""
+        embeddings = self.get_embeddings(embedding_model, collection_name)
+        key = embeddings.model_id
+        if key not in self._query_batchers:
+            # 查询不写入文档嵌入缓存；查询向量计算方式不同的模型提供 aembed_queries
+            query_embeddings = embeddings.underlying if isinstance(embeddings, CachedEmbeddings) else embeddings
+            embed_batch = getattr(query_embeddings, "aembed_queries", None) or query_embeddings.aembed_documents
+            self._query_batchers[key] = QueryEmbeddingBatcher(
+                embed_batch,
+                window_ms=settings.query_embedding_batch_window_ms,
+                max_batch_size=settings.query_embedding_max_batch
+            )
+        return self._query_batchers[key]
+    
+    async def aembed_query(self, query: str, embedding_model: Optional[str] = None,
+                           collection_name: Optional[str] = None) -> List[float]:
+        """查询嵌入：先查共享缓存，未命中时经微批合并器计算"""
+        namespace = query_cache_namespace(self.get_embeddings(embedding_model, collection_name))
+        if self.query_cache is not None:
+            vector = self.query_cache.get(namespace, query)
+            if vector is not None:
+                return vector
+        vector = await self.get_query_batcher(embedding_model, collection_name).embed(query)
+        if self.query_cache is not None:
+            self.query_cache.put(namespace, query, vector)
+        return vector
+    
+    def as_retriever(self, collection_name: str, embedding_model: Optional[str] = None,
+                     k: int = 4) -> CollectionRetriever:
+        """对话检索用的检索器，异步检索的查询嵌入与知识库搜索共用缓存和微批合并器"""
+        return CollectionRetriever(store=self, collection_name=collection_name,
+                                   embedding_model=embedding_model, k=k)
+    
+    def embedding_stats(self) -> Dict[str, Any]:
+        """嵌入缓存和查询微批合并的统计信息"""
+        return {
+            "document_cache": self.embedding_cache.stats() if self.embedding_cache else None,
+            "query_cache": self.query_cache.stats() if self.query_cache else None,
+            "query_batching": {model_id: batcher.stats() for model_id, batcher in self._query_batchers.items()},
+            "quantized_collections": {name: index.memory_usage() for name, index in self._quantized_indexes.items()},
+        }
+    
+    def _build_remote_embeddings(self, embedding_model: str) -> Optional[RemoteEmbeddings]:
+        """通过 ModelFactory 解析嵌入模型的提供商"""
+        try:
+            resolved = resolve_embedding_provider(embedding_model)
+        except Exception as e:
+            logger.warning("Failed to resolve embedding model %s: %s", embedding_model, e)
+            return None
+        if not resolved:
+            return None
+        provider_name, provider = resolved
+        return RemoteEmbeddings(
+            provider,
+            embedding_model,
+            model_id=f"{provider_name}:{embedding_model}",
+            batch_size=settings.embedding_batch_size,
+            max_batch_tokens=settings.embedding_max_batch_tokens,
+            max_concurrency=settings.embedding_max_concurrency,
+            tokens_per_minute=settings.embedding_tokens_per_minute
+        )
         
     def _create_text_splitter(self, splitter_type: str = "recursive", 
                              chunk_size: int = None, chunk_overlap: int = None,
                              custom_separators: str = "", length_function: str = "char_count",
                              keep_separator: bool = True, add_start_index: bool = False,
-                             strip_whitespace: bool = True):
+                             strip_whitespace: bool = True, embeddings: Optional[Embeddings] = None):
+        """Return a text splitter for the configuration, reusing a cached instance when possible
+
+        semantic 分割器需要知识库的嵌入模型，缓存键中带上模型标识。句子嵌入只用于找切点，
+        不经过文档嵌入缓存，以免大量一次性的句子向量挤掉分段向量。
+        """
+        key = (
+            splitter_type,
+            chunk_size or self.default_chunk_size,
+            chunk_overlap or self.default_chunk_overlap,
+            custom_separators or "",
+            length_function,
+            keep_separator,
+            add_start_index,
+            strip_whitespace,
+        )
+        if splitter_type == "semantic":
+            embeddings = embeddings or self.embeddings
+            if isinstance(embeddings, CachedEmbeddings):
+                embeddings = embeddings.underlying
+            key += (embeddings.model_id,)
+        splitter = self._text_splitters.get(key)
+        if splitter is None:
+            # 分割器只保存配置，split_text 不修改状态，可在多个上传之间共享
+            splitter = self._text_splitters[key] = self._build_text_splitter(*key[:8], embeddings=embeddings)
+            logger.debug("Created text splitter %s", key)
+        return splitter
+    
+    def _build_text_splitter(self, splitter_type: str, chunk_size: int, chunk_overlap: int,
+                             custom_separators: str, length_function: str,
+                             keep_separator: bool, add_start_index: bool, strip_whitespace: bool,
+                             embeddings: Optional[Embeddings] = None):
         """Create a text splitter with specified parameters and type"""
-        chunk_size = chunk_size or self.default_chunk_size
-        chunk_overlap = chunk_overlap or self.default_chunk_overlap
-        
-        print(f"\nCreating text splitter with configuration:")
-        print(f"Type: {splitter_type}")
-        print(f"Chunk size: {chunk_size}")
-        print(f"Chunk overlap: {chunk_overlap}")
-        print(f"Length function: {length_function}")
-        print(f"Keep separator: {keep_separator}")
-        print(f"Add start index: {add_start_index}")
-        print(f"Strip whitespace: {strip_whitespace}")
-        
         # 解析自定义分隔符
         separators = None
         if custom_separators:
-            try:
-                separators = [sep.strip() for sep in custom_separators.split(',') if sep.strip()]
-                print(f"Custom separators: {separators}")
-            except:
-                separators = None
-                print("Failed to parse custom separators")
+            separators = [sep.strip() for sep in custom_separators.split(',') if sep.strip()]
+        
+        # token 计数器在创建分割器时取一次，避免分割过程中反复查找
+        length = len if length_function == "char_count" else self._token_counter().count
         
         # 根据分割器类型创建相应的文本分割器
         if splitter_type == "recursive":
             return RecursiveCharacterTextSplitter(
                 chunk_size=chunk_size,
                 chunk_overlap=chunk_overlap,
-                length_function=len if length_function == "char_count" else self._token_count,
+                length_function=length,
                 keep_separator=keep_separator,
                 add_start_index=add_start_index,
                 strip_whitespace=strip_whitespace,
@@ -118,7 +426,7 @@ class ChromaStore:
             return CharacterTextSplitter(
                 chunk_size=chunk_size,
                 chunk_overlap=chunk_overlap,
-                length_function=len if length_function == "char_count" else self._token_count,
+                length_function=length,
                 keep_separator=keep_separator,
                 add_start_index=add_start_index,
                 strip_whitespace=strip_whitespace,
@@ -128,7 +436,7 @@ class ChromaStore:
             return MarkdownTextSplitter(
                 chunk_size=chunk_size,
                 chunk_overlap=chunk_overlap,
-                length_function=len if length_function == "char_count" else self._token_count,
+                length_function=length,
                 keep_separator=keep_separator,
                 add_start_index=add_start_index,
                 strip_whitespace=strip_whitespace,
@@ -137,7 +445,7 @@ class ChromaStore:
             return PythonCodeTextSplitter(
                 chunk_size=chunk_size,
                 chunk_overlap=chunk_overlap,
-                length_function=len if length_function == "char_count" else self._token_count,
+                length_function=length,
                 keep_separator=keep_separator,
                 add_start_index=add_start_index,
                 strip_whitespace=strip_whitespace,
@@ -147,224 +455,635 @@ class ChromaStore:
             return RecursiveCharacterTextSplitter(
                 chunk_size=chunk_size,
                 chunk_overlap=chunk_overlap,
-                length_function=len if length_function == "char_count" else self._token_count,
+                length_function=length,
                 keep_separator=keep_separator,
                 add_start_index=add_start_index,
                 strip_whitespace=strip_whitespace,
                 separators=["<div>", "<p>", "<br>", "\n", " ", ""],
             )
+        elif splitter_type == "semantic":
+            # 按话题边界切分，相邻句子嵌入距离突增处切开
+            return SemanticTextSplitter(
+                embeddings,
+                breakpoint_percentile=settings.semantic_breakpoint_percentile,
+                chunk_size=chunk_size,
+                length_function=length,
+                add_start_index=add_start_index,
+                strip_whitespace=strip_whitespace,
+            )
         else:
             # 默认使用递归字符分割器
             return RecursiveCharacterTextSplitter(
                 chunk_size=chunk_size,
                 chunk_overlap=chunk_overlap,
-                length_function=len if length_function == "char_count" else self._token_count,
+                length_function=length,
                 keep_separator=keep_separator,
                 add_start_index=add_start_index,
                 strip_whitespace=strip_whitespace,
             )
     
-    def _token_count(self, text: str) -> int:
-        """简单的token计数实现"""
-        # 这里使用简单的词语分割作为token计数
-        return len(text.split())
+    def _token_counter(self) -> WordPieceTokenCounter:
+        """基于本地 WordPiece 词表的 token 计数器，中文按字计数"""
+        return get_token_counter(settings.tokenizer_vocab_path, settings.tokenizer_cache_size)
     
-    def _apply_cleaning_rules(self, text: str, cleaning_rules: List[str]) -> str:
-        """应用文本清洗规则"""
-        if not cleaning_rules:
-            return text
-        
-        # 移除多余空白
-        if "remove_extra_whitespace" in cleaning_rules:
-            text = re.sub(r'\s+', ' ', text)
-            text = text.strip()
-        
-        # 移除URL和邮箱
-        if "remove_urls_emails" in cleaning_rules:
-            # 移除URL
-            text = re.sub(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', '', text)
-            # 移除邮箱
-            text = re.sub(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', '', text)
-        
-        # 标准化Unicode
-        if "normalize_unicode" in cleaning_rules:
-            import unicodedata
-            text = unicodedata.normalize('NFKC', text)
-        
-        # 移除特殊字符
-        if "remove_special_chars" in cleaning_rules:
-            text = re.sub(r'[^\w\s\u4e00-\u9fff.,!?;:(){}[\]"\'`~@#$%^&*+=|\\/<>-]', '', text)
-        
-        # 保持文档结构（这里主要是保留段落分隔符）
-        if "preserve_structure" in cleaning_rules:
-            # 确保段落间有适当的分隔
-            text = re.sub(r'\n{3,}', '\n\n', text)
-        
-        return text
-        
-    def create_collection(self, collection_name: str) -> Chroma:
+    def _stats_token_counter(self, length_function: str) -> Optional[WordPieceTokenCounter]:
+        """文档统计使用的 token 计数器，不统计 token 数时返回 None
+
+        按 token_count 分段时分割器已用同一计数器计过各分段，按片段缓存的计数大多可以复用；
+        按字符数分段时统计 token 数需要额外一遍 WordPiece 计数，只在开启 document_token_stats 时进行。
+        """
+        if length_function == "token_count" or settings.document_token_stats:
+            return self._token_counter()
+        return None
+    
+    def create_collection(self, collection_name: str, embedding_model: Optional[str] = None,
+                          vector_storage: Optional[str] = None) -> Chroma:
         """Create a new Chroma collection"""
+        embeddings = self.get_embeddings(embedding_model, collection_name)
+        if self.query_cache is not None:
+            embeddings = QueryCachedEmbeddings(embeddings, self.query_cache)
+        index = self._get_quantized_index(collection_name, vector_storage)
+        if index is not None:
+            return QuantizedChroma(
+                index=index,
+                collection_name=collection_name,
+                embedding_function=embeddings,
+                persist_directory=self.persist_directory
+            )
         return Chroma(
             collection_name=collection_name,
-            embedding_function=self.embeddings,
+            embedding_function=embeddings,
             persist_directory=self.persist_directory  # 使用主目录而不是子目录
         )
     
-    def add_texts(self, collection_name: str, texts: List[str], metadatas: Optional[List[dict]] = None, 
+    def _quantized_dir(self, collection_name: str) -> str:
+        return os.path.join(self.persist_directory, "quantized", collection_name)
+    
+    def _get_quantized_index(self, collection_name: str, vector_storage: Optional[str] = None) -> Optional[QuantizedIndex]:
+        """量化存储的集合返回其索引；已量化的集合自动识别，新集合按 vector_storage 创建"""
+        if collection_name not in self._quantized_indexes:
+            directory = self._quantized_dir(collection_name)
+            if QuantizedIndex.exists(directory) or vector_storage in QUANTIZED_STORAGE_TYPES:
+                self._quantized_indexes[collection_name] = QuantizedIndex(directory, storage=vector_storage)
+        return self._quantized_indexes.get(collection_name)
+    
+    def document_chunker(self, collection_name: str, splitter_type: str = "recursive", chunk_size: int = None,
+                         chunk_overlap: int = None, custom_separators: str = "",
+                         length_function: str = "char_count", keep_separator: bool = True,
+                         add_start_index: bool = False, strip_whitespace: bool = True,
+                         cleaning_rules: Optional[Sequence[str]] = None,
+                         embedding_model: Optional[str] = None) -> Callable[..., Iterator[Tuple[str, dict]]]:
+        """按分段配置返回分段函数 chunk(segments, metadata=None, index=0, stats=None)
+
+        segments 为 (页码, 文本) 片段的可迭代对象，分段函数惰性产出 (分段, 元数据)。
+        传入 TextStats 时，提取出的文本在清洗和分割前顺带累计到其中。
+        分割器和清洗流水线只在这里创建一次，分段函数可在多个线程中同时使用。
+        """
+        text_splitter = self._create_text_splitter(
+            splitter_type=splitter_type,
+            chunk_size=chunk_size, 
+            chunk_overlap=chunk_overlap,
+            custom_separators=custom_separators,
+            length_function=length_function,
+            keep_separator=keep_separator,
+            add_start_index=add_start_index,
+            strip_whitespace=strip_whitespace,
+            embeddings=self.get_embeddings(embedding_model, collection_name)
+        )
+        cleaning = get_cleaning_pipeline(cleaning_rules)
+        chunk_config = {
+            'chunk_size_used': chunk_size or self.default_chunk_size,
+            'chunk_overlap_used': chunk_overlap or self.default_chunk_overlap,
+            'splitter_type': splitter_type,
+            'length_function': length_function,
+        }
+        window_size = max(MIN_SPLIT_WINDOW, 64 * (chunk_size or self.default_chunk_size))
+        
+        def chunk(segments: Iterable[Tuple[Optional[int], str]], metadata: Optional[dict] = None,
+                  index: int = 0, stats: Optional[TextStats] = None) -> Iterator[Tuple[str, dict]]:
+            if metadata is not None:
+                base_meta = self._clean_metadata(metadata)
+                base_meta['cleaning_rules_applied'] = cleaning.config_string
+            else:
+                base_meta = {'source': f'document_{index}', 'cleaning_rules_applied': ''}
+            base_meta.update(chunk_config)
+            
+            chunk_idx = 0
+            window_offset = 0
+            for page, window in iter_segment_windows(segments, window_size):
+                if stats is not None:
+                    stats.update(window)
+                # 清洗规则逐窗口执行，不对整篇文本生成清洗后的副本
+                if cleaning:
+                    window = cleaning(window)
+                chunks = text_splitter.split_text(window)
+                # 偏移相对于清洗后的文档文本，写入元数据供分段浏览和引用定位
+                spans = (iter_chunk_spans(window, chunks, window_offset) if add_start_index
+                         else ((text, None, None) for text in chunks))
+                for text, start, end in spans:
+                    chunk_meta = dict(base_meta)
+                    chunk_meta['chunk_index'] = chunk_idx
+                    if page is not None:
+                        chunk_meta['page'] = page
+                    if start is not None:
+                        chunk_meta['start_index'] = start
+                        chunk_meta['end_index'] = end
+                    chunk_idx += 1
+                    yield text, chunk_meta
+                window_offset += len(window)
+            logger.debug("Split text %d into %d chunks", index + 1, chunk_idx)
+        
+        return chunk
+    
+    def add_texts(self, collection_name: str, texts: List[Union[str, Iterable[Tuple[Optional[int], str]]]],
+                  metadatas: Optional[List[dict]] = None,
                   splitter_type: str = "recursive", chunk_size: int = None, chunk_overlap: int = None,
                   custom_separators: str = "", length_function: str = "char_count",
                   keep_separator: bool = True, add_start_index: bool = False,
-                  strip_whitespace: bool = True, cleaning_rules: List[str] = None):
-        """Add texts to a collection with advanced segmentation parameters"""
+                  strip_whitespace: bool = True, cleaning_rules: Optional[Sequence[str]] = None,
+                  embedding_model: Optional[str] = None, vector_storage: Optional[str] = None,
+                  dedup_threshold: float = 0.0,
+                  progress: Optional[Callable[..., None]] = None,
+                  max_workers: int = 1, per_document: Optional[bool] = None,
+                  text_stats: bool = False) -> Dict[str, Any]:
+        """Add texts to a collection with advanced segmentation parameters
+
+        texts 的每一项是整篇文本，或提取器产出的 (页码, 文本) 片段迭代器；片段在分割时
+        才逐个取出，页码（非 None 时）写入分段元数据的 page 字段。
+        dedup_threshold > 0 启用近似去重：与集合中已有分段的 SimHash 相似度达到阈值的分段
+        不再嵌入和写入。返回写入的分段数和跳过的重复分段数。
+        progress(stage, processed, total) 依次收到 splitting、embedding（已嵌入分段数 /
+        分段总数，总数在分段全部产出前为 None）和 writing（已写入分段数 / 分段总数）阶段；
+        嵌入和写入在流水线中交替进行，每写入一批即发布一次 writing 进度。
+
+        per_document（默认在传入多篇文本时开启）按文档隔离失败：某篇提取或分割出错只记录该篇的
+        错误并删除其已写入的分段，其余文档照常入库；返回值另含 documents，按 texts 顺序给出
+        每篇的 chunk_count、duplicate_chunks 和 error。max_workers > 1 时由多个线程同时分割不同文档，
+        各文档的分段汇入同一条嵌入/写入流水线，按 ingest_batch_size 成批嵌入，最后只持久化一次。
+        text_stats 时返回值另含 stats：按 texts 顺序给出每篇的词数、字符数、CJK 字符数和 token 数，
+        在文本流经分割器时一并统计（token 数的统计条件见 _stats_token_counter）。
+        """
         try:
-            collection = self.create_collection(collection_name)
-            
-            # Create text splitter
-            text_splitter = self._create_text_splitter(
-                splitter_type=splitter_type,
-                chunk_size=chunk_size, 
-                chunk_overlap=chunk_overlap,
-                custom_separators=custom_separators,
-                length_function=length_function,
-                keep_separator=keep_separator,
-                add_start_index=add_start_index,
-                strip_whitespace=strip_whitespace
+            collection = self.create_collection(collection_name, embedding_model, vector_storage)
+            chunk_document = self.document_chunker(
+                collection_name, splitter_type=splitter_type, chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                custom_separators=custom_separators, length_function=length_function,
+                keep_separator=keep_separator, add_start_index=add_start_index,
+                strip_whitespace=strip_whitespace, cleaning_rules=cleaning_rules, embedding_model=embedding_model
             )
+            isolated = len(texts) > 1 if per_document is None else per_document
+            documents = [{'chunk_count': 0, 'duplicate_chunks': 0, 'error': None} for _ in texts]
+            # 多文档时记录每篇已写入的分段 id，出错文档据此撤销
+            written_ids: List[List[str]] = [[] for _ in texts]
+            stats = [TextStats(self._stats_token_counter(length_function)) for _ in texts] if text_stats else None
             
-            # Process each text and split into chunks
-            all_chunks = []
-            all_metadata = []
-            
-            for i, text in enumerate(texts):
-                # Skip empty texts
-                if not text or not text.strip():
-                    print(f"Skipping empty text at index {i}")
-                    continue
-                
-                print(f"\nProcessing text {i+1}/{len(texts)}")
-                print(f"Original text length: {len(text)} characters")
-                
-                # Apply cleaning rules if specified
-                original_text = text
-                if cleaning_rules:
-                    text = self._apply_cleaning_rules(text, cleaning_rules)
-                    print(f"Text length after cleaning: {len(text)} characters")
-                    print(f"Applied cleaning rules: {cleaning_rules}")
-                    
-                # Split text into chunks
-                chunks = text_splitter.split_text(text)
-                print(f"Split into {len(chunks)} chunks")
-                print(f"Chunk sizes: {[len(chunk) for chunk in chunks]}")
-                
-                all_chunks.extend(chunks)
+            def iter_document_chunks(i: int):
+                """惰性产出第 i 篇文本的 (分段, 元数据)，每个分段的元数据单独生成"""
+                text = texts[i]
+                if isinstance(text, str):
+                    # Skip empty texts
+                    if not text or not text.strip():
+                        logger.debug("Skipping empty text at index %d", i)
+                        return
+                    logger.debug("Processing text %d/%d (%d characters)", i + 1, len(texts), len(text))
+                    segments = [(None, text)]
+                else:
+                    logger.debug("Processing text %d/%d (streamed segments)", i + 1, len(texts))
+                    segments = text
                 
-                # Prepare metadata for each chunk
-                if metadatas and i < len(metadatas):
-                    chunk_metadata = metadatas[i]
-                    for chunk_idx, chunk in enumerate(chunks):
-                        # Create clean metadata dict with only basic types
-                        chunk_meta = {}
-                        
-                        # Copy basic types from original metadata
-                        for key, value in chunk_metadata.items():
-                            if value is None:
-                                chunk_meta[key] = ""
-                            elif isinstance(value, (str, int, float, bool)):
-                                chunk_meta[key] = value
-                            elif isinstance(value, list):
-                                # Convert list to comma-separated string
-                                chunk_meta[key] = ','.join(str(item) for item in value) if value else ""
-                            else:
-                                # Convert other types to string
-                                chunk_meta[key] = str(value)
-                        
-                        # Add chunk-specific metadata
-                        chunk_meta.update({
-                            'chunk_index': chunk_idx,
-                            'total_chunks': len(chunks),
-                            'chunk_size_used': chunk_size or self.default_chunk_size,
-                            'chunk_overlap_used': chunk_overlap or self.default_chunk_overlap,
-                            'splitter_type': splitter_type,
-                            'length_function': length_function,
-                            'cleaning_rules_applied': ','.join(cleaning_rules) if cleaning_rules else '',
-                        })
-                        all_metadata.append(chunk_meta)
+                metadata = metadatas[i] if metadatas and i < len(metadatas) else None
+                yield from chunk_document(segments, metadata, i, stats[i] if stats else None)
+            
+            def iter_isolated(i: int):
+                """单篇出错时记录错误并结束该篇，不影响其他文档；结束时产出 (None, None) 作为标记"""
+                try:
+                    yield from iter_document_chunks(i)
+                except Exception as e:
+                    logger.warning("Failed to split text %d/%d: %s", i + 1, len(texts), e)
+                    documents[i]['error'] = str(e)
+                yield None, None
+            
+            def iter_chunks():
+                """产出 (文档序号, 分段, 元数据)"""
+                document_chunks = iter_isolated if isolated else iter_document_chunks
+                if max_workers > 1 and len(texts) > 1:
+                    producers = [document_chunks(i) for i in range(len(texts))]
+                    for i, (chunk, chunk_meta) in iter_concurrently(producers, max_workers,
+                                                                   queue_size=settings.ingest_batch_size):
+                        yield i, chunk, chunk_meta
                 else:
-                    # Default metadata for each chunk
-                    for chunk_idx, chunk in enumerate(chunks):
-                        all_metadata.append({
-                            'chunk_index': chunk_idx,
-                            'total_chunks': len(chunks),
-                            'source': f'document_{i}',
-                            'chunk_size_used': chunk_size or self.default_chunk_size,
-                            'chunk_overlap_used': chunk_overlap or self.default_chunk_overlap,
-                            'splitter_type': splitter_type,
-                            'length_function': length_function,
-                            'cleaning_rules_applied': '',
-                        })
+                    for i in range(len(texts)):
+                        for chunk, chunk_meta in document_chunks(i):
+                            yield i, chunk, chunk_meta
             
-            # Add chunks to collection in batches
-            if all_chunks:
-                batch_size = 5000  # Safe batch size for ChromaDB
-                total_chunks = len(all_chunks)
-                
-                print(f"Processing {total_chunks} chunks in batches of {batch_size}")
-                print(f"Using splitter: {splitter_type}, chunk_size: {chunk_size or self.default_chunk_size}, chunk_overlap: {chunk_overlap or self.default_chunk_overlap}")
-                
-                for i in range(0, total_chunks, batch_size):
-                    end_idx = min(i + batch_size, total_chunks)
-                    batch_chunks = all_chunks[i:end_idx]
-                    batch_metadata = all_metadata[i:end_idx] if all_metadata else None
-                    
-                    print(f"Adding batch {i//batch_size + 1}: chunks {i+1}-{end_idx}")
-                    
-                    # Add batch to collection
-                    collection.add_texts(
-                        texts=batch_chunks, 
-                        metadatas=batch_metadata
-                    )
-                
+            embedded = 0
+            split_total = None
+            
+            def embed(batch_chunks: List[str]):
+                nonlocal embedded
+                vectors = collection._embedding_function.embed_documents(batch_chunks)
+                embedded += len(batch_chunks)
+                if progress is not None:
+                    progress("embedding", embedded, split_total)
+                return vectors
+            
+            written = 0
+            
+            def write(batch_chunks: List[str], batch_metadata: List[dict], vectors, batch_ids: List[str]):
+                nonlocal written
+                self._record_embedder(collection_name, embedding_model, collection._embedding_function, vectors)
+                self._write_chunks(collection, batch_chunks, batch_metadata, vectors, ids=batch_ids)
+                written += len(batch_chunks)
+                if progress is not None:
+                    progress("writing", written, split_total)
+            
+            dedup_index = self._get_dedup_index(collection_name, dedup_threshold) if dedup_threshold > 0 else None
+            duplicates = 0
+            
+            def filter_duplicates(items: List[Tuple[int, str, dict]]) -> List[Tuple[int, str, dict]]:
+                """去掉近似重复的分段；多文档时指纹按文档隔离，文档完整分割后才对其他文档可见"""
+                nonlocal duplicates
+                if dedup_index is None or not items:
+                    return items
+                scopes = [i for i, _, _ in items] if isolated else None
+                keep = dedup_index.filter_new([chunk for _, chunk, _ in items], scopes)
+                duplicates += len(items) - sum(keep)
+                for (i, _, _), is_new in zip(items, keep):
+                    if not is_new:
+                        documents[i]['duplicate_chunks'] += 1
+                return [item for item, is_new in zip(items, keep) if is_new]
+            
+            def iter_deduplicated():
+                """按批去重；遇到文档结束标记时先处理之前的分段，再发布或丢弃该文档的指纹"""
+                for batch in batched(iter_chunks(), settings.ingest_batch_size):
+                    kept, run = [], []
+                    for item in batch:
+                        if item[1] is not None:
+                            run.append(item)
+                            continue
+                        kept.extend(filter_duplicates(run))
+                        run = []
+                        if dedup_index is not None:
+                            if documents[item[0]]['error']:
+                                dedup_index.drop(item[0])
+                            else:
+                                dedup_index.publish(item[0])
+                    kept.extend(filter_duplicates(run))
+                    if kept:
+                        yield kept
+            
+            def iter_batches():
+                nonlocal split_total
+                produced = 0
+                for batch in iter_deduplicated():
+                    produced += len(batch)
+                    batch_ids = self._chunk_ids([meta for _, _, meta in batch])
+                    for (i, _, _), chunk_id in zip(batch, batch_ids):
+                        documents[i]['chunk_count'] += 1
+                        if isolated:
+                            written_ids[i].append(chunk_id)
+                    yield [chunk for _, chunk, _ in batch], [meta for _, _, meta in batch], batch_ids
+                split_total = produced
+            
+            logger.debug("Using splitter: %s, chunk_size: %s, chunk_overlap: %s", splitter_type,
+                         chunk_size or self.default_chunk_size, chunk_overlap or self.default_chunk_overlap)
+            if progress is not None:
+                progress("splitting", 0, None)
+            idf_embeddings = self._idf_embeddings(collection)
+            try:
+                total_chunks = embed_and_write(iter_batches(), embed, write, queue_size=settings.ingest_queue_size)
+            except Exception:
+                if dedup_index is not None:
+                    # 未写入的分段不能留在去重索引中，丢弃实例，下次从已提交的指纹文件重新加载
+                    self._dedup_indexes.pop(collection_name, None)
+                if idf_embeddings is not None:
+                    # 出错前写入的分段留在集合中，它们的文档频率照常保存
+                    idf_embeddings.idf.flush()
+                raise
+            
+            failed_ids = [chunk_id for document, ids in zip(documents, written_ids)
+                          if document['error'] for chunk_id in ids]
+            if failed_ids:
+                # 出错文档在出错前已写入的分段一并删除，指纹撤销后该文档可以整体重新入库
+                self._delete_chunks(collection, failed_ids)
+                total_chunks -= len(failed_ids)
+            for document in documents:
+                if document['error']:
+                    duplicates -= document['duplicate_chunks']
+                    document['chunk_count'] = document['duplicate_chunks'] = 0
+            if progress is not None:
+                progress("writing", total_chunks, total_chunks)
+            if dedup_index is not None:
+                dedup_index.commit()
+            if idf_embeddings is not None:
+                idf_embeddings.idf.flush()
+            
+            if total_chunks or failed_ids:
                 # Persist after all batches are added
                 collection.persist()
-                print(f"Successfully added {total_chunks} chunks to collection {collection_name}")
+            if total_chunks:
+                logger.info("Added %d chunks to collection %s", total_chunks, collection_name)
             else:
-                print(f"No valid text chunks to add to collection {collection_name}")
+                logger.info("No valid text chunks to add to collection %s", collection_name)
+            if duplicates:
+                logger.info("Skipped %d near-duplicate chunks in collection %s", duplicates, collection_name)
+            result: Dict[str, Any] = {'chunk_count': total_chunks, 'duplicate_chunks': duplicates}
+            if isolated:
+                result['documents'] = documents
+            if stats is not None:
+                result['stats'] = [document_stats.as_dict() for document_stats in stats]
+            return result
                 
         except Exception as e:
-            print(f"Error adding texts to collection {collection_name}: {str(e)}")
+            logger.error("Error adding texts to collection %s: %s", collection_name, e)
             raise e
         
-    def similarity_search(self, collection_name: str, query: str, k: int = 4):
+    def add_chunk_batches(self, collection_name: str, batches: Iterable[Tuple[List[str], List[dict], Any]],
+                          embedding_model: Optional[str] = None, vector_storage: Optional[str] = None,
+                          dedup_threshold: float = 0.0,
+                          on_written: Optional[Callable[[Any], None]] = None) -> Dict[str, int]:
+        """写入已在别处分好段的批次 (分段, 元数据, 标记)，用于离线批量导入
+
+        批次经近似去重后嵌入，写入在独立线程中与下一批的嵌入重叠进行；每批写入后以该批的
+        标记调用 on_written（在写入线程中），调用方据此记录已完成的文件。最后只持久化一次。
+        """
+        collection = self.create_collection(collection_name, embedding_model, vector_storage)
+        dedup_index = self._get_dedup_index(collection_name, dedup_threshold) if dedup_threshold > 0 else None
+        duplicates = 0
+        
+        def iter_filtered():
+            nonlocal duplicates
+            for texts, metadatas, tag in batches:
+                if dedup_index is not None and texts:
+                    keep = dedup_index.filter_new(texts)
+                    duplicates += len(texts) - sum(keep)
+                    texts = [text for text, is_new in zip(texts, keep) if is_new]
+                    metadatas = [meta for meta, is_new in zip(metadatas, keep) if is_new]
+                yield texts, [self._clean_metadata(meta) for meta in metadatas], tag
+        
+        def embed(texts: List[str]):
+            return collection._embedding_function.embed_documents(texts) if texts else []
+        
+        def write(texts: List[str], metadatas: List[dict], vectors, tag):
+            if texts:
+                ids = self._chunk_ids(metadatas)
+                if idf_embeddings is not None:
+                    # 中断后重新导入时覆盖已写入的分段，它们的文档频率在嵌入时已经重复计入
+                    existing = set(collection._collection.get(ids=ids, include=[])["ids"])
+                    if existing:
+                        idf_embeddings.idf.remove(np.asarray(
+                            [vector for chunk_id, vector in zip(ids, vectors) if chunk_id in existing]))
+                self._record_embedder(collection_name, embedding_model, collection._embedding_function, vectors)
+                self._write_chunks(collection, texts, metadatas, vectors, ids)
+            if on_written is not None:
+                on_written(tag)
+        
+        idf_embeddings = self._idf_embeddings(collection)
+        try:
+            total_chunks = embed_and_write(iter_filtered(), embed, write, queue_size=settings.ingest_queue_size)
+        except Exception:
+            if dedup_index is not None:
+                self._dedup_indexes.pop(collection_name, None)
+            raise
+        finally:
+            if idf_embeddings is not None:
+                idf_embeddings.idf.flush()
+        if dedup_index is not None:
+            dedup_index.commit()
+        if total_chunks:
+            collection.persist()
+        logger.info("Added %d chunks to collection %s (%d near-duplicates skipped)",
+                    total_chunks, collection_name, duplicates)
+        return {'chunk_count': total_chunks, 'duplicate_chunks': duplicates}
+    
+    def copy_chunks(self, source_collection: str, target_collection: str, where: dict,
+                    metadata_updates: Optional[dict] = None, embedding_model: Optional[str] = None,
+                    vector_storage: Optional[str] = None, dedup_threshold: float = 0.0,
+                    progress: Optional[Callable[..., None]] = None) -> Dict[str, int]:
+        """把源集合中满足 where 的分段连同已算好的向量复制到目标集合，不重新分段和嵌入
+
+        两个集合需使用同一嵌入模型；量化集合读取全精度向量，写入时按目标集合的存储方式处理。
+        metadata_updates 覆盖复制后分段的元数据（文档 id、文件名等），目标集合的近似去重照常生效。
+        目标集合使用带 IDF 的特征哈希模型时重新嵌入复制的分段，使其计入目标集合的文档频率。
+        返回的 source_chunks 是源集合中满足 where 的分段数，为 0 时调用方应改为正常入库。
+        """
+        try:
+            source = self.create_collection(source_collection, embedding_model)
+            target = self.create_collection(target_collection, embedding_model, vector_storage)
+            dedup_index = self._get_dedup_index(target_collection, dedup_threshold) if dedup_threshold > 0 else None
+            include = ["documents", "metadatas"]
+            if not isinstance(source, QuantizedChroma):
+                include.append("embeddings")
+            total = len(source._collection.get(where=where, include=[])["ids"])
+            idf_embeddings = self._idf_embeddings(target)
+            copied = duplicates = offset = 0
+            try:
+                while offset < total:
+                    page = source._collection.get(where=where, include=include,
+                                                  limit=settings.ingest_batch_size, offset=offset)
+                    if not page["ids"]:
+                        break
+                    offset += len(page["ids"])
+                    texts = page["documents"]
+                    vectors = (source.get_embeddings(page["ids"]).tolist() if isinstance(source, QuantizedChroma)
+                               else page["embeddings"])
+                    metadatas = [dict(meta or {}, **(metadata_updates or {})) for meta in page["metadatas"]]
+                    if dedup_index is not None:
+                        keep = dedup_index.filter_new(texts)
+                        duplicates += len(texts) - sum(keep)
+                        texts = [text for text, is_new in zip(texts, keep) if is_new]
+                        metadatas = [meta for meta, is_new in zip(metadatas, keep) if is_new]
+                        vectors = [vector for vector, is_new in zip(vectors, keep) if is_new]
+                    if texts:
+                        if idf_embeddings is not None:
+                            # 文档频率按集合统计，复制的向量不会计入目标集合，重新嵌入（开销很小）
+                            vectors = idf_embeddings.embed_documents(texts)
+                        self._record_embedder(target_collection, embedding_model, target._embedding_function, vectors)
+                        self._write_chunks(target, texts, metadatas, vectors)
+                        copied += len(texts)
+                    if progress is not None:
+                        progress("writing", offset, total)
+            except Exception:
+                if dedup_index is not None:
+                    self._dedup_indexes.pop(target_collection, None)
+                raise
+            finally:
+                if idf_embeddings is not None:
+                    idf_embeddings.idf.flush()
+            if dedup_index is not None:
+                dedup_index.commit()
+            if copied:
+                target.persist()
+            logger.info("Copied %d chunks from collection %s to %s", copied, source_collection, target_collection)
+            return {'chunk_count': copied, 'duplicate_chunks': duplicates, 'source_chunks': total}
+        except Exception as e:
+            logger.error("Error copying chunks from %s to %s: %s", source_collection, target_collection, e)
+            raise e
+    
+    def delete_document_chunks(self, collection_name: str, document_id: str,
+                               embedding_model: Optional[str] = None) -> int:
+        """删除文档的全部分段，并从近似去重索引中撤销它们的指纹，返回删除的分段数
+
+        不撤销指纹时，删除后重新上传同一文件会被整体判为重复而写入 0 个分段。
+        """
+        try:
+            collection = self.create_collection(collection_name, embedding_model)
+            stored = collection._collection.get(where={"document_id": document_id}, include=["documents"])
+            ids = stored["ids"]
+            if not ids:
+                return 0
+            dedup_index = self._dedup_indexes.get(collection_name)
+            if dedup_index is None and os.path.exists(self._dedup_path(collection_name)):
+                # 只用于撤销指纹，距离阈值不影响删除，不放入缓存
+                dedup_index = NearDuplicateIndex(self._dedup_path(collection_name), 0)
+            if dedup_index is not None:
+                dedup_index.remove(stored["documents"])
+            self._delete_chunks(collection, ids)
+            idf_embeddings = self._idf_embeddings(collection)
+            if idf_embeddings is not None:
+                idf_embeddings.idf.flush()
+            collection.persist()
+            logger.info("Deleted %d chunks of document %s from collection %s", len(ids), document_id, collection_name)
+            return len(ids)
+        except Exception as e:
+            logger.error("Error deleting document %s from collection %s: %s", document_id, collection_name, e)
+            raise e
+    
+    def _dedup_path(self, collection_name: str) -> str:
+        return os.path.join(self.persist_directory, "dedup", f"{collection_name}.simhash")
+    
+    def _get_dedup_index(self, collection_name: str, dedup_threshold: float) -> NearDuplicateIndex:
+        """集合的近似去重索引，阈值变化时按新阈值重建分段桶"""
+        max_distance = max_hamming_distance(dedup_threshold)
+        index = self._dedup_indexes.get(collection_name)
+        if index is None or index.max_distance != max_distance:
+            index = NearDuplicateIndex(self._dedup_path(collection_name), max_distance)
+            self._dedup_indexes[collection_name] = index
+        return index
+    
+    @staticmethod
+    def _clean_metadata(metadata: dict) -> dict:
+        """Chroma 只接受基本类型的元数据值"""
+        clean = {}
+        for key, value in metadata.items():
+            if value is None:
+                clean[key] = ""
+            elif isinstance(value, (str, int, float, bool)):
+                clean[key] = value
+            elif isinstance(value, list):
+                # Convert list to comma-separated string
+                clean[key] = ','.join(str(item) for item in value) if value else ""
+            else:
+                # Convert other types to string
+                clean[key] = str(value)
+        return clean
+    
+    @staticmethod
+    def _chunk_ids(metadatas: List[dict]) -> List[str]:
+        """分段 id：带 document_id 的分段由 (document_id, chunk_index) 决定
+
+        同一分段重复写入（例如批量导入中断后重新运行）时覆盖原有记录而不是新增一份；
+        没有文档 id 的分段使用随机 id。
+        """
+        return [str(uuid.uuid5(uuid.NAMESPACE_URL, f"{meta['document_id']}:{meta['chunk_index']}"))
+                if meta.get('document_id') and 'chunk_index' in meta else str(uuid.uuid1())
+                for meta in metadatas]
+    
+    @staticmethod
+    def _write_chunks(collection: Chroma, texts: List[str], metadatas: List[dict], vectors,
+                      ids: Optional[List[str]] = None):
+        """写入已计算好嵌入的一批分段，未指定 ids 时按元数据生成"""
+        ids = ids or ChromaStore._chunk_ids(metadatas)
+        if isinstance(collection, QuantizedChroma):
+            collection.add_embeddings(ids, texts, vectors, metadatas)
+        else:
+            collection._collection.upsert(ids=ids, embeddings=vectors, documents=texts, metadatas=metadatas)
+    
+    @staticmethod
+    def _idf_embeddings(collection: Chroma) -> Optional[HashingEmbeddings]:
+        """集合使用带 IDF 的特征哈希模型时返回该模型"""
+        embeddings = collection._embedding_function
+        embeddings = getattr(embeddings, "underlying", embeddings)
+        if isinstance(embeddings, HashingEmbeddings) and embeddings.idf is not None:
+            return embeddings
+        return None
+    
+    @staticmethod
+    def _delete_chunks(collection: Chroma, ids: List[str]):
+        """按 id 分批删除分段；量化集合同时从量化索引中删除向量
+
+        带 IDF 的特征哈希集合同时从文档频率中减去被删除的分段，由调用方 flush。
+        """
+        idf_embeddings = ChromaStore._idf_embeddings(collection)
+        for start in range(0, len(ids), settings.ingest_batch_size):
+            batch = ids[start:start + settings.ingest_batch_size]
+            if idf_embeddings is not None:
+                texts = collection._collection.get(ids=batch, include=["documents"])["documents"]
+                idf_embeddings.idf.remove(idf_embeddings.embed_documents_array(texts))
+            collection.delete(ids=batch)
+    
+    def similarity_search(self, collection_name: str, query: str, k: int = 4,
+                          embedding_model: Optional[str] = None):
         """Search for similar documents in a collection"""
         try:
-            collection = self.create_collection(collection_name)
+            collection = self.create_collection(collection_name, embedding_model)
             results = collection.similarity_search(query, k=k)
             
-            # 格式化搜索结果
-            formatted_results = []
-            for doc in results:
-                result = {
-                    "content": doc.page_content,
-                    "metadata": doc.metadata,
-                    "score": 1.0,  # LangChain的similarity_search不返回分数，使用默认值
-                }
-                formatted_results.append(result)
+            formatted_results = self._format_search_results(results)
+            logger.debug("Search query %r returned %d results", query, len(formatted_results))
+            return formatted_results
+            
+        except Exception as e:
+            logger.error("Error searching collection %s: %s", collection_name, e)
+            return []
+    
+    async def asimilarity_search(self, collection_name: str, query: str, k: int = 4,
+                                 embedding_model: Optional[str] = None):
+        """异步搜索：查询嵌入经微批合并器与其他并发查询合并计算"""
+        try:
+            query_vector = await self.aembed_query(query, embedding_model, collection_name)
+            collection = self.create_collection(collection_name, embedding_model)
+            results = await asyncio.to_thread(collection.similarity_search_by_vector, query_vector, k)
             
-            print(f"Search query: '{query}' returned {len(formatted_results)} results")
+            formatted_results = self._format_search_results(results)
+            logger.debug("Search query %r returned %d results", query, len(formatted_results))
             return formatted_results
             
         except Exception as e:
-            print(f"Error searching collection {collection_name}: {str(e)}")
+            logger.error("Error searching collection %s: %s", collection_name, e)
             return []
     
+    def _format_search_results(self, results) -> List[Dict[str, Any]]:
+        """格式化搜索结果"""
+        formatted_results = []
+        for doc in results:
+            result = {
+                "content": doc.page_content,
+                "metadata": doc.metadata,
+                "score": 1.0,  # LangChain的similarity_search不返回分数，使用默认值
+            }
+            formatted_results.append(result)
+        return formatted_results
+    
     def delete_collection(self, collection_name: str):
         """Delete a collection"""
         try:
             client = chromadb.PersistentClient(path=self.persist_directory)
             client.delete_collection(collection_name)
-            print(f"Successfully deleted collection {collection_name}")
+            if os.path.exists(self._idf_path(collection_name)):
+                os.remove(self._idf_path(collection_name))
+            self._quantized_indexes.pop(collection_name, None)
+            shutil.rmtree(self._quantized_dir(collection_name), ignore_errors=True)
+            self._dedup_indexes.pop(collection_name, None)
+            if os.path.exists(self._dedup_path(collection_name)):
+                os.remove(self._dedup_path(collection_name))
+            self._embedder_records.pop(collection_name, None)
+            self._unindexed_collections.discard(collection_name)
+            if os.path.exists(self._embedder_path(collection_name)):
+                os.remove(self._embedder_path(collection_name))
+            logger.info("Deleted collection %s", collection_name)
         except Exception as e:
-            print(f"Error deleting collection {collection_name}: {str(e)}")
+            logger.error("Error deleting collection %s: %s", collection_name, e)
     
     def get_document_chunks(self, collection_name: str, document_filename: str):
         """获取指定文档的所有分段"""
@@ -374,11 +1093,11 @@ class ChromaStore:
             try:
                 chroma_collection = client.get_collection(collection_name)
             except Exception as e:
-                print(f"Collection {collection_name} does not exist: {str(e)}")
+                logger.warning("Collection %s does not exist: %s", collection_name, e)
                 # 尝试列出所有可用的collections
                 try:
                     collections = client.list_collections()
-                    print(f"Available collections: {[c.name for c in collections]}")
+                    logger.debug("Available collections: %s", [c.name for c in collections])
                 except:
                     pass
                 return []
@@ -393,7 +1112,7 @@ class ChromaStore:
                 )
                 
                 if results and results.get('documents'):
-                    print(f"Found {len(results['documents'])} total chunks in collection")
+                    logger.debug("Found %d total chunks in collection", len(results['documents']))
                     
                     # 去掉路径，只保留文件名进行匹配
                     base_filename = os.path.basename(document_filename)
@@ -439,12 +1158,12 @@ class ChromaStore:
                             chunks.append(chunk)
                 
             except Exception as e:
-                print(f"Error querying collection data: {str(e)}")
+                logger.error("Error querying collection data: %s", e)
                 return []
             
             # 如果没有找到匹配的chunks，返回所有chunks（用于调试）
             if not chunks:
-                print(f"No chunks found for document {document_filename}, returning all chunks for debugging")
+                logger.warning("No chunks found for document %s, returning all chunks for debugging", document_filename)
                 try:
                     results = chroma_collection.get(
                         include=["documents", "metadatas"]
@@ -467,17 +1186,17 @@ class ChromaStore:
                             }
                             chunks.append(chunk)
                 except Exception as e:
-                    print(f"Error getting all chunks: {str(e)}")
+                    logger.error("Error getting all chunks: %s", e)
             
             # 按chunk_index排序
             chunks.sort(key=lambda x: x.get('chunk_index', 0))
             
-            print(f"Retrieved {len(chunks)} chunks for document {document_filename}")
+            logger.debug("Retrieved %d chunks for document %s", len(chunks), document_filename)
             if chunks:
-                print(f"Sample metadata: {chunks[0]['metadata']}")
+                logger.debug("Sample metadata: %s", chunks[0]['metadata'])
             
             return chunks
             
         except Exception as e:
-            print(f"Error getting document chunks for {document_filename}: {str(e)}")
+            logger.error("Error getting document chunks for %s: %s", document_filename, e)
             return [] 
\ No newline at end of file
@@ -0,0 +1,248 @@
+from langchain_core.embeddings import Embeddings
+from collections import OrderedDict
+from typing import List, Optional, Dict, Sequence, Tuple
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+import numpy as np
+
+# SQLite 单条语句的参数上限较低，批量查询时分片
+_SQL_BATCH = 500
+
+
+def normalize_text(text: str) -> str:
+    """缓存键使用的文本规范化：Unicode NFC + 去除首尾空白"""
+    return unicodedata.normalize('NFC', text).strip()
+
+
+def embedding_cache_key(model_id: str, text: str) -> str:
+    """内容寻址的缓存键：(嵌入模型, 规范化文本的哈希)"""
+    digest = hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+    return f"{model_id}:{digest}"
+
+
+class EmbeddingCache:
+    """基于 SQLite 文件的嵌入向量缓存，进程重启后仍然有效，超出容量时按 LRU 淘汰"""
+
+    def __init__(self, path: str, max_entries: int = 200_000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " vector BLOB NOT NULL,"
+            " last_access INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)")
+        self._conn.commit()
+        row = self._conn.execute("SELECT COALESCE(MAX(last_access), 0) FROM embeddings").fetchone()
+        self._clock = row[0]
+
+    def _tick(self) -> int:
+        self._clock += 1
+        return self._clock
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[List[float]]]:
+        """批量读取，未命中的位置返回 None，命中的条目刷新访问时间"""
+        found: Dict[str, bytes] = {}
+        with self._lock:
+            for i in range(0, len(keys), _SQL_BATCH):
+                batch = list(set(keys[i:i + _SQL_BATCH]))
+                placeholders = ','.join('?' * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                found.update(rows)
+            if found:
+                access = self._tick()
+                hit_keys = list(found)
+                for i in range(0, len(hit_keys), _SQL_BATCH):
+                    batch = hit_keys[i:i + _SQL_BATCH]
+                    placeholders = ','.join('?' * len(batch))
+                    self._conn.execute(
+                        f"UPDATE embeddings SET last_access = ? WHERE key IN ({placeholders})", [access, *batch]
+                    )
+                self._conn.commit()
+
+            results = []
+            for key in keys:
+                blob = found.get(key)
+                if blob is None:
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    self.hits += 1
+                    results.append(np.frombuffer(blob, dtype=np.float32).tolist())
+            return results
+
+    def put_many(self, keys: Sequence[str], vectors: Sequence[Sequence[float]]):
+        """批量写入，并在超出容量时淘汰最久未访问的条目"""
+        if not keys:
+            return
+        with self._lock:
+            access = self._tick()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes(), access) for key, vector in zip(keys, vectors)]
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            overflow = count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?)",
+                    (overflow,)
+                )
+                self.evictions += overflow
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def stats(self) -> Dict[str, float]:
+        """命中/未命中统计"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "max_entries": self.max_entries,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """包装任意 Embeddings 实现，文档嵌入先查缓存，只对未命中的文本调用底层模型"""
+
+    def __init__(self, underlying: Embeddings, cache: EmbeddingCache, model_id: str):
+        self.underlying = underlying
+        self.cache = cache
+        self.model_id = model_id
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """为文档列表生成嵌入向量（带缓存）"""
+        keys = [embedding_cache_key(self.model_id, text) for text in texts]
+        vectors = self.cache.get_many(keys)
+
+        # 同一批次内重复的文本只计算一次
+        pending: Dict[str, List[int]] = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                pending.setdefault(keys[i], []).append(i)
+        if pending:
+            miss_keys = list(pending)
+            computed = self.underlying.embed_documents([texts[pending[key][0]] for key in miss_keys])
+            self.cache.put_many(miss_keys, computed)
+            for key, vector in zip(miss_keys, computed):
+                for i in pending[key]:
+                    vectors[i] = list(vector)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        """查询嵌入直接交给底层模型"""
+        return self.underlying.embed_query(text)
+
+
+class QueryEmbeddingCache:
+    """进程内的查询嵌入 LRU 缓存，可选 TTL，键为 (嵌入模型, 规范化查询文本)"""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, List[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, model_id: str, text: str) -> Optional[List[float]]:
+        key = (model_id, normalize_text(text))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_seconds and time.monotonic() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, model_id: str, text: str, vector: List[float]):
+        if self.max_entries <= 0:
+            return
+        key = (model_id, normalize_text(text))
+        with self._lock:
+            self._entries[key] = (time.monotonic(), vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, float]:
+        """命中率统计"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+def query_cache_namespace(embeddings: Embeddings) -> str:
+    """查询向量的缓存命名空间；查询向量依赖集合统计量的模型（如 IDF）可自行提供"""
+    return getattr(embeddings, "query_cache_namespace", None) or embeddings.model_id
+
+
+class QueryCachedEmbeddings(Embeddings):
+    """查询嵌入先查进程内 LRU 缓存，文档嵌入直接交给底层模型"""
+
+    def __init__(self, underlying: Embeddings, cache: QueryEmbeddingCache):
+        self.underlying = underlying
+        self.cache = cache
+        self.model_id = underlying.model_id
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.underlying.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        """为查询文本生成嵌入向量（带缓存）"""
+        namespace = query_cache_namespace(self.underlying)
+        vector = self.cache.get(namespace, text)
+        if vector is None:
+            vector = self.underlying.embed_query(text)
+            self.cache.put(namespace, text, vector)
+        return vector
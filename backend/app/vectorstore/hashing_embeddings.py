@@ -0,0 +1,214 @@
+from langchain_core.embeddings import Embeddings
+from typing import List, Optional, Tuple
+import json
+import os
+import re
+import threading
+import numpy as np
+from .text_arrays import ALNUM, SPACE, encode_batch, char_classes, run_bounds
+
+# 离线特征哈希嵌入模型名：hashing[-idf][-<dim>]，例如 hashing-idf-768
+_MODEL_PATTERN = re.compile(r'^hashing(-idf)?(?:-(\d+))?$')
+
+# 32 位多项式哈希的乘数（奇数，在模 2^32 下可逆）
+_PRIME = np.uint32(0x01000193)
+_PRIME_INVERSE = np.uint32(pow(0x01000193, -1, 2 ** 32))
+_WORD_SEED = np.uint32(0x9E3779B9)
+
+
+def parse_hashing_model(embedding_model: str) -> Optional[Tuple[int, bool]]:
+    """解析特征哈希模型名，返回 (维度, 是否使用IDF)；不是特征哈希模型时返回 None"""
+    match = _MODEL_PATTERN.match(embedding_model or "")
+    if not match:
+        return None
+    return int(match.group(2) or 384), bool(match.group(1))
+
+
+_POWER_TABLES: Tuple[np.ndarray, np.ndarray] = (np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.uint32))
+
+
+def _power_tables(size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """P^i 与 P^-i（模 2^32）的前 size 项，按需倍增并复用"""
+    global _POWER_TABLES
+    if _POWER_TABLES[0].size < size:
+        capacity = max(size, 2 * _POWER_TABLES[0].size)
+        prime_powers = np.cumprod(np.full(capacity, _PRIME), dtype=np.uint32) * _PRIME_INVERSE
+        inverse_powers = np.cumprod(np.full(capacity, _PRIME_INVERSE), dtype=np.uint32) * _PRIME
+        _POWER_TABLES = (prime_powers, inverse_powers)
+    prime_powers, inverse_powers = _POWER_TABLES
+    return prime_powers[:size], inverse_powers[:size]
+
+
+def _mix(h: np.ndarray) -> np.ndarray:
+    """murmur3 fmix32 终结函数，打散哈希值的各个比特（原地修改）"""
+    h ^= h >> np.uint32(16)
+    h *= np.uint32(0x85EBCA6B)
+    h ^= h >> np.uint32(13)
+    h *= np.uint32(0xC2B2AE35)
+    h ^= h >> np.uint32(16)
+    return h
+
+
+class IdfStatistics:
+    """按集合累计的哈希桶文档频率，持久化为 JSON 文件
+
+    update/remove 只修改内存中的计数，flush 时才整体写回文件；ChromaStore 在每次写入操作
+    （一次入库、批量导入或复制）结束时 flush 一次，而不是每个嵌入批次重写整个文件。
+    """
+
+    def __init__(self, path: str, dim: int):
+        self.path = path
+        self.dim = dim
+        self.documents = 0
+        self.df = np.zeros(dim, dtype=np.int64)
+        self._dirty = False
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            if len(data.get("df", [])) == dim:
+                self.documents = data["documents"]
+                self.df = np.asarray(data["df"], dtype=np.int64)
+
+    def update(self, matrix: np.ndarray):
+        """用一批文档向量更新文档频率"""
+        with self._lock:
+            self.documents += matrix.shape[0]
+            self.df += np.count_nonzero(matrix, axis=0)
+            self._dirty = True
+
+    def remove(self, matrix: np.ndarray):
+        """撤销一批已删除文档对文档频率的贡献"""
+        with self._lock:
+            self.documents = max(0, self.documents - matrix.shape[0])
+            self.df -= np.count_nonzero(matrix, axis=0)
+            np.maximum(self.df, 0, out=self.df)
+            self._dirty = True
+
+    def flush(self):
+        """把累计的文档频率写回文件"""
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"documents": self.documents, "df": self.df.tolist()}, f)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+    def weights(self) -> np.ndarray:
+        """平滑 IDF 权重"""
+        return (np.log((1.0 + self.documents) / (1.0 + self.df)) + 1.0).astype(np.float32)
+
+
+class HashingEmbeddings(Embeddings):
+    """离线特征哈希嵌入模型
+
+    将字符 n-gram 和单词经带符号哈希映射到固定维度的桶中，整批文本一次性向量化计算。
+    启用 IDF 时，写入文档只累计文档频率，IDF 权重（平方）只作用在查询向量上，
+    因此已写入的文档向量不会因 IDF 变化而失效。
+    """
+
+    def __init__(self, dim: int = 384, ngram_sizes: Tuple[int, ...] = (2, 3),
+                 idf: Optional[IdfStatistics] = None, model_id: Optional[str] = None):
+        self.dim = dim
+        self.ngram_sizes = ngram_sizes
+        self.idf = idf
+        self.model_id = model_id or f"hashing-{dim}"
+
+    @property
+    def query_cache_namespace(self) -> str:
+        """查询向量随 IDF 统计变化，缓存键带上已统计的文档数"""
+        if self.idf is None:
+            return self.model_id
+        return f"{self.model_id}@{self.idf.documents}"
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """为文档列表生成嵌入向量"""
+        if not texts:
+            return []
+        matrix = self.embed_documents_array(texts)
+        if self.idf is not None:
+            self.idf.update(matrix)
+        return matrix.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        """为查询文本生成嵌入向量"""
+        return self.embed_queries_array([text])[0].tolist()
+
+    async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        """批量生成查询嵌入向量（不更新文档频率）"""
+        return self.embed_queries_array(texts).tolist()
+
+    def embed_queries_array(self, texts: List[str]) -> np.ndarray:
+        """查询向量：特征向量乘以 IDF 的平方后重新归一化"""
+        matrix = self.embed_documents_array(texts)
+        if self.idf is not None and self.idf.documents:
+            matrix *= self.idf.weights() ** 2
+            _normalize_rows(matrix)
+        return matrix
+
+    def embed_documents_array(self, texts: List[str]) -> np.ndarray:
+        """批量生成 (len(texts), dim) float32 特征哈希矩阵"""
+        dim = self.dim
+        rows_total = len(texts)
+        if not rows_total:
+            return np.zeros((0, dim), dtype=np.float32)
+
+        codes, row_ids, _ = encode_batch([text.lower() for text in texts])
+        classes = char_classes(codes)
+        space = (classes & SPACE) != 0
+        # 每个特征编码为 ((行 * dim + 桶) * 2 + 符号位)，之后一次 bincount 完成稀疏累加；
+        # 编码不超过 2^31 时整个过程在 uint32 数组上原地计算
+        index_dtype = np.uint32 if 2 * rows_total * dim < 2 ** 31 else np.int64
+        row_base = row_ids.astype(index_dtype)
+        row_base *= index_dtype(2 * dim)
+        features = []
+
+        # 字符 n-gram（不跨越空白）：n 元哈希由 n-1 元哈希再乘一次、加一个码点得到
+        h = codes
+        crosses_space = space
+        for n in range(2, max(self.ngram_sizes, default=0) + 1):
+            count = codes.size - n + 1
+            if count <= 0:
+                break
+            h = h[:count] * _PRIME
+            h += codes[n - 1:]
+            crosses_space = crosses_space[:count] | space[n - 1:]
+            if n in self.ngram_sizes:
+                features.append(self._feature_index(_mix(h ^ np.uint32(n)), row_base[:count])[~crosses_space])
+
+        # 单词（连续的字母数字），用前缀和在 O(N) 内计算每个单词的多项式哈希
+        starts, ends = run_bounds((classes & ALNUM) != 0)
+        if starts.size:
+            # uint32 运算按 2^32 取模回绕
+            prime_powers, inverse_powers = _power_tables(codes.size)
+            prefix = np.zeros(codes.size + 1, dtype=np.uint32)
+            np.cumsum(codes * inverse_powers, dtype=np.uint32, out=prefix[1:])
+            h = (prefix[ends] - prefix[starts]) * prime_powers[ends - 1]
+            h ^= _WORD_SEED
+            features.append(self._feature_index(_mix(h), row_base[starts]))
+
+        counts = np.bincount(np.concatenate(features), minlength=2 * rows_total * dim).reshape(-1, 2)
+        matrix = (counts[:, 0] - counts[:, 1]).reshape(rows_total, dim).astype(np.float32)
+        _normalize_rows(matrix)
+        return matrix
+
+    def _feature_index(self, h: np.ndarray, row_base: np.ndarray) -> np.ndarray:
+        """最高位决定符号，其余位取模得到桶号；row_base 为行号 * 2 * dim，h 会被原地修改"""
+        sign = h >> np.uint32(31)
+        h &= np.uint32(0x7FFFFFFF)
+        h %= np.uint32(self.dim)
+        if row_base.dtype != np.uint32:
+            h = h.astype(row_base.dtype)
+            sign = sign.astype(row_base.dtype)
+        h <<= 1
+        h |= sign
+        h += row_base
+        return h
+
+
+def _normalize_rows(matrix: np.ndarray):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
@@ -0,0 +1,198 @@
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple, TypeVar
+import queue
+import re
+import threading
+
+T = TypeVar("T")
+
+# 分割窗口的最小字符数；窗口在段落或换行处切开，避免对整篇文本一次性生成全部分段
+MIN_SPLIT_WINDOW = 1_000_000
+
+# 相邻分段之间可能被丢弃的分隔符长度上限（空白另行跳过）
+_SPAN_SLACK = 256
+_NON_SPACE = re.compile(r'\S')
+
+
+def iter_text_windows(text: str, window_size: int = MIN_SPLIT_WINDOW) -> Iterator[str]:
+    """把长文本切成若干窗口依次产出，优先在窗口后半段的段落/换行边界处切开"""
+    start = 0
+    total = len(text)
+    while total - start > window_size:
+        end = start + window_size
+        lower = start + window_size // 2
+        cut = text.rfind("\n\n", lower, end)
+        if cut >= 0:
+            cut += 2
+        else:
+            cut = text.rfind("\n", lower, end)
+            cut = end if cut < 0 else cut + 1
+        yield text[start:cut]
+        start = cut
+    if start < total:
+        yield text[start:]
+
+
+def iter_segment_windows(segments: Iterable[Tuple[Optional[int], str]],
+                         window_size: int = MIN_SPLIT_WINDOW) -> Iterator[Tuple[Optional[int], str]]:
+    """把提取器产出的 (页码, 文本) 片段合并成分割窗口
+
+    同一页码的相邻片段拼接起来，累计超过 window_size 时按 iter_text_windows 切出窗口，
+    末尾不足一个窗口的部分留到后续片段继续拼接。窗口不跨页，分段的页码因此唯一；
+    没有页码的片段（页码为 None）连续拼接，内存只与窗口大小有关。
+    """
+    page: Optional[int] = None
+    parts: List[str] = []
+    size = 0
+    for segment_page, text in segments:
+        if parts and segment_page != page:
+            for window in iter_text_windows("".join(parts), window_size):
+                yield page, window
+            parts, size = [], 0
+        page = segment_page
+        parts.append(text)
+        size += len(text)
+        if size > window_size:
+            # 惰性切窗口，最后一个窗口留待拼接
+            last = None
+            for window in iter_text_windows("".join(parts), window_size):
+                if last is not None:
+                    yield page, last
+                last = window
+            parts, size = [last], len(last)
+    if parts:
+        for window in iter_text_windows("".join(parts), window_size):
+            yield page, window
+
+
+def iter_chunk_spans(text: str, chunks: Iterable[str], offset: int = 0) -> Iterator[Tuple[str, int, int]]:
+    """为按文本顺序产出的分段定位 (start, end) 字符偏移，单次前向扫描
+
+    下一分段的起点在上一分段起点之后，且不会越过上一分段终点之后的空白和一个分隔符，
+    因此每个分段只在与自身长度相当的范围内查找，不会像 text.find 那样扫描剩余全文，
+    重复的模板文本也不会匹配到前面的位置。找不到的分段（分隔符被改写等）返回 (-1, -1)。
+    """
+    prev_start = -1
+    prev_end = 0
+    for chunk in chunks:
+        gap = _NON_SPACE.search(text, prev_end)
+        next_text = gap.start() if gap else len(text)
+        start = text.find(chunk, prev_start + 1, next_text + _SPAN_SLACK + len(chunk))
+        if start < 0:
+            yield chunk, -1, -1
+            continue
+        prev_start, prev_end = start, start + len(chunk)
+        yield chunk, offset + start, offset + prev_end
+
+
+def batched(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    """按固定大小分批产出"""
+    batch: List[T] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_concurrently(iterables: Sequence[Iterable[T]], max_workers: int,
+                      queue_size: int = 64) -> Iterator[Tuple[int, T]]:
+    """最多 max_workers 个线程同时消费各个可迭代对象，按产出先后交错产出 (序号, 元素)
+
+    同一可迭代对象的元素保持原有顺序；队列有界，消费跟不上时工作线程阻塞。
+    消费方提前停止时工作线程随之退出，工作线程中的异常在消费方重新抛出。
+    """
+    items: "queue.Queue" = queue.Queue(maxsize=max(1, queue_size))
+    stop = threading.Event()
+    indexes = iter(range(len(iterables)))
+    index_lock = threading.Lock()
+    done = object()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def worker():
+        try:
+            while True:
+                with index_lock:
+                    index = next(indexes, None)
+                if index is None:
+                    return
+                for item in iterables[index]:
+                    if not put((index, item)):
+                        return
+        except BaseException as e:
+            put((None, e))
+        finally:
+            put(done)
+
+    threads = [threading.Thread(target=worker, name=f"ingest-split-{i}", daemon=True)
+               for i in range(max(1, min(max_workers, len(iterables))))]
+    for thread in threads:
+        thread.start()
+    finished = 0
+    try:
+        while finished < len(threads):
+            item = items.get()
+            if item is done:
+                finished += 1
+                continue
+            index, value = item
+            if index is None:
+                raise value
+            yield index, value
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+
+def embed_and_write(batches: Iterable[tuple],
+                    embed: Callable[[List[str]], Sequence[Sequence[float]]],
+                    write: Callable[..., None],
+                    queue_size: int = 2) -> int:
+    """分段→嵌入→写入流水线
+
+    当前线程惰性地取出分段批次并计算嵌入，写入在独立线程中进行，两者之间是容量为
+    queue_size 的有界队列，因此同时驻留内存的批次数与文档大小无关。返回写入的分段数。
+    批次为 (分段, 元数据, *附加项)，以 write(分段, 元数据, 向量, *附加项) 写入。
+    """
+    pending: "queue.Queue" = queue.Queue(maxsize=max(1, queue_size))
+    errors: List[BaseException] = []
+    done = object()
+
+    def writer():
+        while True:
+            item = pending.get()
+            if item is done:
+                return
+            if errors:
+                continue  # 出错后继续取走队列中的批次，避免生产者阻塞
+            try:
+                write(*item)
+            except BaseException as e:
+                errors.append(e)
+
+    thread = threading.Thread(target=writer, name="ingest-writer", daemon=True)
+    thread.start()
+    written = 0
+    try:
+        for texts, metadatas, *extra in batches:
+            if errors:
+                break
+            vectors = embed(texts)
+            pending.put((texts, metadatas, vectors, *extra))
+            written += len(texts)
+    finally:
+        pending.put(done)
+        thread.join()
+    if errors:
+        raise errors[0]
+    return written
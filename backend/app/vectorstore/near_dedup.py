@@ -0,0 +1,197 @@
+from collections import Counter
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+import hashlib
+import os
+import threading
+import numpy as np
+from .text_arrays import encode_batch, rank_within_rows
+
+# 指纹位数与字符 shingle 长度
+FINGERPRINT_BITS = 64
+SHINGLE_SIZE = 3
+
+_PRIME = np.uint64(0x100000001B3)
+
+
+def _mix64(h: np.ndarray) -> np.ndarray:
+    """splitmix64 终结函数，打散 shingle 哈希的各个比特（原地修改）"""
+    h ^= h >> np.uint64(30)
+    h *= np.uint64(0xBF58476D1CE4E5B9)
+    h ^= h >> np.uint64(27)
+    h *= np.uint64(0x94D049BB133111EB)
+    h ^= h >> np.uint64(31)
+    return h
+
+
+def max_hamming_distance(threshold: float) -> int:
+    """相似度阈值（0~1）换算为允许的最大汉明距离"""
+    return max(0, int((1.0 - threshold) * FINGERPRINT_BITS))
+
+
+def simhash_batch(texts: Sequence[str]) -> np.ndarray:
+    """整批计算 64 位 SimHash 指纹
+
+    文本小写并合并空白后取字符 3-gram（中文按字切分同样适用），每个 shingle 的哈希
+    按位投票，多数为 1 的位置 1。不足一个 shingle 的短文本直接使用内容哈希。
+    """
+    normalized = [' '.join(text.lower().split()) for text in texts]
+    rows_total = len(normalized)
+    fingerprints = np.zeros(rows_total, dtype=np.uint64)
+    if not rows_total:
+        return fingerprints
+
+    codes, row_ids, lengths = encode_batch(normalized)
+    codes = codes.astype(np.uint64)
+    count = codes.size - SHINGLE_SIZE + 1
+    if count > 0:
+        # shingle 必须完整落在同一行内（不含行间分隔符）
+        offsets = rank_within_rows(row_ids[:count])
+        valid = offsets + SHINGLE_SIZE <= lengths[row_ids[:count]]
+        h = codes[:count].copy()
+        for k in range(1, SHINGLE_SIZE):
+            h *= _PRIME
+            h += codes[k:k + count]
+        h = _mix64(h[valid])
+        rows = row_ids[:count][valid]
+        totals = np.bincount(rows, minlength=rows_total)
+        for bit in range(FINGERPRINT_BITS):
+            ones = np.bincount(rows, weights=(h >> np.uint64(bit)) & np.uint64(1), minlength=rows_total)
+            fingerprints |= (2 * ones > totals).astype(np.uint64) << np.uint64(bit)
+    else:
+        totals = np.zeros(rows_total, dtype=np.int64)
+
+    for row in np.flatnonzero(totals == 0):
+        digest = hashlib.blake2b(normalized[row].encode('utf-8'), digest_size=8).digest()
+        fingerprints[row] = np.frombuffer(digest, dtype=np.uint64)[0]
+    return fingerprints
+
+
+class NearDuplicateIndex:
+    """按集合保存的 SimHash 指纹索引，用 LSH 分段查找近似重复
+
+    64 位指纹切成 max_distance + 1 段，汉明距离不超过 max_distance 的两个指纹
+    至少有一段完全相同（抽屉原理），因此只需比较同段桶内的候选，且不会漏检。
+    段数上限为 16，阈值低于约 0.77（距离超过 15 位）时不再保证召回。
+    新指纹在 commit() 时追加写入 <path>（分段全部写入集合后再提交，入库失败时丢弃该实例
+    即可回到已提交的状态），分段桶在加载时重建。
+    """
+
+    def __init__(self, path: str, max_distance: int):
+        self.path = path
+        self.max_distance = max_distance
+        bands = min(max_distance + 1, 16)
+        bounds = np.linspace(0, FINGERPRINT_BITS, bands + 1).astype(int)
+        self._bands: List[Tuple[int, int]] = [
+            (int(start), (1 << int(end - start)) - 1) for start, end in zip(bounds[:-1], bounds[1:])
+        ]
+        self._buckets: List[Dict[int, List[int]]] = [{} for _ in self._bands]
+        self._lock = threading.Lock()
+        self._pending: List[int] = []
+        self._scopes: Dict[Hashable, Tuple[List[Dict[int, List[int]]], List[int]]] = {}
+        self.size = 0
+        if os.path.exists(path):
+            for fingerprint in np.fromfile(path, dtype='<u8').tolist():
+                self._insert(fingerprint)
+
+    def _new_buckets(self) -> List[Dict[int, List[int]]]:
+        return [{} for _ in self._bands]
+
+    def _insert(self, fingerprint: int, buckets: Optional[List[Dict[int, List[int]]]] = None):
+        for (shift, mask), band in zip(self._bands, self._buckets if buckets is None else buckets):
+            band.setdefault((fingerprint >> shift) & mask, []).append(fingerprint)
+        if buckets is None:
+            self.size += 1
+
+    def _find(self, fingerprint: int, buckets: Optional[List[Dict[int, List[int]]]] = None) -> bool:
+        max_distance = self.max_distance
+        for (shift, mask), band in zip(self._bands, self._buckets if buckets is None else buckets):
+            for candidate in band.get((fingerprint >> shift) & mask, ()):
+                if bin(candidate ^ fingerprint).count('1') <= max_distance:
+                    return True
+        return False
+
+    def filter_new(self, texts: Sequence[str], scopes: Optional[Sequence[Hashable]] = None) -> List[bool]:
+        """返回每条文本是否为新内容；新内容的指纹立即加入索引，同批内的重复也会被识别
+
+        scopes 给出每条文本所属的作用域（如文档序号）。带作用域的新指纹先只对同一作用域可见，
+        publish(scope) 后才加入共享索引，drop(scope) 则整体丢弃，因此一篇中途失败的文档
+        不会让其他文档的分段被误判为重复。
+        """
+        fingerprints = simhash_batch(texts).tolist()
+        keep = []
+        with self._lock:
+            for n, fingerprint in enumerate(fingerprints):
+                scope = scopes[n] if scopes is not None else None
+                if scope is None:
+                    is_new = not self._find(fingerprint)
+                    if is_new:
+                        self._insert(fingerprint)
+                        self._pending.append(fingerprint)
+                else:
+                    buckets, scoped = self._scopes.setdefault(scope, (self._new_buckets(), []))
+                    is_new = not self._find(fingerprint) and not self._find(fingerprint, buckets)
+                    if is_new:
+                        self._insert(fingerprint, buckets)
+                        scoped.append(fingerprint)
+                keep.append(is_new)
+        return keep
+
+    def publish(self, scope: Hashable):
+        """把作用域内的指纹加入共享索引（随下一次 commit 持久化）"""
+        with self._lock:
+            _, scoped = self._scopes.pop(scope, (None, []))
+            for fingerprint in scoped:
+                self._insert(fingerprint)
+                self._pending.append(fingerprint)
+
+    def drop(self, scope: Hashable):
+        """丢弃作用域内尚未发布的指纹"""
+        with self._lock:
+            self._scopes.pop(scope, None)
+
+    def commit(self):
+        """把尚未持久化的指纹追加写入文件"""
+        with self._lock:
+            if not self._pending:
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, 'ab') as f:
+                f.write(np.asarray(self._pending, dtype='<u8').tobytes())
+            self._pending = []
+
+    def remove(self, texts: Sequence[str]) -> int:
+        """从共享索引中删除这些文本的指纹（每条文本删除一个相同的指纹），返回删除的个数
+
+        删除后重写指纹文件（只写入已提交的指纹），用于删除文档后让同样的内容可以重新入库。
+        """
+        fingerprints = simhash_batch(texts).tolist()
+        removed = 0
+        with self._lock:
+            shift, mask = self._bands[0]
+            for fingerprint in fingerprints:
+                if fingerprint not in self._buckets[0].get((fingerprint >> shift) & mask, ()):
+                    continue
+                for (band_shift, band_mask), band in zip(self._bands, self._buckets):
+                    key = (fingerprint >> band_shift) & band_mask
+                    band[key].remove(fingerprint)
+                    if not band[key]:
+                        del band[key]
+                if fingerprint in self._pending:
+                    self._pending.remove(fingerprint)
+                self.size -= 1
+                removed += 1
+            if removed:
+                pending = Counter(self._pending)
+                committed = []
+                for bucket in self._buckets[0].values():
+                    for fingerprint in bucket:
+                        if pending[fingerprint]:
+                            pending[fingerprint] -= 1
+                        else:
+                            committed.append(fingerprint)
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                tmp_path = self.path + '.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(np.asarray(committed, dtype='<u8').tobytes())
+                os.replace(tmp_path, self.path)
+        return removed
@@ -0,0 +1,102 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from langchain_core.embeddings import Embeddings
+from typing import List, Optional
+import math
+import multiprocessing
+import os
+import threading
+from ..core.log import get_logger
+
+logger = get_logger(__name__)
+
+
+def available_cpus() -> int:
+    """容器可用的 CPU 数：取 CPU 亲和性与 cgroup 配额中的较小值"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    quota = None
+    try:
+        # cgroup v2: "<quota> <period>" 或 "max <period>"
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            limit, period = f.read().split()[:2]
+            if limit != "max":
+                quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                limit = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period = int(f.read())
+            if limit > 0 and period > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+
+    if quota is not None:
+        cpus = min(cpus, math.ceil(quota))
+    return max(1, cpus)
+
+
+def _embed_slice(embeddings: Embeddings, texts: List[str]) -> List[List[float]]:
+    """工作进程入口：对一个分片做嵌入"""
+    return embeddings.embed_documents(texts)
+
+
+class ParallelEmbeddings(Embeddings):
+    """将大批量文档嵌入分发到进程池，按原始顺序拼回结果
+
+    小于 min_batch_size 的批次或只有一个可用 CPU 时直接在当前进程内计算。
+    被包装的嵌入模型需要可以 pickle。
+    """
+
+    def __init__(self, underlying: Embeddings, max_workers: int = 0, min_batch_size: int = 256):
+        self.underlying = underlying
+        self.max_workers = max_workers or available_cpus()
+        self.min_batch_size = min_batch_size
+        self.model_id = getattr(underlying, "model_id", type(underlying).__name__)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # 使用 spawn，避免在多线程的服务进程中 fork
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """为文档列表生成嵌入向量，大批量时并行计算"""
+        if self.max_workers <= 1 or len(texts) < self.min_batch_size:
+            return self.underlying.embed_documents(texts)
+
+        slice_size = math.ceil(len(texts) / self.max_workers)
+        slices = [texts[i:i + slice_size] for i in range(0, len(texts), slice_size)]
+        try:
+            executor = self._get_executor()
+            results = executor.map(_embed_slice, [self.underlying] * len(slices), slices)
+            embeddings = []
+            for part in results:
+                embeddings.extend(part)
+            return embeddings
+        except BrokenProcessPool as e:
+            logger.warning("Embedding process pool failed, falling back to in-process embedding: %s", e)
+            self.shutdown()
+            return self.underlying.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        """查询嵌入在当前进程内计算"""
+        return self.underlying.embed_query(text)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
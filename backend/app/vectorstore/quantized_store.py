@@ -0,0 +1,426 @@
+from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import json
+import os
+import sys
+import threading
+import uuid
+import numpy as np
+
+# 可选的量化存储模式；float32 表示不量化，向量直接交给 Chroma
+QUANTIZED_STORAGE_TYPES = {"float16": np.float16, "int8": np.int8}
+
+
+class QuantizedIndex:
+    """集合级的量化向量索引
+
+    内存中只保留量化编码（float16，或 int8 加每向量缩放系数）和向量范数，
+    全精度向量追加写入磁盘并以 memmap 方式读取，仅在对候选结果精确重排序时访问。
+    距离与 Chroma 默认的 l2 空间一致（平方欧氏距离）。
+
+    磁盘文件只追加，同一 id 再次写入时以最后一行为准，旧行在 alive 中标记为失效，
+    检索时跳过；删除的行号追加到 deleted.i64。失效行超过有效行时压缩，
+    只保留有效行重写全部文件。
+
+    内存中的编码、缩放系数、范数和有效标记存放在预分配的缓冲区中，容量不足时按 1.5 倍扩容，
+    追加一批只复制这一批的数据；codes、norms 等属性是缓冲区前 len(self) 行的视图。
+    """
+
+    def __init__(self, directory: str, storage: Optional[str] = None):
+        self.directory = directory
+        self.storage = storage
+        self.dim: Optional[int] = None
+        self.ids: List[str] = []
+        self._codes: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        self._norms: Optional[np.ndarray] = None
+        self._alive: Optional[np.ndarray] = None
+        self._count = 0
+        self._rows: Dict[str, int] = {}
+        self._ids_offset = 0
+        self._deleted_offset = 0
+        self._norms_inode: Optional[int] = None
+        self._lock = threading.Lock()
+
+        meta_path = os.path.join(directory, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            self.storage = meta["storage"]
+            self.dim = meta["dim"]
+        if self.storage not in QUANTIZED_STORAGE_TYPES:
+            raise ValueError(f"Unsupported vector storage: {self.storage}")
+        self._reset()
+        self.refresh()
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, "meta.json"))
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _reset(self):
+        dim = self.dim or 0
+        self.ids = []
+        self._codes = np.zeros((0, dim), dtype=QUANTIZED_STORAGE_TYPES[self.storage])
+        self._scales = np.zeros(0, dtype=np.float32)
+        self._norms = np.zeros(0, dtype=np.float32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._count = 0
+        self._rows = {}
+        self._ids_offset = 0
+        self._deleted_offset = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def codes(self) -> np.ndarray:
+        return self._codes[:self._count]
+
+    @property
+    def scales(self) -> np.ndarray:
+        return self._scales[:self._count]
+
+    @property
+    def norms(self) -> np.ndarray:
+        return self._norms[:self._count]
+
+    @property
+    def alive(self) -> np.ndarray:
+        return self._alive[:self._count]
+
+    @property
+    def live_count(self) -> int:
+        return len(self._rows)
+
+    def _reserve(self, rows: int):
+        """保证缓冲区至少能容纳 rows 行，不足时按 1.5 倍扩容（一次读入时按需分配，不留余量）"""
+        capacity = len(self._norms)
+        if rows <= capacity:
+            return
+        capacity = max(rows, capacity + capacity // 2)
+        count = self._count
+
+        def grow(buffer: np.ndarray) -> np.ndarray:
+            grown = np.empty((capacity,) + buffer.shape[1:], dtype=buffer.dtype)
+            grown[:count] = buffer[:count]
+            return grown
+
+        self._codes = grow(self._codes)
+        self._norms = grow(self._norms)
+        self._alive = grow(self._alive)
+        if self.storage == "int8":
+            self._scales = grow(self._scales)
+
+    def _append_rows(self, ids: Sequence[str], codes: np.ndarray, norms: np.ndarray, scales: Optional[np.ndarray]):
+        """追加一批行；已存在的 id 由新行取代，旧行标记为失效"""
+        start = self._count
+        end = start + len(ids)
+        self._reserve(end)
+        self._codes[start:end] = codes
+        self._norms[start:end] = norms
+        if scales is not None:
+            self._scales[start:end] = scales
+        self._alive[start:end] = True
+        self._count = end
+        self.ids.extend(ids)
+        for row, doc_id in enumerate(ids, start):
+            previous = self._rows.get(doc_id)
+            if previous is not None:
+                self._alive[previous] = False
+            self._rows[doc_id] = row
+
+    def refresh(self):
+        """读入其他进程或实例追加到磁盘的新向量和删除记录；索引被压缩过时整体重新读入"""
+        with self._lock:
+            if self.dim is None or not os.path.exists(self._path("norms.f32")):
+                return
+            # 压缩会用新文件替换范数文件，inode 变化说明行号已重排
+            inode = os.stat(self._path("norms.f32")).st_ino
+            if self._norms_inode is not None and inode != self._norms_inode:
+                self._reset()
+            self._norms_inode = inode
+            self._load_rows()
+            self._load_deletions()
+
+    def _load_rows(self):
+        # 范数文件最后写入，以它的长度作为已提交的行数
+        total = os.path.getsize(self._path("norms.f32")) // 4
+        loaded = len(self.norms)
+        if total <= loaded:
+            return
+        dtype = QUANTIZED_STORAGE_TYPES[self.storage]
+        row_bytes = self.dim * np.dtype(dtype).itemsize
+        codes = np.fromfile(self._path("codes.bin"), dtype=dtype, count=(total - loaded) * self.dim,
+                            offset=loaded * row_bytes).reshape(-1, self.dim)
+        norms = np.fromfile(self._path("norms.f32"), dtype=np.float32, count=total - loaded, offset=loaded * 4)
+        scales = None
+        if self.storage == "int8":
+            scales = np.fromfile(self._path("scales.f32"), dtype=np.float32, count=total - loaded,
+                                 offset=loaded * 4)
+        new_ids = []
+        with open(self._path("ids.txt"), "rb") as f:
+            f.seek(self._ids_offset)
+            for line in f:
+                if loaded + len(new_ids) == total:
+                    break
+                new_ids.append(line.decode("utf-8").rstrip("\n"))
+                self._ids_offset += len(line)
+        self._append_rows(new_ids, codes, norms, scales)
+
+    def _load_deletions(self):
+        """删除记录是被删除行号的 int64 序列；只应用已读入的行，其余留到下次 refresh"""
+        path = self._path("deleted.i64")
+        if not os.path.exists(path):
+            return
+        count = os.path.getsize(path) // 8 - self._deleted_offset // 8
+        if count <= 0:
+            return
+        rows = np.fromfile(path, dtype=np.int64, count=count, offset=self._deleted_offset)
+        for row in rows.tolist():
+            if row >= len(self.alive):
+                break
+            self._mark_deleted(row)
+            self._deleted_offset += 8
+
+    def _mark_deleted(self, row: int):
+        self.alive[row] = False
+        if self._rows.get(self.ids[row]) == row:
+            del self._rows[self.ids[row]]
+
+    def add(self, ids: List[str], vectors: np.ndarray):
+        """追加一批向量；已有的 id 被覆盖"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or not len(ids):
+            return
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                os.makedirs(self.directory, exist_ok=True)
+                with open(self._path("meta.json"), "w") as f:
+                    json.dump({"storage": self.storage, "dim": self.dim}, f)
+                self._reset()
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match collection dimension {self.dim}")
+
+            codes, scales = quantize(vectors, self.storage)
+            norms = np.einsum("ij,ij->i", vectors, vectors).astype(np.float32)
+            with open(self._path("vectors.f32"), "ab") as f:
+                vectors.tofile(f)
+            with open(self._path("codes.bin"), "ab") as f:
+                codes.tofile(f)
+            if scales is not None:
+                with open(self._path("scales.f32"), "ab") as f:
+                    scales.tofile(f)
+            with open(self._path("ids.txt"), "ab") as f:
+                data = "".join(f"{i}\n" for i in ids).encode("utf-8")
+                f.write(data)
+            with open(self._path("norms.f32"), "ab") as f:
+                norms.tofile(f)
+
+            self._append_rows(ids, codes, norms, scales)
+            self._ids_offset += len(data)
+            if self._norms_inode is None:
+                self._norms_inode = os.stat(self._path("norms.f32")).st_ino
+            self._maybe_compact()
+
+    def remove(self, ids: Iterable[str]):
+        """删除一批 id 的向量（先记为墓碑，失效行过半时压缩）"""
+        with self._lock:
+            rows = [self._rows[doc_id] for doc_id in ids if doc_id in self._rows]
+            if not rows:
+                return
+            for row in rows:
+                self._mark_deleted(row)
+            with open(self._path("deleted.i64"), "ab") as f:
+                np.asarray(rows, dtype=np.int64).tofile(f)
+            self._deleted_offset += 8 * len(rows)
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        if len(self) - self.live_count > self.live_count:
+            self._compact()
+
+    def _compact(self, block_rows: int = 16384):
+        """只保留有效行重写索引文件；范数文件最后替换，其他实例据此整体重新读入"""
+        keep = np.flatnonzero(self.alive)
+        full = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="r", shape=(len(self), self.dim))
+        with open(self._path("vectors.f32.tmp"), "wb") as f:
+            for start in range(0, len(keep), block_rows):
+                np.ascontiguousarray(full[keep[start:start + block_rows]]).tofile(f)
+        del full
+        self._codes = self.codes[keep]
+        self._norms = self.norms[keep]
+        self._codes.tofile(self._path("codes.bin.tmp"))
+        if self.storage == "int8":
+            self._scales = self.scales[keep]
+            self._scales.tofile(self._path("scales.f32.tmp"))
+        self.ids = [self.ids[row] for row in keep.tolist()]
+        data = "".join(f"{i}\n" for i in self.ids).encode("utf-8")
+        with open(self._path("ids.txt.tmp"), "wb") as f:
+            f.write(data)
+        self._norms.tofile(self._path("norms.f32.tmp"))
+
+        names = ["vectors.f32", "codes.bin"] + (["scales.f32"] if self.storage == "int8" else []) + ["ids.txt"]
+        for name in names:
+            os.replace(self._path(name + ".tmp"), self._path(name))
+        if os.path.exists(self._path("deleted.i64")):
+            os.remove(self._path("deleted.i64"))
+        os.replace(self._path("norms.f32.tmp"), self._path("norms.f32"))
+
+        self._alive = np.ones(len(self.ids), dtype=bool)
+        self._count = len(self.ids)
+        self._rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self._ids_offset = len(data)
+        self._deleted_offset = 0
+        self._norms_inode = os.stat(self._path("norms.f32")).st_ino
+
+    def approximate_distances(self, query: np.ndarray, block_rows: int = 16384) -> np.ndarray:
+        """用量化编码估算到所有向量的平方欧氏距离（省略常数项 |q|^2）
+
+        分块解码为 float32 后用 BLAS 计算点积，临时内存不超过一个块。
+        """
+        dots = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), block_rows):
+            block = self.codes[start:start + block_rows].astype(np.float32)
+            dots[start:start + block_rows] = block @ query
+        if self.storage == "int8":
+            dots *= self.scales
+        distances = self.norms - 2.0 * dots
+        distances[~self.alive] = np.inf
+        return distances
+
+    def search(self, query: List[float], k: int = 4, oversample: int = 4) -> List[Tuple[str, float]]:
+        """量化编码粗排，取 k * oversample 个候选后用磁盘上的全精度向量精确重排序"""
+        self.refresh()
+        total = len(self)
+        live = self.live_count
+        if not live:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        approx = self.approximate_distances(query)
+        # 失效行的距离为 inf，候选数不超过有效行数时不会被选中
+        candidates = min(live, max(k * oversample, k))
+        if candidates < live:
+            candidate_rows = np.argpartition(approx, candidates - 1)[:candidates]
+        else:
+            candidate_rows = np.flatnonzero(self.alive)
+        candidate_rows.sort()
+
+        full = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="r", shape=(total, self.dim))
+        exact = full[candidate_rows] - query
+        distances = np.einsum("ij,ij->i", exact, exact)
+        order = np.argsort(distances)[:k]
+        return [(self.ids[candidate_rows[i]], float(distances[i])) for i in order]
+
+    def get_vectors(self, ids: Sequence[str]) -> np.ndarray:
+        """按 id 读取磁盘上的全精度向量（用于把分段复制到其他集合）"""
+        self.refresh()
+        full = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="r", shape=(len(self), self.dim))
+        return np.array(full[[self._rows[doc_id] for doc_id in ids]])
+
+    def memory_usage(self) -> Dict[str, int]:
+        """常驻内存占用与等价 float32 存储的对比（字节）
+
+        codes_bytes 是已用行的量化编码、缩放系数、范数和有效标记，reserved_bytes 是缓冲区扩容后
+        尚未使用的容量；ids_bytes 是 id 列表与 id 到行号的映射，三者之和为 resident_bytes。
+        """
+        codes = self.codes.nbytes + self.scales.nbytes + self.norms.nbytes + self.alive.nbytes
+        reserved = self._codes.nbytes + self._scales.nbytes + self._norms.nbytes + self._alive.nbytes - codes
+        ids = sys.getsizeof(self.ids) + sys.getsizeof(self._rows)
+        ids += sum(sys.getsizeof(doc_id) for doc_id in self.ids)
+        ids += sum(sys.getsizeof(row) for row in self._rows.values())
+        return {
+            "vectors": self.live_count,
+            "codes_bytes": int(codes),
+            "ids_bytes": int(ids),
+            "reserved_bytes": int(reserved),
+            "resident_bytes": int(codes + ids + reserved),
+            "float32_bytes": int(self.live_count * (self.dim or 0) * 4),
+        }
+
+
+def quantize(vectors: np.ndarray, storage: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """float16 直接转换；int8 使用每向量对称缩放系数 max|v| / 127"""
+    if storage == "float16":
+        return vectors.astype(np.float16), None
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+class QuantizedChroma(Chroma):
+    """向量存放在 QuantizedIndex 中的 Chroma 集合
+
+    Chroma 只保存文档和元数据（附带 1 维占位向量），写入和检索都经过量化索引，
+    因此 ChatService 等通过 retriever 检索的调用方也无需改动。
+    """
+
+    def __init__(self, index: QuantizedIndex, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._index = index
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        if ids is None:
+            ids = [str(uuid.uuid1()) for _ in texts]
+        self.add_embeddings(ids, texts, self._embedding_function.embed_documents(texts), metadatas)
+        return ids
+
+    def add_embeddings(self, ids: List[str], texts: List[str], embeddings: Sequence[Sequence[float]],
+                       metadatas: Optional[List[dict]] = None):
+        """写入已计算好嵌入的分段：文档进 Chroma，向量进量化索引"""
+        self._collection.upsert(
+            ids=ids,
+            embeddings=[[0.0]] * len(texts),
+            documents=texts,
+            metadatas=metadatas,
+        )
+        self._index.add(ids, np.asarray(embeddings, dtype=np.float32))
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> None:
+        """同时从 Chroma 和量化索引中删除，避免已删除的分段占用检索名额"""
+        self._collection.delete(ids=ids)
+        if ids:
+            self._index.remove(ids)
+
+    def get_embeddings(self, ids: List[str]) -> np.ndarray:
+        """Chroma 中只有占位向量，真实向量从量化索引的全精度文件读取"""
+        return self._index.get_vectors(ids)
+
+    def similarity_search_by_vector_with_relevance_scores(
+        self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, str]] = None,
+        where_document: Optional[Dict[str, str]] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        if filter or where_document:
+            raise ValueError("Metadata filters are not supported for quantized collections")
+        hits = self._index.search(embedding, k=k)
+        if not hits:
+            return []
+        ids = [doc_id for doc_id, _ in hits]
+        stored = self._collection.get(ids=ids, include=["documents", "metadatas"])
+        by_id = {doc_id: (content, metadata) for doc_id, content, metadata in
+                 zip(stored["ids"], stored["documents"], stored["metadatas"])}
+        return [
+            (Document(page_content=by_id[doc_id][0], metadata=by_id[doc_id][1] or {}), distance)
+            for doc_id, distance in hits if doc_id in by_id
+        ]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4,
+                                    filter: Optional[Dict[str, str]] = None,
+                                    where_document: Optional[Dict[str, str]] = None,
+                                    **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_relevance_scores(
+            embedding, k=k, filter=filter, where_document=where_document)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4,
+                                     filter: Optional[Dict[str, str]] = None,
+                                     where_document: Optional[Dict[str, str]] = None,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_relevance_scores(
+            self._embedding_function.embed_query(query), k=k, filter=filter, where_document=where_document)
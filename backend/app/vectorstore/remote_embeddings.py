@@ -0,0 +1,223 @@
+from langchain_core.embeddings import Embeddings
+from typing import List, Optional, Tuple
+import asyncio
+import threading
+import time
+from ..models.base import BaseModelProvider, ModelConfig
+from ..models.config import ModelConfigManager
+from ..models.factory import ModelFactory
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：UTF-8 字节数 / 4（英文约 4 字符一个 token，中文约每字 0.75 个）"""
+    return len(text.encode('utf-8')) // 4 + 1
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    message = str(error).lower()
+    return getattr(error, "status_code", None) == 429 or "429" in message or "rate limit" in message
+
+
+def _is_payload_too_large(error: Exception) -> bool:
+    message = str(error).lower()
+    return getattr(error, "status_code", None) == 413 or any(hint in message for hint in (
+        "413", "too large", "too many inputs", "maximum context length", "max_tokens_per_request",
+    ))
+
+
+class TokenBudget:
+    """按每分钟 token 数限流的令牌桶
+
+    同步代码中的嵌入调用在共享的后台事件循环里执行，查询等异步调用在服务的事件循环里执行，
+    因此用线程锁而不是 asyncio.Lock：
+    acquire 先在锁内预订令牌（余额可以为负，表示排在前面的请求已预订的量），再在锁外等待到
+    预订的令牌补足，多个事件循环和线程中的请求共用同一个预算并按到达顺序放行。
+    """
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = tokens_per_minute
+        self.available = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int) -> float:
+        """预订 tokens 个令牌，返回需要等待的秒数"""
+        tokens = min(tokens, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+            self.updated = now
+            self.available -= tokens
+            return max(0.0, -self.available / self.rate)
+
+    async def acquire(self, tokens: int):
+        """获取 tokens 个令牌，不足时等待补充"""
+        delay = self.reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class RemoteEmbeddings(Embeddings):
+    """通过 BaseModelProvider 批量调用远程嵌入接口
+
+    按条数和 token 数打包请求，限制并发请求数并遵守每分钟 token 预算（同一实例的所有调用共用）；
+    遇到 429 或请求体过大时缩小批次并重试，结果按输入顺序返回。
+    """
+
+    def __init__(self, provider: BaseModelProvider, model: str, model_id: Optional[str] = None,
+                 batch_size: int = 512, max_batch_tokens: int = 250_000, max_concurrency: int = 4,
+                 tokens_per_minute: int = 0, max_retries: int = 5, retry_base_delay: float = 1.0):
+        self.provider = provider
+        self.model = model
+        self.model_id = model_id or model
+        self.max_batch_tokens = max_batch_tokens
+        self.max_concurrency = max_concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.budget = TokenBudget(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+
+        info = provider.get_model_info(model) or {}
+        self.batch_size = min(batch_size, info.get("max_batch_size", batch_size))
+        self.requests_sent = 0
+
+    def _make_batches(self, texts: List[str]) -> List[List[int]]:
+        """按条数和 token 上限将文本下标打包成批次"""
+        batches, current, current_tokens = [], [], 0
+        for i, text in enumerate(texts):
+            tokens = estimate_tokens(text)
+            if current and (len(current) >= self.batch_size or current_tokens + tokens > self.max_batch_tokens):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    async def _embed_batch(self, texts: List[str], indices: List[int], results: List[Optional[List[float]]],
+                           semaphore: asyncio.Semaphore, budget: Optional[TokenBudget], attempt: int = 0):
+        batch = [texts[i] for i in indices]
+        if budget:
+            await budget.acquire(sum(estimate_tokens(text) for text in batch))
+        try:
+            async with semaphore:
+                self.requests_sent += 1
+                vectors = await self.provider.generate_embeddings(batch, model=self.model)
+        except Exception as e:
+            rate_limited = _is_rate_limited(e)
+            if not (rate_limited or _is_payload_too_large(e)) or attempt >= self.max_retries:
+                raise
+            if len(indices) == 1 and not rate_limited:
+                raise
+            # 缩小后续批次，并把当前批次对半拆分后重试
+            self.batch_size = max(1, min(self.batch_size, len(indices) // 2))
+            if rate_limited:
+                await asyncio.sleep(self.retry_base_delay * (2 ** attempt))
+            half = max(1, len(indices) // 2)
+            parts = [indices[:half], indices[half:]] if len(indices) > 1 else [indices]
+            await asyncio.gather(*(
+                self._embed_batch(texts, part, results, semaphore, budget, attempt + 1) for part in parts
+            ))
+            return
+
+        if len(vectors) != len(batch):
+            raise ValueError(f"Embedding provider returned {len(vectors)} vectors for {len(batch)} texts")
+        for i, vector in zip(indices, vectors):
+            results[i] = list(vector)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """异步批量生成嵌入向量"""
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        await asyncio.gather(*(
+            self._embed_batch(texts, indices, results, semaphore, self.budget) for indices in self._make_batches(texts)
+        ))
+        return results
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """异步生成查询嵌入向量"""
+        return (await self.aembed_documents([text]))[0]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """为文档列表生成嵌入向量"""
+        if not texts:
+            return []
+        return _run_sync(self.aembed_documents(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        """为查询文本生成嵌入向量"""
+        return _run_sync(self.aembed_query(text))
+
+
+_background_loop: Optional[asyncio.AbstractEventLoop] = None
+_background_loop_lock = threading.Lock()
+
+
+def _get_background_loop() -> asyncio.AbstractEventLoop:
+    """进程内共享的后台事件循环，在守护线程中常驻运行"""
+    global _background_loop
+    with _background_loop_lock:
+        if _background_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="remote-embeddings", daemon=True).start()
+            _background_loop = loop
+        return _background_loop
+
+
+def _run_sync(coro):
+    """在同步代码中执行协程
+
+    统一提交到共享的后台事件循环，而不是每次 asyncio.run 一个新循环，
+    提供商的 HTTP 客户端和 keep-alive 连接因此在各次调用之间复用。
+    """
+    loop = _get_background_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coro.close()
+        raise RuntimeError("Synchronous embedding call from inside the embedding event loop")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+_config_manager: Optional[ModelConfigManager] = None
+_config_mtime: Optional[float] = None
+_config_lock = threading.Lock()
+
+
+def shared_config_manager() -> ModelConfigManager:
+    """进程内共享的模型配置，providers.json 修改后才重新读取"""
+    global _config_manager, _config_mtime
+    with _config_lock:
+        if _config_manager is None:
+            _config_manager = ModelConfigManager()
+        providers_file = _config_manager.config_dir / "providers.json"
+        mtime = providers_file.stat().st_mtime if providers_file.exists() else None
+        if mtime != _config_mtime:
+            _config_mtime = mtime
+            _config_manager.providers = {}
+            _config_manager.load_config()
+        return _config_manager
+
+
+def resolve_embedding_provider(embedding_model: str,
+                               config_manager: Optional[ModelConfigManager] = None
+                               ) -> Optional[Tuple[str, BaseModelProvider]]:
+    """在已配置的模型提供商中查找提供该嵌入模型的一个，并通过 ModelFactory 创建实例"""
+    config_manager = config_manager or shared_config_manager()
+    available = ModelFactory.get_available_providers()
+    for name, provider_config in config_manager.get_all_providers().items():
+        if name.lower() not in available or not provider_config.api_key:
+            continue
+        if embedding_model == provider_config.embedding_model or embedding_model in provider_config.available_models:
+            provider = ModelFactory.create_provider(name, ModelConfig(
+                api_key=provider_config.api_key,
+                api_base=provider_config.api_base,
+                api_version=provider_config.api_version,
+                model=embedding_model
+            ))
+            return name, provider
+    return None
@@ -0,0 +1,30 @@
+from typing import Any, List, Optional
+import asyncio
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+
+class CollectionRetriever(BaseRetriever):
+    """知识库集合的检索器，供对话链使用
+
+    异步检索（对话链的 acall）的查询嵌入经 ChromaStore.aembed_query：先查共享查询缓存，
+    未命中时与其他并发的检索和搜索请求经微批合并器一起计算；同步检索使用集合自身的
+    similarity_search，查询嵌入同样经过共享缓存。
+    """
+
+    store: Any
+    collection_name: str
+    embedding_model: Optional[str] = None
+    k: int = 4
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        collection = self.store.create_collection(self.collection_name, self.embedding_model)
+        return collection.similarity_search(query, k=self.k)
+
+    async def _aget_relevant_documents(self, query: str, *,
+                                       run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        vector = await self.store.aembed_query(query, self.embedding_model, self.collection_name)
+        collection = self.store.create_collection(self.collection_name, self.embedding_model)
+        return await asyncio.to_thread(collection.similarity_search_by_vector, vector, self.k)
@@ -0,0 +1,117 @@
+from langchain.text_splitter import RecursiveCharacterTextSplitter, TextSplitter
+from langchain_core.embeddings import Embeddings
+from typing import Any, List
+import re
+import numpy as np
+
+# 句子结尾：中英文句末标点（含其后的引号/括号和空白）、后跟空白的英文句号、换行
+_SENTENCE_END = re.compile(r'(?:[。！？!?；;]+["”’」』）)]*|\.(?=\s))\s*|\n+')
+
+
+def split_sentences(text: str) -> List[str]:
+    """按句末标点和换行切分句子，各句拼接后还原原文"""
+    sentences = []
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        sentences.append(text[start:match.end()])
+        start = match.end()
+    if start < len(text):
+        sentences.append(text[start:])
+    return sentences
+
+
+class SemanticTextSplitter(TextSplitter):
+    """按话题边界分段的分割器
+
+    句子（连同前后各 buffer_size 句作为上下文）用知识库的嵌入模型分批向量化，
+    相邻句子的余弦距离在一次矩阵运算中算出；距离超过 breakpoint_percentile 分位数
+    的位置视为话题切换点。分段长度在 [min_chunk_ratio * chunk_size, chunk_size] 范围内有切换点时
+    在最强的切换点切开；没有切换点时不提前切开，装满到 chunk_size，优先在
+    [fill_ratio * chunk_size, chunk_size] 内最后一个段落边界（换行）处切开。
+    分段因此尽量装满，只在真正的话题切换处变短。单句超长时回退到递归字符分割。
+    """
+
+    def __init__(self, embeddings: Embeddings, breakpoint_percentile: float = 95.0,
+                 buffer_size: int = 0, min_chunk_ratio: float = 0.25, fill_ratio: float = 0.85,
+                 batch_size: int = 256, **kwargs: Any):
+        kwargs["chunk_overlap"] = 0  # 按话题切开的分段之间不做重叠
+        super().__init__(**kwargs)
+        self.embeddings = embeddings
+        self.breakpoint_percentile = breakpoint_percentile
+        self.buffer_size = buffer_size
+        self.min_chunk_size = int(self._chunk_size * min_chunk_ratio)
+        self.fill_size = int(self._chunk_size * fill_ratio)
+        self.batch_size = batch_size
+        self._fallback = RecursiveCharacterTextSplitter(
+            chunk_size=self._chunk_size, chunk_overlap=0, length_function=self._length_function,
+            strip_whitespace=self._strip_whitespace
+        )
+
+    def split_text(self, text: str) -> List[str]:
+        sentences = [sentence for sentence in split_sentences(text) if sentence.strip()]
+        if len(sentences) < 2:
+            return self._finish(self._fallback.split_text(text) if sentences else [])
+        distances, threshold = self._distances(sentences)
+        lengths = np.fromiter((self._length_function(sentence) for sentence in sentences),
+                              dtype=np.int64, count=len(sentences))
+        # offsets[i] 为前 i 句的总长度；第 g 个切点位于句子 g-1 与 g 之间，其距离为 distances[g - 1]
+        offsets = np.concatenate(([0], np.cumsum(lengths)))
+        paragraph_ends = np.fromiter((sentence.endswith("\n") for sentence in sentences), dtype=bool,
+                                     count=len(sentences))
+
+        chunks: List[str] = []
+        start = 0
+        total = len(sentences)
+        while start < total:
+            end = int(np.searchsorted(offsets, offsets[start] + self._chunk_size, side='right')) - 1
+            if end <= start:
+                # 超长单句单独用递归分割器切开
+                chunks.extend(self._fallback.split_text(sentences[start]))
+                start += 1
+                continue
+            lowest = max(int(np.searchsorted(offsets, offsets[start] + self.min_chunk_size, side='left')), start + 1)
+            # 候选切点：分段长度在 [min_chunk_size, chunk_size] 内的句间位置
+            candidates = distances[lowest - 1:min(end, total - 1)]
+            strongest = int(np.argmax(candidates)) if candidates.size else -1
+            if strongest >= 0 and candidates[strongest] > threshold:
+                end = lowest + strongest
+            elif end < total:
+                # 没有话题切换点：装满到 chunk_size，接近装满的范围内有段落边界时在最后一个段落边界切开
+                filled = max(int(np.searchsorted(offsets, offsets[start] + self.fill_size, side='left')), lowest)
+                breaks = np.flatnonzero(paragraph_ends[filled - 1:end])
+                if breaks.size:
+                    end = filled + int(breaks[-1])
+            chunks.append("".join(sentences[start:end]))
+            start = end
+        return self._finish(chunks)
+
+    def _finish(self, chunks: List[str]) -> List[str]:
+        if self._strip_whitespace:
+            chunks = [chunk.strip() for chunk in chunks]
+        return [chunk for chunk in chunks if chunk]
+
+    def _distances(self, sentences: List[str]):
+        """相邻句子的余弦距离（长度 len(sentences) - 1）及话题切换阈值"""
+        buffer = self.buffer_size
+        if buffer > 0:
+            # 每句带上前后各 buffer 句作为上下文，减少短句带来的噪声
+            contexts = ["".join(sentences[max(0, i - buffer):i + buffer + 1]) for i in range(len(sentences))]
+        else:
+            contexts = sentences
+        matrix = self._embed(contexts)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        distances = 1.0 - np.einsum('ij,ij->i', matrix[:-1], matrix[1:])
+        return distances, np.percentile(distances, self.breakpoint_percentile)
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """分批嵌入；支持整批矩阵输出的模型直接取矩阵（特征哈希模型因此也不会累计 IDF）"""
+        embed_array = getattr(self.embeddings, "embed_documents_array", None)
+        parts = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            if embed_array is not None:
+                parts.append(np.asarray(embed_array(batch), dtype=np.float32))
+            else:
+                parts.append(np.asarray(self.embeddings.embed_documents(batch), dtype=np.float32))
+        return np.concatenate(parts)
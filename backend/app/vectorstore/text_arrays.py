@@ -0,0 +1,49 @@
+from typing import List, Optional, Tuple
+import numpy as np
+
+# 字符类别标志位
+ALNUM = 1
+SPACE = 2
+
+_BMP_CLASSES: Optional[np.ndarray] = None
+
+
+def encode_batch(texts: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """将一批文本以空格分隔拼接为一个码点数组
+
+    返回 (codes, row_ids, lengths)：每个码点所属的行号（分隔符归前一行）和每行长度。
+    """
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    codes = np.frombuffer(' '.join(texts).encode('utf-32-le'), dtype=np.uint32)
+    row_ids = np.repeat(np.arange(len(texts), dtype=np.int64), lengths + 1)[:codes.size]
+    return codes, row_ids, lengths
+
+
+def char_classes(codes: np.ndarray) -> np.ndarray:
+    """按码点查表得到 str.isalnum / str.isspace 标志位，基本多文种平面之外的字符逐个判断"""
+    global _BMP_CLASSES
+    if _BMP_CLASSES is None:
+        _BMP_CLASSES = np.fromiter(
+            ((ALNUM if chr(i).isalnum() else 0) | (SPACE if chr(i).isspace() else 0) for i in range(0x10000)),
+            dtype=np.uint8, count=0x10000
+        )
+    in_bmp = codes < 0x10000
+    if in_bmp.all():
+        return _BMP_CLASSES[codes]
+    classes = np.zeros(codes.shape, dtype=np.uint8)
+    classes[in_bmp] = _BMP_CLASSES[codes[in_bmp]]
+    astral = np.flatnonzero(~in_bmp)
+    classes[astral] = [ALNUM if chr(c).isalnum() else 0 for c in codes[astral]]
+    return classes
+
+
+def run_bounds(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """返回 mask 中连续 True 区间的起止下标 (starts, ends)，ends 不含"""
+    padded = np.concatenate(([False], mask, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    return edges[0::2], edges[1::2]
+
+
+def rank_within_rows(rows: np.ndarray) -> np.ndarray:
+    """rows 已按行号升序排列，返回每个元素在所在行内的序号"""
+    return np.arange(rows.size) - np.searchsorted(rows, rows, side='left')
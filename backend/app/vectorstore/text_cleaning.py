@@ -0,0 +1,105 @@
+from functools import lru_cache
+from typing import Callable, List, Sequence, Tuple, Union
+import re
+import unicodedata
+
+# 清洗规则按固定顺序执行，与配置中的书写顺序无关
+CLEANING_RULES = (
+    "remove_extra_whitespace",
+    "remove_urls_emails",
+    "normalize_unicode",
+    "remove_special_chars",
+    "preserve_structure",
+)
+
+_URL = re.compile(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+')
+# 等价于 \b[A-Za-z0-9._%+-]+@...：以字符集开头让正则引擎快速跳过不可能的起点，再用后视断言检查词边界
+_EMAIL = re.compile(r'[A-Za-z0-9._%+-](?<=\b.)[A-Za-z0-9._%+-]*@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+_SPECIAL_CHARS = re.compile(r'[^\w\s\u4e00-\u9fff.,!?;:(){}[\]"\'`~@#$%^&*+=|\\/<>-]')
+_EXCESS_NEWLINES = re.compile(r'\n{3,}')
+
+
+def _collapse_whitespace(text: str) -> str:
+    # str.split() 与正则 \s 的空白字符定义相同，等价于 re.sub(r'\s+', ' ', text).strip()
+    return ' '.join(text.split())
+
+
+def _remove_urls_emails(text: str) -> str:
+    # 邮箱模式在每个位置都要尝试匹配，代价较高，先用子串检查跳过不含 URL/邮箱的文本
+    if 'http' in text:
+        text = _URL.sub('', text)
+    if '@' in text:
+        text = _EMAIL.sub('', text)
+    return text
+
+
+def _normalize_unicode(text: str) -> str:
+    if unicodedata.is_normalized('NFKC', text):
+        return text
+    return unicodedata.normalize('NFKC', text)
+
+
+def _remove_special_chars(text: str) -> str:
+    return _SPECIAL_CHARS.sub('', text)
+
+
+def _preserve_structure(text: str) -> str:
+    # 确保段落间有适当的分隔
+    if '\n\n\n' not in text:
+        return text
+    return _EXCESS_NEWLINES.sub('\n\n', text)
+
+
+_RULE_STEPS = {
+    "remove_extra_whitespace": _collapse_whitespace,
+    "remove_urls_emails": _remove_urls_emails,
+    "normalize_unicode": _normalize_unicode,
+    "remove_special_chars": _remove_special_chars,
+    "preserve_structure": _preserve_structure,
+}
+
+
+class CleaningPipeline:
+    """由知识库清洗规则编译出的清洗流水线
+
+    正则在模块加载时预编译，各规则先用子串检查跳过无需处理的文本，
+    规则组合只解析一次并按组合缓存。
+    删除类规则（URL、邮箱、特殊字符）不合并成一个交替正则单次替换：NFKC 规范化夹在中间，
+    且交替分支的首字符集合不同，re 无法再按字面量或字符集快速跳过起点，
+    实测合并后反而慢约 25%（见 benchmarks/bench_text_cleaning.py）。
+    清洗按分割窗口逐段执行：窗口在段落或换行处切开，各规则都不会跨越这些边界，
+    因此逐窗口清洗与整篇清洗得到相同的分段。
+    """
+
+    def __init__(self, rules: Sequence[str]):
+        self.rules: Tuple[str, ...] = tuple(rule for rule in CLEANING_RULES if rule in rules)
+        # 空白合并后已不存在换行，段落结构规则无需再执行
+        effective = [rule for rule in self.rules
+                     if not (rule == "preserve_structure" and "remove_extra_whitespace" in self.rules)]
+        self._steps: List[Callable[[str], str]] = [_RULE_STEPS[rule] for rule in effective]
+
+    def __bool__(self) -> bool:
+        return bool(self.rules)
+
+    def __call__(self, text: str) -> str:
+        for step in self._steps:
+            text = step(text)
+        return text
+
+    @property
+    def config_string(self) -> str:
+        """写入元数据的规则列表（逗号分隔）"""
+        return ','.join(self.rules)
+
+
+@lru_cache(maxsize=64)
+def _compile(rules: Tuple[str, ...]) -> CleaningPipeline:
+    return CleaningPipeline(rules)
+
+
+def get_cleaning_pipeline(cleaning_rules: Union[str, Sequence[str], None]) -> CleaningPipeline:
+    """返回规则对应的清洗流水线；规则可以是逗号分隔的字符串或列表，相同规则共用同一实例"""
+    if isinstance(cleaning_rules, str):
+        cleaning_rules = cleaning_rules.split(',')
+    rules = frozenset(rule.strip() for rule in cleaning_rules or () if rule and rule.strip())
+    return _compile(tuple(rule for rule in CLEANING_RULES if rule in rules))
@@ -0,0 +1,49 @@
+from typing import Dict, Optional
+import numpy as np
+from .tokenizer import WordPieceTokenCounter
+
+# CJK 统一表意文字：扩展 A 区、基本区和兼容表意文字
+_CJK_RANGES = ((0x3400, 0x4DBF), (0x4E00, 0x9FFF), (0xF900, 0xFAFF))
+
+
+class TextStats:
+    """文本流经分割器时逐窗口累计的文档统计，不再单独读取或解码原文件
+
+    char_count 为提取出的全部字符数；CJK 字符逐字计为一个词，连续的 ASCII 字母计为一个
+    英文单词，word_count 为两者之和；传入 token_counter 时 token_count 使用 token_count 长度函数
+    所用的 WordPiece 计数器，否则为 0。
+    分割窗口优先在换行处切开，但没有换行的超长文本会在窗口边界处硬切，跨边界的英文单词会被
+    计为两个、token 数也会略有偏差，因此这些统计是近似值。
+    """
+
+    def __init__(self, token_counter: Optional[WordPieceTokenCounter] = None):
+        self.token_counter = token_counter
+        self.char_count = 0
+        self.cjk_count = 0
+        self.latin_word_count = 0
+        self.token_count = 0
+
+    def update(self, text: str):
+        if not text:
+            return
+        codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+        self.char_count += codes.size
+        for low, high in _CJK_RANGES:
+            # 无符号减法回绕，一次比较判断区间
+            self.cjk_count += int(np.count_nonzero(codes - low <= high - low))
+        letters = ((codes | 0x20) - ord('a')) < 26
+        self.latin_word_count += int(letters[0]) + int(np.count_nonzero(letters[1:] & ~letters[:-1]))
+        if self.token_counter is not None:
+            self.token_count += self.token_counter.count(text)
+
+    @property
+    def word_count(self) -> int:
+        return self.latin_word_count + self.cjk_count
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            'word_count': self.word_count,
+            'char_count': self.char_count,
+            'cjk_count': self.cjk_count,
+            'token_count': self.token_count,
+        }
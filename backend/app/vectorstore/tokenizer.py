@@ -0,0 +1,135 @@
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Pattern, Tuple
+import os
+import re
+import sys
+import threading
+import unicodedata
+
+# 随代码分发的 WordPiece 词表：Google BERT-Base Uncased 的 vocab.txt（Apache-2.0，见 data/NOTICE）
+DEFAULT_VOCAB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "wordpiece_vocab.txt")
+
+# BERT 视为中文字符的 CJK 表意文字区段，每个字符单独成为一个 token（假名等按普通字符处理）
+_CJK_CHARS = (
+    "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+    "\U00020000-\U0002a6df\U0002a700-\U0002ceaf\U0002f800-\U0002fa1f"
+)
+_CJK_PATTERN = re.compile(rf"[{_CJK_CHARS}]")
+
+# 纯 ASCII 文本的预分词：ASCII 标点单独成词，其余非空白字符连成单词（控制字符在计数时删除）
+_ASCII_SEGMENT_PATTERN = re.compile(r"[^ \t\n\r!-/:-@\[-`{-~]+|[!-/:-@\[-`{-~]")
+
+# 超过该长度的单词直接记为一个 [UNK]，与 BERT 的处理一致
+_MAX_WORD_CHARS = 100
+
+
+def _char_class(chars: List[str]) -> str:
+    """把有序字符列表压缩成正则字符类中的区间"""
+    parts = []
+    start = previous = None
+    for char in chars + [None]:
+        code = ord(char) if char is not None else None
+        if previous is not None and code == previous + 1:
+            previous = code
+            continue
+        if start is not None:
+            parts.append(re.escape(chr(start)) if start == previous
+                         else f"{re.escape(chr(start))}-{re.escape(chr(previous))}")
+        start = previous = code
+    return "".join(parts)
+
+
+@lru_cache(maxsize=None)
+def _bert_patterns() -> Tuple[Pattern, Dict[int, None]]:
+    """按 BERT BasicTokenizer 的规则生成预分词正则和待删除字符的 translate 表
+
+    空白为空格、制表符、换行、回车和 Z 类字符；标点为 ASCII 中的非字母数字可见字符和 Unicode P 类字符，
+    每个单独成词；其余字符连成一个单词（emoji、制表符号等不拆开）。单词先匹配连续的字母数字，
+    只有遇到符号时才查完整的字符类，比直接用取反的大字符类快一半。
+    待删除字符是控制字符、格式字符、U+FFFD 和 NFD 分解后的非间距组合符（去重音），
+    它们留在单词中，由缓存的单词计数删除，不必每次扫描整段文本。
+    遍历全部码位约需 0.2 秒，只在首次创建计数器时执行一次。
+    """
+    whitespace, punctuation, removed = [" ", "\t", "\n", "\r"], [], {0xFFFD: None}
+    for char in map(chr, range(sys.maxunicode + 1)):
+        category = unicodedata.category(char)
+        code = ord(char)
+        if 33 <= code <= 47 or 58 <= code <= 64 or 91 <= code <= 96 or 123 <= code <= 126 or category[0] == "P":
+            punctuation.append(char)
+        elif category[0] == "Z" and char != " ":
+            whitespace.append(char)
+        elif category in ("Cc", "Cf", "Mn") and char not in "\t\n\r":
+            removed[code] = None
+    space, punct = _char_class(sorted(whitespace)), _char_class(punctuation)
+    word = rf"(?:[^\W_{_CJK_CHARS}]+|[^\w{space}{punct}{_CJK_CHARS}])+"
+    return re.compile(rf"[{_CJK_CHARS}]+|{word}|[{punct}]"), removed
+
+
+class WordPieceTokenCounter:
+    """基于本地 WordPiece 词表的 token 计数器，不访问网络
+
+    先按 BERT（uncased）的规则预分词（小写化并去重音，中文逐字切分，标点单独成词），
+    再对每个单词做最长匹配的 WordPiece 切分。递归分割器会对重叠的子串反复计数，
+    因此按预分词片段做 LRU 缓存，整段文本的计数只是若干次字典查找之和。
+    """
+
+    def __init__(self, vocab_path: str = DEFAULT_VOCAB_PATH, cache_size: int = 65536):
+        self.vocab_path = vocab_path
+        with open(vocab_path, encoding="utf-8") as f:
+            self.vocab = frozenset(line.rstrip("\n") for line in f if line.strip())
+        self._max_piece = max(len(token) for token in self.vocab)
+        self._segment_pattern, self._removed_chars = _bert_patterns()
+        self._segment_tokens: Callable[[str], int] = lru_cache(maxsize=cache_size)(self._count_segment)
+
+    def count(self, text: str) -> int:
+        """返回文本的 token 数"""
+        return sum(map(self._segment_tokens, self._pretokenize(text)))
+
+    def _pretokenize(self, text: str) -> List[str]:
+        """小写并做 NFD 分解后按 BERT 规则切成单词、标点和中文字符串"""
+        text = text.lower()
+        if text.isascii():
+            return _ASCII_SEGMENT_PATTERN.findall(text)
+        return self._segment_pattern.findall(unicodedata.normalize("NFD", text))
+
+    def _count_segment(self, segment: str) -> int:
+        if _CJK_PATTERN.match(segment):
+            # 中文逐字成词，不在词表中的字记为 [UNK]，数量不变
+            return len(segment)
+        # 删除组合符（去重音）和控制字符，只剩这些字符的片段不产生 token
+        return self._wordpiece_count(segment.translate(self._removed_chars))
+
+    def _wordpiece_count(self, word: str) -> int:
+        """最长匹配切分单词，无法完整切分时记为一个 [UNK]"""
+        if len(word) > _MAX_WORD_CHARS:
+            return 1
+        vocab = self.vocab
+        pieces = 0
+        start = 0
+        while start < len(word):
+            prefix = "##" if start else ""
+            end = min(len(word), start + self._max_piece)
+            while end > start and prefix + word[start:end] not in vocab:
+                end -= 1
+            if end == start:
+                return 1
+            pieces += 1
+            start = end
+        return pieces
+
+    def cache_info(self):
+        return self._segment_tokens.cache_info()
+
+
+_token_counters: Dict[str, WordPieceTokenCounter] = {}
+_token_counters_lock = threading.Lock()
+
+
+def get_token_counter(vocab_path: Optional[str] = None, cache_size: int = 65536) -> WordPieceTokenCounter:
+    """进程内共享的 token 计数器，同一词表只加载一次"""
+    vocab_path = vocab_path or DEFAULT_VOCAB_PATH
+    with _token_counters_lock:
+        counter = _token_counters.get(vocab_path)
+        if counter is None:
+            counter = _token_counters[vocab_path] = WordPieceTokenCounter(vocab_path, cache_size)
+        return counter
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+基准测试：离线特征哈希嵌入模型与演示嵌入模型的吞吐对比（相同维度，chunks/sec）
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.vectorstore.chroma_store import DemoEmbeddings
+from app.vectorstore.hashing_embeddings import HashingEmbeddings
+from bench_demo_embeddings import legacy_text_to_vector, make_chunks
+
+
+def timed(func, chunks):
+    start = time.perf_counter()
+    func(chunks)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=3000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--dim", type=int, default=384)
+    args = parser.parse_args()
+
+    chunks = make_chunks(args.chunks, args.chunk_size)
+    demo = DemoEmbeddings(dim=args.dim)
+    hashing = HashingEmbeddings(dim=args.dim)
+    demo.embed_documents(chunks[:1])
+    hashing.embed_documents(chunks[:1])
+
+    results = {
+        "legacy demo (per text)": timed(lambda c: [legacy_text_to_vector(t, args.dim) for t in c], chunks),
+        "demo (batched)": timed(demo.embed_documents, chunks),
+        "hashing": timed(hashing.embed_documents, chunks),
+    }
+
+    print(f"chunks: {len(chunks)}, chunk_size: {args.chunk_size}, dim: {args.dim}")
+    baseline = results["legacy demo (per text)"]
+    for name, elapsed in results.items():
+        print(f"{name:24s}: {len(chunks) / elapsed:10.1f} chunks/sec ({elapsed:.3f}s, {baseline / elapsed:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
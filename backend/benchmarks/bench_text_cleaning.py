@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+基准测试：编译后的清洗流水线与逐条 re.sub 实现在多 MB 文本上的耗时对比（MB/sec）
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+import unicodedata
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.vectorstore.ingest_pipeline import iter_text_windows
+from app.vectorstore.text_cleaning import (
+    CLEANING_RULES, _EMAIL, _SPECIAL_CHARS, _URL, _collapse_whitespace, _preserve_structure, get_cleaning_pipeline,
+)
+
+
+def legacy_clean(text: str, cleaning_rules):
+    """优化前的实现，作为对照组"""
+    if "remove_extra_whitespace" in cleaning_rules:
+        text = re.sub(r'\s+', ' ', text)
+        text = text.strip()
+    if "remove_urls_emails" in cleaning_rules:
+        text = re.sub(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', '', text)
+        text = re.sub(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', '', text)
+    if "normalize_unicode" in cleaning_rules:
+        text = unicodedata.normalize('NFKC', text)
+    if "remove_special_chars" in cleaning_rules:
+        text = re.sub(r'[^\w\s\u4e00-\u9fff.,!?;:(){}[\]"\'`~@#$%^&*+=|\\/<>-]', '', text)
+    if "preserve_structure" in cleaning_rules:
+        text = re.sub(r'\n{3,}', '\n\n', text)
+    return text
+
+
+# 删除类规则合并为一个交替正则的对照实现（仅在不做 NFKC 规范化时与逐条替换等价）
+_FUSED_DELETIONS = re.compile('|'.join(p.pattern for p in (_URL, _EMAIL, _SPECIAL_CHARS)))
+
+
+def fused_clean(text: str, cleaning_rules):
+    """URL、邮箱和特殊字符在一次 sub 中删除"""
+    if "remove_extra_whitespace" in cleaning_rules:
+        text = _collapse_whitespace(text)
+    text = _FUSED_DELETIONS.sub('', text)
+    if "preserve_structure" in cleaning_rules and "remove_extra_whitespace" not in cleaning_rules:
+        text = _preserve_structure(text)
+    return text
+
+
+def make_document(size_mb: float, seed: int = 42) -> str:
+    """生成含 URL、邮箱、全角字符和多余空行的中英文混排文档"""
+    rng = random.Random(seed)
+    # URL、邮箱和全角字符在正文中通常是少数
+    pieces = ["知识库", "向量检索", "embedding", "search   results", "★", "\t", "\n", "\n\n\n\n",
+              "ＡＢＣ", "https://example.com/docs?id=42", "support@example.org"]
+    weights = [30, 30, 30, 20, 2, 5, 10, 3, 0.01, 0.01, 0.01]
+    target = int(size_mb * 1024 * 1024)
+    parts, length = [], 0
+    while length < target:
+        piece = rng.choices(pieces, weights)[0]
+        parts.append(piece)
+        length += len(piece) + 1
+    return " ".join(parts)
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-mb", type=float, default=8)
+    parser.add_argument("--window-size", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    text = make_document(args.size_mb)
+    megabytes = len(text.encode("utf-8")) / 1024 / 1024
+    print(f"document: {len(text)} chars, {megabytes:.1f} MB")
+    rule_sets = {"all rules": list(CLEANING_RULES), "without whitespace": list(CLEANING_RULES[1:]),
+                 "without unicode": [rule for rule in CLEANING_RULES if rule != "normalize_unicode"]}
+    for name, rules in rule_sets.items():
+        pipeline = get_cleaning_pipeline(rules)
+        legacy = timed(lambda: legacy_clean(text, rules))
+        whole = timed(lambda: pipeline(text))
+        windowed = timed(lambda: [pipeline(window) for window in iter_text_windows(text, args.window_size)])
+        timings = [("legacy", legacy), ("pipeline", whole), ("pipeline per window", windowed)]
+        if "normalize_unicode" not in rules:
+            assert fused_clean(text, rules) == pipeline(text)
+            timings.append(("single alternation", timed(lambda: fused_clean(text, rules))))
+        print(f"{name}:")
+        for label, elapsed in timings:
+            print(f"  {label:20s}: {megabytes / elapsed:8.1f} MB/sec ({elapsed:.3f}s, {legacy / elapsed:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
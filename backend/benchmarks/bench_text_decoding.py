@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+基准测试：整篇 chardet 检测 + 整篇解码与有界样本检测 + 流式解码的耗时
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import chardet
+from app.services.text_decoding import FALLBACK_ENCODINGS, detect_encoding, iter_decoded_text
+
+LINE = "2024-05-01 12:00:{:02d} INFO 用户 user_{} 访问知识库 kb_{}，检索耗时 {} ms\n"
+
+
+def full_file(path: str) -> str:
+    """改动前的实现：读入整篇，chardet 检测全部字节后整篇解码"""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    result = chardet.detect(raw)
+    candidates = [result['encoding']] if result['encoding'] and result['confidence'] > 0.7 else []
+    for encoding in candidates + FALLBACK_ENCODINGS:
+        try:
+            return raw.decode(encoding)
+        except (UnicodeDecodeError, LookupError):
+            continue
+    return raw.decode('utf-8', errors='replace')
+
+
+def sampled(path: str) -> str:
+    return "".join(iter_decoded_text(path, detect_encoding(path)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-mb", type=float, default=4.0)
+    parser.add_argument("--encoding", default="gbk")
+    args = parser.parse_args()
+
+    lines, size, i = [], 0, 0
+    while size < args.size_mb * 1024 * 1024:
+        line = LINE.format(i % 60, i % 997, i % 13, i % 500)
+        lines.append(line)
+        size += len(line.encode(args.encoding))
+        i += 1
+    text = "".join(lines)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.txt")
+        with open(path, 'wb') as f:
+            f.write(text.encode(args.encoding))
+        for name, run in (("full-file chardet", full_file), ("bounded sample", sampled)):
+            start = time.perf_counter()
+            decoded = run(path)
+            elapsed = time.perf_counter() - start
+            assert decoded == text
+            print(f"{name:18s}: {elapsed:7.3f}s ({size / elapsed / 1024 / 1024:7.1f} MB/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,16 @@ def client():
     """Create a test client."""
     return TestClient(app)
 
+@pytest.fixture
+def knowledge_service(tmp_path, monkeypatch):
+    """Create a knowledge service whose vector store lives in a per-test directory."""
+    from app.services.knowledge_service import KnowledgeService
+    from app.vectorstore.chroma_store import ChromaStore
+    monkeypatch.chdir(tmp_path)
+    service = KnowledgeService()
+    service.vector_store = ChromaStore(persist_directory=str(tmp_path / "chroma"))
+    return service
+
 @pytest.fixture
 def test_agent_config():
     """Create a test agent configuration."""
@@ -0,0 +1,93 @@
+import asyncio
+import io
+import os
+import time
+import zipfile
+
+import pytest
+from fastapi import UploadFile
+
+from app.api import knowledge
+from app.auth import User
+from app.vectorstore.chroma_store import ChromaStore
+
+USER = User(id="u1", username="tester")
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(knowledge, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    os.makedirs(tmp_path / "uploads")
+    monkeypatch.setattr(knowledge, "documents_store", {})
+    store = ChromaStore(persist_directory=str(tmp_path / "db"))
+    monkeypatch.setattr(knowledge.knowledge_service, "vector_store", store)
+    return store
+
+
+def create_kb():
+    request = knowledge.CreateKnowledgeBaseRequest(name="kb", embedding_model="hashing-128",
+                                                   chunk_size=150, chunk_overlap=10)
+    return asyncio.run(knowledge.create_knowledge_base(request, current_user=USER))["data"]
+
+
+def text(topic):
+    return "\n\n".join(f"{topic} 第{i}节 section {i} 内容" for i in range(60)).encode()
+
+
+def upload_batch(kb, files):
+    uploads = [UploadFile(io.BytesIO(data), filename=filename) for filename, data in files]
+    results = asyncio.run(knowledge.upload_documents_batch(kb["id"], files=uploads, current_user=USER))
+    for _ in range(500):
+        if all(doc["status"] != "processing" for doc in knowledge.documents_store.values()):
+            break
+        time.sleep(0.02)
+    return results["data"]["documents"]
+
+
+def stored_document_ids(store, kb):
+    stored = store.create_collection(kb["id"], "hashing-128")._collection.get(include=["metadatas"])
+    return [meta["document_id"] for meta in stored["metadatas"]]
+
+
+def test_batch_upload_processes_files_in_one_job(store):
+    kb = create_kb()
+    results = upload_batch(kb, [("a.txt", text("财务")), ("b.md", text("人事")), ("empty.txt", b"  \n"),
+                                ("tool.exe", b"MZ"), ("a-copy.txt", text("财务"))])
+    assert [result["status"] for result in results] == [
+        "processing", "processing", "processing", "rejected", "duplicate"]
+    assert "Unsupported file type" in results[3]["error"]
+    assert results[4]["document"]["id"] == results[0]["document"]["id"]
+
+    documents = [knowledge.documents_store[result["document"]["id"]] for result in results[:3]]
+    assert len({doc["batch_id"] for doc in documents}) == 1
+    assert [doc["status"] for doc in documents] == ["completed", "completed", "failed"]
+    assert "No text content" in documents[2]["error"]
+
+    ids = stored_document_ids(store, kb)
+    assert len(ids) == sum(doc["chunk_count"] for doc in documents)
+    for doc in documents[:2]:
+        assert doc["chunk_count"] > 0 and ids.count(doc["id"]) == doc["chunk_count"] and doc["word_count"] > 0
+    assert not os.listdir(knowledge.UPLOAD_DIR)
+
+    progress = asyncio.run(knowledge.get_indexing_progress(kb["id"], current_user=USER))["data"]["progress"]
+    assert progress["total"] == 3 and progress["processed"] == 3 and progress["status"] == "completed"
+
+
+def test_batch_upload_expands_zip_archives_safely(store, tmp_path):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("docs/", "")
+        archive.writestr("docs/guide.txt", text("指南"))
+        archive.writestr("../../escape.md", text("越界"))
+        archive.writestr("__MACOSX/docs/._guide.txt", b"\x00\x05")
+        archive.writestr("bin/run.sh", b"rm -rf /")
+    kb = create_kb()
+    results = upload_batch(kb, [("bundle.zip", buffer.getvalue()), ("broken.zip", b"not a zip")])
+
+    assert [(result["filename"], result["status"]) for result in results] == [
+        ("guide.txt", "processing"), ("escape.md", "processing"), ("broken.zip", "rejected")]
+    assert {result.get("archive") for result in results[:2]} == {"bundle.zip"}
+    assert not (tmp_path / "escape.md").exists() and not os.listdir(knowledge.UPLOAD_DIR)
+    for result in results[:2]:
+        doc = knowledge.documents_store[result["document"]["id"]]
+        assert doc["status"] == "completed" and doc["chunk_count"] > 0
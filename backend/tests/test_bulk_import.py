@@ -0,0 +1,72 @@
+import json
+import zipfile
+
+import bulk_import
+from app.vectorstore.chroma_store import ChromaStore
+from app.vectorstore.hashing_embeddings import IdfStatistics
+
+
+def write_docs(directory, count):
+    directory.mkdir(parents=True, exist_ok=True)
+    for i in range(count):
+        body = "\n\n".join(f"文档{i} 第{j}节 bulk import section {j} " + "内容" * (j % 5 + 1) for j in range(40))
+        (directory / f"doc{i}.txt").write_text(body, encoding="utf-8")
+    (directory / "notes.bin").write_bytes(b"\x00\x01")
+    (directory / "empty.md").write_text("   \n", encoding="utf-8")
+
+
+def run(source, db, workers=1, embedding_model="hashing-128"):
+    return bulk_import.main([str(source), "--collection", "kb_bulk", "--persist-dir", str(db),
+                             "--embedding-model", embedding_model, "--chunk-size", "150", "--chunk-overlap", "10",
+                             "--workers", str(workers), "--batch-size", "64"])
+
+
+def stored_metadatas(db, embedding_model="hashing-128"):
+    collection = ChromaStore(persist_directory=str(db)).create_collection("kb_bulk", embedding_model)
+    return collection._collection.get(include=["metadatas"])["metadatas"]
+
+
+def test_bulk_import_writes_chunks_and_resumes_from_manifest(tmp_path):
+    source, db = tmp_path / "docs", tmp_path / "db"
+    write_docs(source, 5)
+    stats = run(source, db, workers=2)
+    assert stats["documents"] == 5 and stats["failed"] == 1 and stats["skipped"] == 0
+
+    metadatas = stored_metadatas(db)
+    assert len(metadatas) == stats["chunks"] > 5
+    assert {meta["filename"] for meta in metadatas} == {f"doc{i}.txt" for i in range(5)}
+    records = [json.loads(line) for line in open(stats["manifest"], encoding="utf-8")]
+    assert sum(record["chunk_count"] for record in records) == stats["chunks"]
+    assert all(record["word_count"] > 0 and record["char_count"] > record["cjk_count"] > 0 for record in records)
+
+    # 再次运行只导入新增的文件
+    (source / "more").mkdir()
+    (source / "more" / "extra.txt").write_text("新增文档 extra document\n\n第二段", encoding="utf-8")
+    again = run(source, db)
+    assert again["skipped"] == 5 and again["documents"] == 1
+    assert len(stored_metadatas(db)) == stats["chunks"] + again["chunks"]
+
+
+def test_bulk_import_reads_zip_archives(tmp_path):
+    source = tmp_path / "docs"
+    write_docs(source, 3)
+    archive = tmp_path / "docs.zip"
+    with zipfile.ZipFile(archive, "w") as bundle:
+        for path in source.iterdir():
+            bundle.write(path, f"nested/{path.name}")
+    stats = run(archive, tmp_path / "db")
+    assert stats["documents"] == 3 and len(stored_metadatas(tmp_path / "db")) == stats["chunks"]
+
+
+def test_bulk_import_rerun_after_crash_does_not_duplicate_chunks(tmp_path):
+    """Chunks written before the manifest record are overwritten, not added again, on the next run."""
+    source, db = tmp_path / "docs", tmp_path / "db"
+    write_docs(source, 3)
+    stats = run(source, db, embedding_model="hashing-idf-128")
+    idf_path = ChromaStore(persist_directory=str(db))._idf_path("kb_bulk")
+    # 模拟写入分段后、记录清单前中断
+    open(stats["manifest"], "w").close()
+    again = run(source, db, embedding_model="hashing-idf-128")
+    assert again["documents"] == 3 and again["chunks"] == stats["chunks"]
+    assert len(stored_metadatas(db, "hashing-idf-128")) == stats["chunks"]
+    assert IdfStatistics(idf_path, 128).documents == stats["chunks"]
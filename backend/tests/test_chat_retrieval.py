@@ -0,0 +1,47 @@
+import asyncio
+
+from langchain_community.chat_models.fake import FakeListChatModel
+
+from app.services.chat_service import ChatService
+from app.vectorstore.chroma_store import ChromaStore
+
+
+def make_chat_service(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    service = ChatService()
+    service.chat_model = FakeListChatModel(responses=["fake answer"])
+    service.vector_store = ChromaStore(persist_directory=str(tmp_path / "chroma"))
+    service.vector_store.add_texts("kb_chat", [
+        "向量数据库用于存储和检索嵌入向量。\n\n知识库把文档切分为分段后写入向量数据库。"
+    ], chunk_size=40, chunk_overlap=5, embedding_model="hashing-128")
+    return service
+
+
+def test_concurrent_chat_retrievals_share_one_embedding_batch(tmp_path, monkeypatch):
+    service = make_chat_service(tmp_path, monkeypatch)
+    for conversation_id in ("c1", "c2"):
+        service.create_conversation(conversation_id, "kb_chat", "hashing-128")
+
+    async def ask_both():
+        return await asyncio.gather(service.chat("c1", "对话检索 微批合并 问题一"),
+                                    service.chat("c2", "对话检索 微批合并 问题二"))
+
+    answers = asyncio.run(ask_both())
+    assert all(answer["answer"] == "fake answer" and answer["sources"] for answer in answers)
+    stats = service.vector_store.get_query_batcher("hashing-128", "kb_chat").stats()
+    assert stats["requests"] == 2 and stats["batches"] == 1
+
+
+def test_chat_queries_hit_the_shared_query_cache(tmp_path, monkeypatch):
+    service = make_chat_service(tmp_path, monkeypatch)
+    store = service.vector_store
+    question = "对话检索 查询缓存 命中"
+    # 知识库搜索先嵌入过同一查询
+    assert asyncio.run(store.asimilarity_search("kb_chat", question, k=1, embedding_model="hashing-128"))
+    hits = store.query_cache.hits
+    batched = store.get_query_batcher("hashing-128", "kb_chat").stats()["requests"]
+
+    service.create_conversation("c1", "kb_chat", "hashing-128")
+    assert asyncio.run(service.chat("c1", question))["sources"]
+    assert store.query_cache.hits == hits + 1
+    assert store.get_query_batcher("hashing-128", "kb_chat").stats()["requests"] == batched
@@ -0,0 +1,52 @@
+import docx
+
+from app.services.docx_extraction import CELL_SEPARATOR, iter_docx_blocks
+
+
+def make_docx(path):
+    document = docx.Document()
+    document.add_heading("采购合同 Purchase Agreement", level=1)
+    run = document.add_paragraph("甲方：").add_run("某某公司")
+    run.add_tab()
+    run.add_text("乙方：供应商")
+    run.add_break()
+    run.add_text("第二行")
+    table = document.add_table(rows=2, cols=3)
+    for r, row in enumerate([("品名", "数量", "单价"), ("服务器", "2", "¥30,000")]):
+        for c, value in enumerate(row):
+            table.cell(r, c).text = value
+    table.cell(1, 0).add_paragraph("含三年维保")
+    nested = table.cell(0, 2).add_table(rows=1, cols=2)
+    nested.cell(0, 0).text = "含税"
+    nested.cell(0, 1).text = "不含运费"
+    document.add_paragraph("")
+    document.add_paragraph("第三条 付款方式 payment terms")
+    document.save(path)
+    return document
+
+
+def test_blocks_follow_document_order_and_include_tables(tmp_path):
+    path = str(tmp_path / "contract.docx")
+    make_docx(path)
+    blocks = list(iter_docx_blocks(path))
+    assert blocks == [
+        "采购合同 Purchase Agreement",
+        "甲方：某某公司\t乙方：供应商\n第二行",
+        CELL_SEPARATOR.join(["品名", "数量", "单价\n含税" + CELL_SEPARATOR + "不含运费"]),
+        CELL_SEPARATOR.join(["服务器\n含三年维保", "2", "¥30,000"]),
+        "",
+        "第三条 付款方式 payment terms",
+    ]
+    # 表格之外的段落与 python-docx 的结果一致
+    paragraphs = [paragraph.text for paragraph in docx.Document(path).paragraphs]
+    assert [block for block in blocks if CELL_SEPARATOR not in block] == paragraphs
+
+
+def test_extract_text_from_docx_streams_tables(knowledge_service, tmp_path):
+    path = str(tmp_path / "contract.docx")
+    make_docx(path)
+    text = knowledge_service.extract_text_from_docx(path)
+    assert text.startswith("采购合同 Purchase Agreement\n甲方：")
+    assert "服务器\n含三年维保 | 2 | ¥30,000" in text and text.endswith("\n\n第三条 付款方式 payment terms")
+    segments = list(knowledge_service.iter_docx_segments(path))
+    assert all(page is None for page, _ in segments) and len(segments) == 6
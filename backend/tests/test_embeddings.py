@@ -0,0 +1,223 @@
+import asyncio
+import numpy as np
+import pytest
+from app.vectorstore.chroma_store import DemoEmbeddings
+from app.vectorstore.embedding_cache import (
+    EmbeddingCache, CachedEmbeddings, QueryEmbeddingCache, QueryCachedEmbeddings
+)
+from app.vectorstore.parallel_embeddings import ParallelEmbeddings
+from app.core.embedding_batcher import QueryEmbeddingBatcher
+from app.vectorstore.hashing_embeddings import HashingEmbeddings, IdfStatistics, parse_hashing_model
+
+
+def reference_text_to_vector(text: str, dim: int = 384):
+    """Per-text implementation DemoEmbeddings must stay compatible with."""
+    text = text.lower().strip()
+    vector = [0.0] * dim
+    char_counts = {}
+    for char in text:
+        if char.isalnum():
+            char_counts[char] = char_counts.get(char, 0) + 1
+    for i, (char, count) in enumerate(char_counts.items()):
+        if i < dim // 2:
+            vector[i] = count / len(text)
+    for i, word in enumerate(text.split()[:dim // 4]):
+        vector[i + dim // 2] = len(word) / 10.0
+    magnitude = sum(x * x for x in vector) ** 0.5
+    if magnitude > 0:
+        vector = [x / magnitude for x in vector]
+    return vector
+
+
+SAMPLE_TEXTS = [
+    "Python是一种高级编程语言，由Guido van Rossum在1989年发明。",
+    "",
+    "   ",
+    "Hello　world\tfoo\nbar 𝔘𝔫𝔦𝔠𝔬𝔡𝔢 😀 emoji",
+    " ".join(f"word{i}" for i in range(200)),
+    "".join(chr(0x4e00 + i) for i in range(300)),
+]
+
+
+def test_demo_embeddings_match_reference():
+    """Batched embeddings equal the per-text reference implementation."""
+    embeddings = DemoEmbeddings().embed_documents(SAMPLE_TEXTS)
+    assert len(embeddings) == len(SAMPLE_TEXTS)
+    for text, vector in zip(SAMPLE_TEXTS, embeddings):
+        assert len(vector) == 384
+        np.testing.assert_allclose(vector, reference_text_to_vector(text), atol=1e-6)
+
+
+def test_demo_embeddings_query_matches_documents():
+    """embed_query returns the same vector as the batched path."""
+    embeddings = DemoEmbeddings()
+    text = SAMPLE_TEXTS[0]
+    assert embeddings.embed_query(text) == embeddings.embed_documents([text])[0]
+
+
+def test_demo_embeddings_array_is_contiguous_float32():
+    """The batch engine returns one contiguous float32 matrix."""
+    matrix = DemoEmbeddings().embed_documents_array(SAMPLE_TEXTS)
+    assert matrix.dtype == np.float32
+    assert matrix.flags["C_CONTIGUOUS"]
+    assert matrix.shape == (len(SAMPLE_TEXTS), 384)
+
+
+class CountingEmbeddings(DemoEmbeddings):
+    """DemoEmbeddings that records how many texts it embedded."""
+
+    def __init__(self):
+        super().__init__()
+        self.embedded = 0
+
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        return super().embed_documents(texts)
+
+
+def test_cached_embeddings_skip_known_texts(tmp_path):
+    """Re-embedding unchanged text is served from the cache."""
+    underlying = CountingEmbeddings()
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"))
+    cached = CachedEmbeddings(underlying, cache, underlying.model_id)
+
+    first = cached.embed_documents(["alpha", "beta", "alpha"])
+    assert underlying.embedded == 2
+    second = cached.embed_documents(["beta", " alpha "])
+    assert underlying.embedded == 2
+    np.testing.assert_allclose(second[0], first[1], atol=1e-6)
+    np.testing.assert_allclose(second[1], first[0], atol=1e-6)
+    assert cache.stats()["hits"] == 2
+
+
+def test_embedding_cache_persists_and_evicts_lru(tmp_path):
+    """Entries survive reopening and the least recently used ones are evicted."""
+    path = str(tmp_path / "cache.sqlite3")
+    cache = EmbeddingCache(path, max_entries=2)
+    cache.put_many(["a"], [[1.0]])
+    cache.put_many(["b"], [[2.0]])
+    cache.get_many(["a"])
+    cache.put_many(["c"], [[3.0]])
+    assert cache.evictions == 1
+    cache.close()
+
+    reopened = EmbeddingCache(path, max_entries=2)
+    assert reopened.get_many(["a", "b", "c"]) == [[1.0], None, [3.0]]
+
+
+def test_parallel_embeddings_preserve_chunk_order():
+    """Process-pool embedding returns vectors in input order."""
+    texts = [f"chunk {i} " + "x" * (i % 17) for i in range(40)]
+    parallel = ParallelEmbeddings(DemoEmbeddings(), max_workers=2, min_batch_size=8)
+    try:
+        assert parallel.embed_documents(texts) == DemoEmbeddings().embed_documents(texts)
+    finally:
+        parallel.shutdown()
+
+
+def test_query_batcher_coalesces_concurrent_queries():
+    """Concurrent queries inside one window share a single batched request."""
+    calls = []
+
+    async def embed_batch(texts):
+        calls.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+    async def run():
+        batcher = QueryEmbeddingBatcher(embed_batch, window_ms=20, max_batch_size=64)
+        queries = ["a", "bb", "a", "cccc"]
+        vectors = await asyncio.gather(*(batcher.embed(q) for q in queries))
+        return batcher, vectors
+
+    batcher, vectors = asyncio.run(run())
+    assert vectors == [[1.0], [2.0], [1.0], [4.0]]
+    assert calls == [["a", "bb", "cccc"]]
+    stats = batcher.stats()
+    assert stats["batches"] == 1 and stats["requests"] == 4
+    assert stats["p99_ms"] >= stats["p50_ms"] > 0
+
+
+def test_parse_hashing_model():
+    """Offline hashing models are selected by embedding_model name."""
+    assert parse_hashing_model("hashing") == (384, False)
+    assert parse_hashing_model("hashing-idf-768") == (768, True)
+    assert parse_hashing_model("text-embedding-ada-002") is None
+
+
+def test_hashing_embeddings_are_comparable_across_texts():
+    """Texts sharing words and n-grams score higher than unrelated text."""
+    matrix = HashingEmbeddings().embed_documents_array([
+        "向量数据库支持相似度检索",
+        "相似度检索依赖向量数据库",
+        "the quick brown fox jumps",
+    ])
+    assert matrix.shape == (3, 384)
+    np.testing.assert_allclose(np.linalg.norm(matrix, axis=1), 1.0, atol=1e-5)
+    assert matrix[0] @ matrix[1] > matrix[0] @ matrix[2] + 0.3
+
+
+def test_hashing_idf_is_learned_per_collection(tmp_path):
+    """Document embedding accumulates document frequencies that reweight queries."""
+    path = str(tmp_path / "idf.json")
+    embeddings = HashingEmbeddings(idf=IdfStatistics(path, 384))
+    embeddings.embed_documents(["common words rare", "common words"])
+    embeddings.embed_documents(["common words"])
+    # 嵌入批次只更新内存中的计数，flush 时才写文件
+    assert IdfStatistics(path, 384).documents == 0
+    embeddings.idf.flush()
+
+    reloaded = IdfStatistics(path, 384)
+    assert reloaded.documents == 3
+    query = HashingEmbeddings(idf=reloaded).embed_query("common rare")
+    assert query != HashingEmbeddings().embed_query("common rare")
+    assert reloaded.documents == 3
+
+
+def test_hashing_idf_forgets_chunks_of_failed_documents(tmp_path):
+    """Chunks removed with a failed document no longer count towards document frequencies."""
+    from app.vectorstore.chroma_store import ChromaStore
+    store = ChromaStore(persist_directory=str(tmp_path))
+
+    def broken():
+        yield 1, "\n\n".join(f"损坏文档 broken page {i}" for i in range(20))
+        yield 2, "第二页"
+        raise ValueError("corrupt")
+
+    result = store.add_texts("kb_idf", ["\n\n".join(f"正常文档 healthy {i}" for i in range(20)), broken()],
+                             chunk_size=40, chunk_overlap=5, embedding_model="hashing-idf-128")
+    assert result["documents"][1]["error"] == "corrupt"
+    assert IdfStatistics(store._idf_path("kb_idf"), 128).documents == result["chunk_count"] > 0
+
+
+def test_query_cache_lru_and_ttl(monkeypatch):
+    """Query vectors are keyed by model and normalized text, evicted LRU and expired by TTL."""
+    now = [100.0]
+    monkeypatch.setattr("app.vectorstore.embedding_cache.time.monotonic", lambda: now[0])
+    cache = QueryEmbeddingCache(max_entries=2, ttl_seconds=60)
+    cache.put("m", "What is RAG?", [1.0])
+    cache.put("m", "second", [2.0])
+    assert cache.get("m", "  What is RAG?\n") == [1.0]
+    assert cache.get("other-model", "What is RAG?") is None
+    cache.put("m", "third", [3.0])
+    assert cache.get("m", "second") is None
+    now[0] += 61
+    assert cache.get("m", "What is RAG?") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["evictions"], stats["expirations"]) == (1, 1, 1)
+
+
+def test_query_cached_embeddings_skip_repeated_queries():
+    """Repeated questions are embedded once; document embedding is unaffected."""
+    class CountingEmbeddings(DemoEmbeddings):
+        calls = 0
+
+        def embed_query(self, text):
+            CountingEmbeddings.calls += 1
+            return super().embed_query(text)
+
+    cache = QueryEmbeddingCache()
+    embeddings = QueryCachedEmbeddings(CountingEmbeddings(), cache)
+    first = embeddings.embed_query("向量检索怎么用")
+    assert embeddings.embed_query("向量检索怎么用") == first
+    assert CountingEmbeddings.calls == 1
+    assert cache.stats()["hit_rate"] == 0.5
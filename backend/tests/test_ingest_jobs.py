@@ -0,0 +1,139 @@
+import asyncio
+import io
+import threading
+import time
+
+from fastapi import UploadFile
+
+from app.api import knowledge
+from app.auth import User
+from app.services.ingest_jobs import IngestWorkerPool
+from app.vectorstore.chroma_store import ChromaStore
+
+
+def test_worker_pool_publishes_progress_and_completion():
+    pool = IngestWorkerPool(max_workers=2)
+    release = threading.Event()
+    finished = []
+
+    def job(name, progress=None):
+        progress("embedding", 3, None)
+        release.wait(5)
+        progress("writing", 8, 8)
+        return name.upper()
+
+    future = pool.submit("job-1", job, "doc", on_done=lambda result, error: finished.append((result, error)))
+    for _ in range(100):
+        if pool.progress("job-1")["stage"] == "embedding":
+            break
+        time.sleep(0.01)
+    assert pool.progress("job-1")["processed"] == 3 and pool.progress("job-1")["total"] is None
+    release.set()
+    assert future.result(5) == "DOC"
+    assert pool.progress("job-1")["stage"] == "completed" and pool.progress("job-1")["total"] == 8
+    assert finished == [("DOC", None)]
+    pool.shutdown()
+
+
+def test_worker_pool_records_failures():
+    pool = IngestWorkerPool(max_workers=1)
+    errors = []
+
+    def job(progress=None):
+        raise ValueError("bad file")
+
+    pool.submit("job-2", job, on_done=lambda result, error: errors.append(error)).result(5)
+    assert pool.progress("job-2")["stage"] == "failed" and pool.progress("job-2")["error"] == "bad file"
+    assert isinstance(errors[0], ValueError)
+    pool.shutdown()
+
+
+def test_worker_pool_evicts_finished_jobs(monkeypatch):
+    """Finished jobs are dropped after the TTL or beyond the retained count; running jobs are kept."""
+    now = [1000.0]
+    monkeypatch.setattr("app.services.ingest_jobs.time.time", lambda: now[0])
+    pool = IngestWorkerPool(max_workers=2, finished_ttl=60, max_finished=2)
+    release = threading.Event()
+    running = pool.submit("running", lambda progress=None: release.wait(5))
+    for i in range(3):
+        pool.submit(f"done-{i}", lambda progress=None: None).result(5)
+    assert pool.progress("done-0") is None
+    assert pool.progress("done-1")["stage"] == pool.progress("done-2")["stage"] == "completed"
+    now[0] += 61
+    assert pool.progress("done-2") is None and pool.progress("running")["stage"] == "queued"
+    release.set()
+    running.result(5)
+    pool.shutdown()
+
+
+def test_add_texts_reports_pipeline_stages(tmp_path):
+    store = ChromaStore(persist_directory=str(tmp_path))
+    events = []
+    text = "\n\n".join(f"第{i}段 progress reporting paragraph {i}" for i in range(100))
+    count = store.add_texts("kb_progress", [text], chunk_size=100, chunk_overlap=10,
+                            progress=lambda *event: events.append(event))["chunk_count"]
+    assert events[0] == ("splitting", 0, None)
+    assert [event for event in events if event[0] == "embedding"][-1][1] == count
+    assert events[-1] == ("writing", count, count)
+
+
+def test_add_texts_reports_writing_progress_per_batch(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.vectorstore.chroma_store.settings.ingest_batch_size", 16)
+    store = ChromaStore(persist_directory=str(tmp_path))
+    events = []
+    text = "\n\n".join(f"第{i}段 batched write progress paragraph {i}" for i in range(100))
+    count = store.add_texts("kb_write_progress", [text], chunk_size=100, chunk_overlap=10,
+                            progress=lambda *event: events.append(event))["chunk_count"]
+    written = [processed for stage, processed, _ in events if stage == "writing"]
+    assert count > 48 and len(written) >= count // 16
+    assert written == sorted(written) and written[0] == 16 and written[-1] == count
+
+
+def test_upload_returns_processing_document_and_reports_progress(tmp_path, monkeypatch):
+    monkeypatch.setattr(knowledge, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(knowledge, "documents_store", {})
+    monkeypatch.setattr(knowledge.knowledge_service, "vector_store", ChromaStore(persist_directory=str(tmp_path / "db")))
+    user = User(id="u1", username="tester")
+    request = knowledge.CreateKnowledgeBaseRequest(name="kb", embedding_model="hashing-128",
+                                                   chunk_size=200, chunk_overlap=20)
+    kb = asyncio.run(knowledge.create_knowledge_base(request, current_user=user))["data"]
+    text = "\n\n".join(f"后台入库 background ingestion paragraph {i}" for i in range(200))
+    upload = UploadFile(io.BytesIO(text.encode()), filename="doc.txt")
+    document = asyncio.run(knowledge.upload_document(kb["id"], file=upload, current_user=user))["data"]
+    assert document["status"] == "processing"
+
+    for _ in range(500):
+        progress = asyncio.run(knowledge.get_indexing_progress(kb["id"], current_user=user))["data"]["progress"]
+        if progress["status"] != "processing":
+            break
+        time.sleep(0.02)
+    assert progress["status"] == "completed" and progress["processed"] == progress["total"] == 1
+    assert progress["documents"][0]["stage"] == "completed"
+    stored = knowledge.documents_store[document["id"]]
+    assert stored["status"] == "completed" and stored["chunk_count"] == progress["documents"][0]["total"] > 0
+    assert not list(tmp_path.glob("*_doc.txt"))
+
+
+def test_simple_upload_processes_off_the_event_loop(tmp_path, monkeypatch):
+    """The compatibility endpoint keeps the event loop free and removes the upload even when processing fails."""
+    monkeypatch.setattr(knowledge, "UPLOAD_DIR", str(tmp_path))
+    release = threading.Event()
+
+    def process_document(file_path, collection_name, metadata=None, progress=None):
+        release.wait(5)
+        raise ValueError("unsupported file")
+
+    monkeypatch.setattr(knowledge.knowledge_service, "process_document", process_document)
+
+    async def run():
+        upload = UploadFile(io.BytesIO(b"content"), filename="legacy.txt")
+        request = asyncio.ensure_future(knowledge.upload_document_simple("kb_simple", file=upload))
+        # 处理未结束时事件循环仍能调度其他协程
+        await asyncio.sleep(0.05)
+        assert not request.done()
+        release.set()
+        return await asyncio.gather(request, return_exceptions=True)
+
+    (error,) = asyncio.run(run())
+    assert isinstance(error, knowledge.HTTPException) and error.detail == "unsupported file"
+    assert not list(tmp_path.glob("*legacy.txt"))
@@ -0,0 +1,235 @@
+import time
+
+import pytest
+
+from app.vectorstore.chroma_store import ChromaStore
+from app.vectorstore.ingest_pipeline import (
+    batched, embed_and_write, iter_chunk_spans, iter_concurrently, iter_segment_windows, iter_text_windows
+)
+
+
+def test_text_windows_cut_at_paragraphs_and_cover_text():
+    """Windows reassemble to the original text and end at paragraph breaks."""
+    text = "\n\n".join(f"paragraph {i} " + "x" * (i % 7) * 10 for i in range(500))
+    windows = list(iter_text_windows(text, window_size=1000))
+    assert "".join(windows) == text
+    assert all(len(window) <= 1000 for window in windows)
+    assert all(window.endswith("\n\n") for window in windows[:-1])
+
+
+def test_segment_windows_merge_within_page_only():
+    segments = [(1, "a" * 300 + "\n"), (1, "b" * 300 + "\n"), (2, "c\n")]
+    segments += [(None, f"paragraph {i}\n") for i in range(200)]
+    windows = list(iter_segment_windows(iter(segments), window_size=1000))
+    assert windows[:2] == [(1, "a" * 300 + "\n" + "b" * 300 + "\n"), (2, "c\n")]
+    assert all(page is None and len(window) <= 1000 for page, window in windows[2:])
+    assert "".join(window for _, window in windows[2:]) == "".join(text for _, text in segments[3:])
+
+
+def test_chunk_spans_follow_overlapping_chunks_through_repeated_text():
+    """Repeated boilerplate must not pull offsets back to an earlier occurrence."""
+    text = "\n\n".join("Copyright notice. All rights reserved." for _ in range(50))
+    spans = [(start, min(start + 60, len(text))) for start in range(0, len(text), 45)]
+    chunks = [text[start:end].strip() for start, end in spans]
+    located = list(iter_chunk_spans(text, chunks, offset=1000))
+    for chunk, start, end in located:
+        assert text[start - 1000:end - 1000] == chunk
+    starts = [start for _, start, _ in located]
+    assert starts == sorted(starts) and len(set(starts)) == len(starts)
+
+
+def test_chunk_spans_report_missing_chunks_without_losing_position():
+    text = "alpha beta gamma delta"
+    located = list(iter_chunk_spans(text, ["alpha beta", "not in text", "gamma delta"]))
+    assert located == [("alpha beta", 0, 10), ("not in text", -1, -1), ("gamma delta", 11, 22)]
+
+
+def test_embed_and_write_bounds_in_flight_batches():
+    """The producer never runs more than the queue capacity ahead of a slow writer."""
+    produced, written, ahead = [], [], []
+
+    def write(texts, metadatas, vectors):
+        time.sleep(0.01)
+        written.append(texts)
+
+    def batches():
+        for batch in batched((str(i) for i in range(40)), 2):
+            produced.append(batch)
+            ahead.append(len(produced) - len(written))
+            yield batch, [{}] * len(batch)
+
+    count = embed_and_write(batches(), lambda texts: [[0.0]] * len(texts), write, queue_size=1)
+    assert count == 40
+    assert [t for batch in written for t in batch] == [str(i) for i in range(40)]
+    # 正在写入 1 批 + 队列中 1 批 + 正在生成 1 批
+    assert max(ahead) <= 3
+
+
+def test_embed_and_write_propagates_writer_errors():
+    def write(texts, metadatas, vectors):
+        raise RuntimeError("disk full")
+
+    with pytest.raises(RuntimeError, match="disk full"):
+        embed_and_write(([["a"], [{}]] for _ in range(5)), lambda texts: [[0.0]], write)
+
+
+def test_add_texts_streams_chunks_into_collection(tmp_path):
+    store = ChromaStore(persist_directory=str(tmp_path))
+    text = "\n\n".join(f"第{i}段 向量数据库 streaming chunk {i}" for i in range(300))
+    count = store.add_texts("kb_stream", [text], metadatas=[{"source": "doc.txt"}],
+                            chunk_size=200, chunk_overlap=20)["chunk_count"]
+    stored = store.create_collection("kb_stream")._collection.get(include=["metadatas"])
+    assert count == len(stored["ids"]) > 10
+    indexes = sorted(meta["chunk_index"] for meta in stored["metadatas"])
+    assert indexes == list(range(count))
+    assert {meta["source"] for meta in stored["metadatas"]} == {"doc.txt"}
+
+
+def test_process_document_reports_text_stats(knowledge_service, tmp_path, monkeypatch):
+    path = tmp_path / "stats.txt"
+    text = "\n\n".join(f"第{i}段 knowledge base 文档统计" for i in range(50))
+    path.write_text(text, encoding="utf-8")
+    result = knowledge_service.process_document(str(path), "kb_stats", chunk_size=120, chunk_overlap=10,
+                                                embedding_model="hashing-128")
+    assert result["chunk_count"] > 1 and "stats" not in result
+    assert result["char_count"] == len(text)
+    assert result["cjk_count"] == 50 * 6
+    assert result["word_count"] == 50 * (6 + 2)
+    # 按字符数分段时默认不做额外的 WordPiece 计数
+    assert result["token_count"] == 0
+    by_tokens = knowledge_service.process_document(str(path), "kb_stats_tokens", chunk_size=60, chunk_overlap=5,
+                                                   length_function="token_count", embedding_model="hashing-128")
+    assert by_tokens["token_count"] == knowledge_service.vector_store._token_counter().count(text) > 0
+    monkeypatch.setattr("app.vectorstore.chroma_store.settings.document_token_stats", True)
+    opted_in = knowledge_service.process_document(str(path), "kb_stats_opt_in", chunk_size=120, chunk_overlap=10,
+                                                  embedding_model="hashing-128")
+    assert opted_in["token_count"] == by_tokens["token_count"]
+
+
+def test_add_texts_consumes_page_segments_lazily(tmp_path):
+    store = ChromaStore(persist_directory=str(tmp_path))
+    consumed = []
+
+    def pages():
+        for number in range(1, 4):
+            consumed.append(number)
+            yield number, "\n\n".join(f"第{number}页 段落 {i} paragraph text" for i in range(20)) + "\n"
+
+    segments = pages()
+    assert consumed == []
+    count = store.add_texts("kb_pages", [segments], chunk_size=120, chunk_overlap=10)["chunk_count"]
+    stored = store.create_collection("kb_pages")._collection.get(include=["documents", "metadatas"])
+    assert consumed == [1, 2, 3] and count == len(stored["ids"])
+    for chunk, meta in zip(stored["documents"], stored["metadatas"]):
+        assert chunk.startswith(f"第{meta['page']}页")
+
+
+def test_text_splitters_are_cached_by_configuration(tmp_path):
+    store = ChromaStore(persist_directory=str(tmp_path))
+    splitter = store._create_text_splitter("recursive", chunk_size=300, chunk_overlap=30)
+    assert store._create_text_splitter("recursive", chunk_size=300, chunk_overlap=30) is splitter
+    assert store._create_text_splitter("recursive", chunk_size=300, chunk_overlap=30,
+                                       length_function="token_count") is not splitter
+    assert store._create_text_splitter("character", chunk_size=300, chunk_overlap=30) is not splitter
+
+
+def test_add_texts_stores_chunk_offsets(tmp_path):
+    store = ChromaStore(persist_directory=str(tmp_path))
+    text = "\n\n".join(f"页眉 模板文字 {i % 3} 重复内容 boilerplate" for i in range(200))
+    store.add_texts("kb_offsets", [text], chunk_size=120, chunk_overlap=30, add_start_index=True)
+    stored = store.create_collection("kb_offsets")._collection.get(include=["documents", "metadatas"])
+    for chunk, meta in zip(stored["documents"], stored["metadatas"]):
+        assert text[meta["start_index"]:meta["end_index"]] == chunk
+
+
+def test_add_texts_skips_near_duplicate_chunks(tmp_path):
+    store = ChromaStore(persist_directory=str(tmp_path))
+    footer = "本手册内容仅供内部参考，未经许可不得转载。Confidential - internal use only. 第{}页"
+    pages = [f"第{i}章 正文内容 section {i} " + "独特段落" * (i + 1) + "\n\n" + footer.format(i)
+             for i in range(30)]
+    first = store.add_texts("kb_dedup", ["\n\n".join(pages)], chunk_size=80, chunk_overlap=5,
+                            dedup_threshold=0.9)
+    assert first["duplicate_chunks"] >= 25
+    # 重新上传同一文档时全部分段都是重复的（指纹已持久化）
+    second = ChromaStore(persist_directory=str(tmp_path)).add_texts(
+        "kb_dedup", ["\n\n".join(pages)], chunk_size=80, chunk_overlap=5, dedup_threshold=0.9)
+    assert second == {"chunk_count": 0, "duplicate_chunks": first["chunk_count"] + first["duplicate_chunks"]}
+
+
+def test_iter_concurrently_keeps_per_source_order():
+    sources = [[f"{n}-{i}" for i in range(200)] for n in range(5)]
+    items = list(iter_concurrently(sources, max_workers=3, queue_size=4))
+    assert len(items) == 1000
+    for n, source in enumerate(sources):
+        assert [item for index, item in items if index == n] == source
+
+
+def test_iter_concurrently_propagates_errors_and_stops_workers():
+    def failing():
+        yield "ok"
+        raise RuntimeError("broken source")
+
+    endless = (f"item {i}" for i in iter(int, 1))
+    with pytest.raises(RuntimeError, match="broken source"):
+        list(iter_concurrently([failing(), endless], max_workers=2, queue_size=2))
+
+
+def test_add_texts_isolates_failed_documents(tmp_path):
+    """A failing document leaves no chunks or fingerprints behind; the others are written once."""
+    store = ChromaStore(persist_directory=str(tmp_path))
+
+    def document(name, fail=False):
+        for page in range(1, 6):
+            if fail and page == 4:
+                raise ValueError(f"{name} is corrupt")
+            yield page, "\n\n".join(f"{name} 第{page}页 段落 {i} " + name * (i % 7 + 1) for i in range(30)) + "\n"
+
+    texts = [document("alpha"), document("beta", fail=True), "", document("gamma")]
+    metadatas = [{"document_id": name} for name in ("alpha", "beta", "empty", "gamma")]
+    result = store.add_texts("kb_batch", texts, metadatas=metadatas, chunk_size=120, chunk_overlap=10,
+                             dedup_threshold=0.95, max_workers=3)
+    documents = result["documents"]
+    assert documents[1] == {"chunk_count": 0, "duplicate_chunks": 0, "error": "beta is corrupt"}
+    assert documents[2]["chunk_count"] == 0 and documents[2]["error"] is None
+    assert documents[0]["chunk_count"] > 0 and documents[3]["chunk_count"] > 0
+
+    stored = store.create_collection("kb_batch")._collection.get(include=["metadatas"])
+    ids = [meta["document_id"] for meta in stored["metadatas"]]
+    assert len(ids) == result["chunk_count"] == documents[0]["chunk_count"] + documents[3]["chunk_count"]
+    assert ids.count("alpha") == documents[0]["chunk_count"] and "beta" not in ids
+
+    # 失败文档的指纹已撤销，修复后重新入库不会被当作重复
+    retry = store.add_texts("kb_batch", [document("beta")], metadatas=[{"document_id": "beta"}],
+                            chunk_size=120, chunk_overlap=10, dedup_threshold=0.95)
+    fresh = ChromaStore(persist_directory=str(tmp_path / "fresh")).add_texts(
+        "kb_batch", [document("beta")], chunk_size=120, chunk_overlap=10, dedup_threshold=0.95)
+    assert retry == fresh and retry["chunk_count"] > 0
+
+
+def test_failed_documents_do_not_suppress_duplicates_in_other_documents(tmp_path):
+    """Chunks matching only a failed document's fingerprints are still written for the others."""
+    store = ChromaStore(persist_directory=str(tmp_path))
+    page = "\n".join(f"第{i}行 shared manual line {i}" for i in range(800))
+
+    def broken():
+        yield 1, page
+        yield 2, "第二页"
+        raise ValueError("corrupt")
+
+    result = store.add_texts("kb_dup_fail", [broken(), page], chunk_size=100, chunk_overlap=10,
+                             dedup_threshold=0.95)
+    failed, healthy = result["documents"]
+    assert failed == {"chunk_count": 0, "duplicate_chunks": 0, "error": "corrupt"}
+    fresh = ChromaStore(persist_directory=str(tmp_path / "fresh")).add_texts(
+        "kb_dup_fail", [page], chunk_size=100, chunk_overlap=10, dedup_threshold=0.95)
+    assert healthy["error"] is None and healthy["chunk_count"] == fresh["chunk_count"] > 200
+    assert healthy["duplicate_chunks"] == fresh["duplicate_chunks"]
+    stored = store.create_collection("kb_dup_fail")._collection.get()
+    assert len(stored["ids"]) == result["chunk_count"] == healthy["chunk_count"]
+
+    # 成功文档的指纹照常持久化
+    again = store.add_texts("kb_dup_fail", [page, "新内容 fresh text"], chunk_size=100, chunk_overlap=10,
+                            dedup_threshold=0.95)
+    assert again["documents"][0] == {"chunk_count": 0, "error": None,
+                                     "duplicate_chunks": healthy["chunk_count"] + healthy["duplicate_chunks"]}
+    assert again["documents"][1]["chunk_count"] == 1
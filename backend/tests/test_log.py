@@ -0,0 +1,27 @@
+import logging
+
+from app.core.log import RateLimitFilter
+
+
+def make_record(msg):
+    return logging.LogRecord("app.test", logging.INFO, __file__, 1, msg, (), None)
+
+
+def test_rate_limit_filter_drops_repeats_and_reports_suppressed(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("app.core.log.time.monotonic", lambda: now[0])
+    rate_limit = RateLimitFilter(max_records=2, interval=60)
+
+    assert [rate_limit.filter(make_record("chunk %d")) for _ in range(5)] == [True, True, False, False, False]
+    # 不同的消息模板分别计数
+    assert rate_limit.filter(make_record("other %d"))
+
+    now[0] = 61.0
+    record = make_record("chunk %d")
+    assert rate_limit.filter(record)
+    assert record.msg == "chunk %d (suppressed 3 similar messages)"
+
+
+def test_rate_limit_disabled_with_zero():
+    rate_limit = RateLimitFilter(max_records=0)
+    assert all(rate_limit.filter(make_record("x")) for _ in range(100))
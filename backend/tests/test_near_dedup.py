@@ -0,0 +1,73 @@
+import random
+import string
+
+from app.vectorstore.near_dedup import NearDuplicateIndex, max_hamming_distance, simhash_batch
+
+
+def hamming(a, b):
+    return bin(int(a) ^ int(b)).count("1")
+
+
+def test_simhash_is_close_for_near_duplicates_and_far_for_different_text():
+    base = "本文件所载信息仅供参考，公司保留最终解释权。All rights reserved. Page 12"
+    near = "本文件所载信息仅供参考，公司保留最终解释权。All rights reserved. Page 13"
+    other = "向量数据库用于存储嵌入向量，并支持近似最近邻检索与元数据过滤。"
+    fingerprints = simhash_batch([base, near, other, "ab", ""])
+    assert hamming(fingerprints[0], fingerprints[1]) <= 6
+    assert hamming(fingerprints[0], fingerprints[2]) > 12
+    # 不足一个 shingle 的短文本使用内容哈希，不会全部相同
+    assert fingerprints[3] != fingerprints[4]
+    # 批量计算与逐条计算一致
+    assert [simhash_batch([text])[0] for text in [base, near, other]] == list(fingerprints[:3])
+
+
+def test_index_finds_every_fingerprint_within_distance(tmp_path):
+    index = NearDuplicateIndex(str(tmp_path / "fp.simhash"), max_hamming_distance(0.9))
+    assert index.max_distance == 6
+    rng = random.Random(7)
+    alphabet = string.ascii_lowercase + " 向量检索知识库分段模型"
+    texts = ["".join(rng.choice(alphabet) for _ in range(120)) for _ in range(50)]
+    assert index.filter_new(texts) == [True] * 50
+    assert index.filter_new([texts[3], texts[3] + ".", "completely unrelated 新内容"]) == [False, False, True]
+
+    index.commit()
+    reloaded = NearDuplicateIndex(str(tmp_path / "fp.simhash"), 6)
+    assert reloaded.size == 51
+    assert reloaded.filter_new([texts[10]]) == [False]
+
+
+def test_uncommitted_fingerprints_are_not_persisted(tmp_path):
+    path = str(tmp_path / "fp.simhash")
+    NearDuplicateIndex(path, 3).filter_new(["never written to the collection"])
+    assert NearDuplicateIndex(path, 3).filter_new(["never written to the collection"]) == [True]
+
+
+def test_scoped_fingerprints_are_private_until_published(tmp_path):
+    path = str(tmp_path / "fp.simhash")
+    index = NearDuplicateIndex(path, 3)
+    texts = ["第一篇文档的页脚 footer of document one", "第二篇文档的页脚 footer of document two"]
+    assert index.filter_new([texts[0], texts[0], texts[1]], scopes=["a", "a", "b"]) == [True, False, True]
+    # 未发布的指纹只对本作用域可见
+    assert index.filter_new([texts[0]], scopes=["c"]) == [True]
+    index.drop("a")
+    index.drop("c")
+    index.publish("b")
+    assert index.filter_new([texts[0], texts[1]]) == [True, False]
+    index.commit()
+    assert NearDuplicateIndex(path, 3).size == 2
+
+
+def test_removed_fingerprints_are_new_again_after_reload(tmp_path):
+    path = str(tmp_path / "fp.simhash")
+    index = NearDuplicateIndex(path, 3)
+    texts = ["被删除文档的分段 chunk of a deleted document", "保留文档的分段 chunk that stays"]
+    index.filter_new(texts)
+    index.commit()
+    index.filter_new(["尚未提交的指纹 not committed yet"])
+    assert index.remove([texts[0], "从未入库的内容 never indexed"]) == 1
+    assert index.size == 2
+    assert index.filter_new([texts[0]]) == [True]
+    # 重写的文件只包含已提交的指纹
+    reloaded = NearDuplicateIndex(path, 3)
+    assert reloaded.size == 1
+    assert reloaded.filter_new(texts) == [True, False]
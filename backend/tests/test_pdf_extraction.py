@@ -0,0 +1,116 @@
+import threading
+import time
+
+from app.services import pdf_extraction
+from app.services.pdf_extraction import iter_pdf_pages
+
+
+def make_pdf(path, page_texts):
+    """写出每页一行文本的最小 PDF"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in page_texts:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects))
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), len(kids))
+
+    data = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    data += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+def test_iter_pdf_pages_in_order_across_workers(tmp_path):
+    path = make_pdf(tmp_path / "doc.pdf", [f"Page {i} text" for i in range(1, 8)])
+    try:
+        pages = list(iter_pdf_pages(path, max_workers=2, pages_per_task=2, page_timeout=0))
+    finally:
+        pdf_extraction.shutdown()
+    assert pages == [(i, f"Page {i} text") for i in range(1, 8)]
+
+
+def test_iter_pdf_pages_keeps_a_bounded_window_of_page_ranges(tmp_path, monkeypatch):
+    """A slow consumer does not make the pool extract (and buffer) the whole document ahead of it."""
+    from concurrent.futures import ThreadPoolExecutor
+    path = make_pdf(tmp_path / "doc.pdf", [f"Page {i} text" for i in range(1, 21)])
+    submitted = []
+
+    class RecordingExecutor(ThreadPoolExecutor):
+        def submit(self, fn, *args, **kwargs):
+            submitted.append(args[1])
+            return super().submit(fn, *args, **kwargs)
+
+    with RecordingExecutor(max_workers=2) as executor:
+        monkeypatch.setattr(pdf_extraction, "_get_executor", lambda max_workers: executor)
+        pages = iter_pdf_pages(path, max_workers=2, pages_per_task=2, page_timeout=0)
+        assert next(pages) == (1, "Page 1 text")
+        time.sleep(0.1)
+        assert submitted == [0, 2, 4, 6, 8]
+        assert list(pages) == [(i, f"Page {i} text") for i in range(2, 21)]
+    assert submitted == list(range(0, 20, 2))
+
+
+def test_extract_text_from_pdf_joins_non_empty_pages(tmp_path, knowledge_service):
+    path = make_pdf(tmp_path / "doc.pdf", ["First", "", "Third"])
+    assert knowledge_service.extract_text_from_pdf(path) == "First\nThird\n"
+
+
+def test_page_timeout_skips_slow_page(tmp_path, monkeypatch):
+    path = make_pdf(tmp_path / "doc.pdf", ["Fast", "Slow", "Fast again"])
+    original = pdf_extraction.pdfplumber.page.Page.extract_text
+
+    def extract_text(page, *args, **kwargs):
+        if page.page_number == 2:
+            time.sleep(5)
+        return original(page, *args, **kwargs)
+
+    monkeypatch.setattr(pdf_extraction.pdfplumber.page.Page, "extract_text", extract_text)
+    start = time.monotonic()
+    pages = list(iter_pdf_pages(path, max_workers=1, page_timeout=0.2))
+    assert time.monotonic() - start < 2
+    assert pages == [(1, "Fast"), (2, ""), (3, "Fast again")]
+
+
+def test_page_timeout_applies_outside_the_main_thread(tmp_path):
+    """Ingest workers run off the main thread; the timeout still skips a slow page there."""
+    # 约 6 万个文本操作的页面，pdfplumber 需要数秒才能提取完
+    slow_page = ") Tj 1 0 Td (".join(["x"] * 60000)
+    path = make_pdf(tmp_path / "doc.pdf", ["Fast", slow_page, "Fast again"])
+    result = {}
+
+    def extract():
+        start = time.monotonic()
+        result["pages"] = list(iter_pdf_pages(path, max_workers=1, pages_per_task=10, page_timeout=0.5))
+        result["seconds"] = time.monotonic() - start
+
+    thread = threading.Thread(target=extract)
+    try:
+        thread.start()
+        thread.join(60)
+    finally:
+        pdf_extraction.shutdown()
+    assert result["pages"] == [(1, "Fast"), (2, ""), (3, "Fast again")]
+    assert result["seconds"] < 3
+
+
+def test_process_document_records_page_numbers(tmp_path, knowledge_service):
+    path = make_pdf(tmp_path / "doc.pdf", [f"Page {i} body text" for i in range(1, 4)])
+    service = knowledge_service
+    result = service.process_document(path, "kb_pdf_pages", metadata={"filename": "doc.pdf"}, chunk_size=100,
+                                      chunk_overlap=10)
+    stored = service.vector_store.create_collection("kb_pdf_pages")._collection.get(include=["documents", "metadatas"])
+    assert result["chunk_count"] == 3
+    assert sorted((meta["page"], doc) for doc, meta in zip(stored["documents"], stored["metadatas"])) == [
+        (i, f"Page {i} body text") for i in range(1, 4)
+    ]
@@ -0,0 +1,127 @@
+import numpy as np
+import pytest
+
+from app.vectorstore.chroma_store import ChromaStore, DemoEmbeddings
+from app.vectorstore.quantized_store import QuantizedChroma, QuantizedIndex
+
+
+@pytest.mark.parametrize("storage", ["float16", "int8"])
+def test_quantized_index_matches_exact_search(tmp_path, storage):
+    """Re-scored results equal exact float32 search and survive a reload."""
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((2000, 64)).astype(np.float32)
+    ids = [f"doc-{i}" for i in range(len(vectors))]
+    index = QuantizedIndex(str(tmp_path), storage=storage)
+    index.add(ids[:1500], vectors[:1500])
+    index.add(ids[1500:], vectors[1500:])
+
+    reader = QuantizedIndex(str(tmp_path))
+    assert reader.storage == storage and len(reader) == 2000
+    query = rng.standard_normal(64).astype(np.float32)
+    exact = np.argsort(((vectors - query) ** 2).sum(axis=1))[:10]
+    hits = reader.search(query.tolist(), k=10)
+    assert [doc_id for doc_id, _ in hits] == [ids[i] for i in exact]
+
+    index.add(["extra"], query[None, :])
+    assert reader.search(query.tolist(), k=1)[0][0] == "extra"
+    usage = reader.memory_usage()
+    assert usage["codes_bytes"] < usage["float32_bytes"] * (0.6 if storage == "float16" else 0.35)
+    assert usage["resident_bytes"] == usage["codes_bytes"] + usage["ids_bytes"] + usage["reserved_bytes"]
+    assert usage["reserved_bytes"] <= usage["codes_bytes"] // 2 + 1
+    assert usage["ids_bytes"] > sum(len(doc_id) for doc_id in ids)
+
+
+def test_quantized_index_grows_buffers_geometrically(tmp_path):
+    """Appending many small batches reallocates the in-memory arrays O(log n) times, not once per batch."""
+    rng = np.random.default_rng(3)
+    vectors = rng.standard_normal((2000, 16)).astype(np.float32)
+    index = QuantizedIndex(str(tmp_path), storage="int8")
+    buffers = set()
+    for start in range(0, len(vectors), 10):
+        index.add([f"doc-{i}" for i in range(start, start + 10)], vectors[start:start + 10])
+        buffers.add(id(index._codes))
+    assert len(index) == 2000 and len(buffers) <= 15
+    reader = QuantizedIndex(str(tmp_path))
+    np.testing.assert_array_equal(reader.codes, index.codes)
+    np.testing.assert_array_equal(reader.scales, index.scales)
+    assert reader.memory_usage()["reserved_bytes"] == 0
+    assert index.search(vectors[7].tolist(), k=1)[0][0] == "doc-7"
+
+
+def test_quantized_index_overwrites_existing_ids(tmp_path):
+    """Re-adding an id replaces its vector instead of adding a second top-k slot."""
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((100, 32)).astype(np.float32)
+    ids = [f"doc-{i}" for i in range(len(vectors))]
+    index = QuantizedIndex(str(tmp_path), storage="int8")
+    index.add(ids, vectors)
+    index.add(ids[:10], vectors[:10] + 5.0)
+
+    for reader in (index, QuantizedIndex(str(tmp_path))):
+        assert reader.memory_usage()["vectors"] == 100
+        hits = reader.search((vectors[3] + 5.0).tolist(), k=20)
+        assert len({doc_id for doc_id, _ in hits}) == 20 and hits[0] == ("doc-3", pytest.approx(0.0, abs=1e-4))
+        np.testing.assert_allclose(reader.get_vectors(["doc-3", "doc-50"]), [vectors[3] + 5.0, vectors[50]])
+        # 覆盖前的旧向量不再参与检索
+        assert "doc-3" not in [doc_id for doc_id, _ in reader.search(vectors[3].tolist(), k=1)]
+
+
+def test_chroma_store_routes_quantized_collections(tmp_path):
+    """A knowledge base created with int8 storage is searched through its index."""
+    store = ChromaStore(persist_directory=str(tmp_path))
+    store.add_texts("kb_int8", ["向量数据库支持相似度检索", "the quick brown fox"], chunk_size=100,
+                    chunk_overlap=10, vector_storage="int8")
+
+    collection = store.create_collection("kb_int8")
+    assert isinstance(collection, QuantizedChroma)
+    results = store.similarity_search("kb_int8", "the quick brown fox", k=1)
+    assert results[0]["content"] == "the quick brown fox"
+    store.delete_collection("kb_int8")
+    assert not QuantizedIndex.exists(str(tmp_path / "quantized" / "kb_int8"))
+
+
+def test_quantized_index_removes_and_compacts(tmp_path):
+    """Removed ids leave top-k at once; compaction rewrites the files and other readers reload."""
+    rng = np.random.default_rng(2)
+    vectors = rng.standard_normal((100, 32)).astype(np.float32)
+    ids = [f"doc-{i}" for i in range(len(vectors))]
+    index = QuantizedIndex(str(tmp_path), storage="float16")
+    index.add(ids, vectors)
+    reader = QuantizedIndex(str(tmp_path))
+
+    index.remove(ids[:40] + ["missing"])
+    assert len(index) == 100 and index.memory_usage()["vectors"] == 60
+    for current in (index, reader, QuantizedIndex(str(tmp_path))):
+        hits = current.search(vectors[5].tolist(), k=60)
+        assert sorted(doc_id for doc_id, _ in hits) == sorted(ids[40:])
+        assert current.search(vectors[5].tolist(), k=100)[0][0] != "doc-5"
+
+    # 失效行超过一半时压缩，行号重排后其他实例整体重新读入
+    index.remove(ids[40:70])
+    assert len(index) == 30 and (tmp_path / "vectors.f32").stat().st_size == 30 * 32 * 4
+    assert not (tmp_path / "deleted.i64").exists()
+    for current in (index, reader, QuantizedIndex(str(tmp_path))):
+        assert current.search(vectors[80].tolist(), k=1)[0] == ("doc-80", pytest.approx(0.0, abs=1e-4))
+        assert len(current.search(vectors[0].tolist(), k=50)) == 30
+        np.testing.assert_allclose(current.get_vectors(["doc-99"]), vectors[99:])
+    index.add(["doc-0"], vectors[:1])
+    assert reader.search(vectors[0].tolist(), k=1)[0][0] == "doc-0"
+
+
+def test_failed_documents_leave_no_quantized_vectors(tmp_path):
+    """Chunks of a document that fails mid-way are deleted from the quantized index too."""
+    store = ChromaStore(persist_directory=str(tmp_path))
+
+    def broken():
+        yield 1, "\n\n".join(f"损坏文档 broken page {i}" for i in range(20))
+        yield 2, "第二页"
+        raise ValueError("corrupt")
+
+    result = store.add_texts("kb_q", ["\n\n".join(f"正常文档 healthy {i}" for i in range(20)), broken()],
+                             chunk_size=40, chunk_overlap=5, vector_storage="int8")
+    assert result["documents"][1]["error"] == "corrupt"
+    index = QuantizedIndex(str(tmp_path / "quantized" / "kb_q"))
+    assert index.memory_usage()["vectors"] == result["chunk_count"] > 0
+    hits = store.create_collection("kb_q").similarity_search("损坏文档 broken page 3", k=result["chunk_count"])
+    assert len(hits) == result["chunk_count"]
+    assert all("broken" not in doc.page_content for doc in hits)
@@ -0,0 +1,166 @@
+import time
+
+import pytest
+from app.models.base import BaseModelProvider, ModelConfig
+from app.models.config import ModelConfigManager, ModelProviderConfig
+from app.models.factory import ModelFactory
+from app.vectorstore.remote_embeddings import RemoteEmbeddings, resolve_embedding_provider
+
+
+class FakeEmbeddingProvider(BaseModelProvider):
+    """Local provider that embeds text as [len(text), index] and can simulate limits."""
+
+    def __init__(self, config: ModelConfig, max_inputs: int = 0, rate_limit_failures: int = 0):
+        self.config = config
+        self.max_inputs = max_inputs
+        self.rate_limit_failures = rate_limit_failures
+        self.calls = []
+
+    async def generate_embeddings(self, texts, model=None):
+        self.calls.append(len(texts))
+        if self.rate_limit_failures:
+            self.rate_limit_failures -= 1
+            raise Exception("Fake embedding error: Error code: 429 - rate limit exceeded")
+        if self.max_inputs and len(texts) > self.max_inputs:
+            raise Exception("Fake embedding error: Error code: 413 - payload too large")
+        return [[float(len(text)), float(text.split("-")[1])] for text in texts]
+
+    async def chat(self, messages, config, stream=False):
+        raise NotImplementedError
+
+    async def analyze_image(self, image_url, prompt, config):
+        raise NotImplementedError
+
+    async def transcribe_audio(self, audio_url, language=None):
+        raise NotImplementedError
+
+    def get_available_models(self):
+        return ["fake-embedding"]
+
+    def get_model_info(self, model):
+        return {"type": "embedding", "max_batch_size": 100}
+
+
+def make_texts(count):
+    return [f"chunk-{i}" for i in range(count)]
+
+
+def test_remote_embeddings_batches_requests():
+    """Thousands of chunks become a handful of provider-sized requests, in order."""
+    provider = FakeEmbeddingProvider(ModelConfig(api_key="fake", model="fake-embedding"))
+    embeddings = RemoteEmbeddings(provider, "fake-embedding", batch_size=512)
+    texts = make_texts(1000)
+
+    vectors = embeddings.embed_documents(texts)
+
+    assert provider.calls == [100] * 10
+    assert [int(v[1]) for v in vectors] == list(range(1000))
+
+
+def test_remote_embeddings_shrink_batches_on_errors():
+    """429s and payload-size errors shrink the batch size and still embed everything."""
+    provider = FakeEmbeddingProvider(
+        ModelConfig(api_key="fake", model="fake-embedding"), max_inputs=30, rate_limit_failures=1
+    )
+    embeddings = RemoteEmbeddings(provider, "fake-embedding", batch_size=100, retry_base_delay=0)
+
+    vectors = embeddings.embed_documents(make_texts(200))
+
+    assert [int(v[1]) for v in vectors] == list(range(200))
+    assert embeddings.batch_size <= 30
+
+
+def test_resolve_embedding_provider_through_model_factory(tmp_path):
+    """Configured providers are created through ModelFactory."""
+    ModelFactory.register_provider("fake", FakeEmbeddingProvider)
+    config_manager = ModelConfigManager(config_dir=str(tmp_path))
+    config_manager.add_provider("fake", ModelProviderConfig(
+        api_key="fake", default_model="fake-chat", embedding_model="fake-embedding"
+    ))
+
+    name, provider = resolve_embedding_provider("fake-embedding", config_manager)
+    assert name == "fake"
+    assert isinstance(provider, FakeEmbeddingProvider)
+    assert resolve_embedding_provider("unknown-embedding", config_manager) is None
+
+
+def test_collections_keep_the_embedder_they_were_indexed_with(tmp_path, monkeypatch):
+    """A collection indexed before a provider was configured stays on that embedder."""
+    from app.vectorstore.chroma_store import ChromaStore
+    store = ChromaStore(persist_directory=str(tmp_path))
+    monkeypatch.setattr(store, "_build_remote_embeddings", lambda model: None)
+    store.add_texts("kb_fallback", ["向量数据库 demo fallback"], embedding_model="fake-embedding")
+    assert store.embedder_record("kb_fallback") == {
+        "embedding_model": "fake-embedding", "model_id": "demo-384", "dimension": 384
+    }
+
+    provider = FakeEmbeddingProvider(ModelConfig(api_key="fake", model="fake-embedding"))
+    monkeypatch.setattr(store, "_build_remote_embeddings",
+                        lambda model: RemoteEmbeddings(provider, model, model_id=f"fake:{model}"))
+    assert store.get_embeddings("fake-embedding", "kb_fallback").model_id == "demo-384"
+    assert store.get_embeddings(None, "kb_fallback").model_id == "demo-384"
+    assert store.get_embeddings("fake-embedding", "kb_new").model_id == "fake:fake-embedding"
+    with pytest.raises(ValueError):
+        store.get_embeddings("hashing-128", "kb_fallback")
+
+    # 记录在磁盘上，新的 ChromaStore 实例同样按记录解析
+    reopened = ChromaStore(persist_directory=str(tmp_path))
+    assert reopened.get_embeddings("fake-embedding", "kb_fallback").model_id == "demo-384"
+    assert len(reopened.create_collection("kb_fallback").similarity_search("向量数据库", k=1)) == 1
+
+
+def test_token_budget_is_shared_across_calls():
+    """Separate calls draw on one per-minute budget instead of a fresh bucket each."""
+    provider = FakeEmbeddingProvider(ModelConfig(api_key="fake", model="fake-embedding"))
+    embeddings = RemoteEmbeddings(provider, "fake-embedding", tokens_per_minute=600)
+    # 每次约 121 个 token，5 次共 605 个，超出 600 的部分按每秒 10 个补充
+    started = time.monotonic()
+    for i in range(5):
+        embeddings.embed_documents([f"chunk-{i}-" + "a" * 472])
+    assert time.monotonic() - started >= 0.4
+    assert embeddings.budget.available <= 0
+
+
+def test_collections_indexed_before_embedder_records_are_inferred(tmp_path, monkeypatch):
+    """A pre-existing demo-384 collection without a record is not switched to the configured remote model."""
+    import chromadb
+    from app.vectorstore.chroma_store import ChromaStore, DemoEmbeddings
+    texts = ["向量数据库 legacy chunk", "旧版本写入的分段 another chunk"]
+    legacy = chromadb.PersistentClient(path=str(tmp_path)).get_or_create_collection("kb_legacy")
+    legacy.add(ids=["a", "b"], documents=texts, embeddings=DemoEmbeddings().embed_documents(texts))
+
+    store = ChromaStore(persist_directory=str(tmp_path))
+    provider = FakeEmbeddingProvider(ModelConfig(api_key="fake", model="fake-embedding"))
+    monkeypatch.setattr(store, "_build_remote_embeddings",
+                        lambda model: RemoteEmbeddings(provider, model, model_id=f"fake:{model}"))
+    assert store.get_embeddings("fake-embedding", "kb_legacy").model_id == "demo-384"
+    assert store.embedder_record("kb_legacy") == {
+        "embedding_model": "fake-embedding", "model_id": "demo-384", "dimension": 384
+    }
+    assert len(store.similarity_search("kb_legacy", "向量数据库", k=1, embedding_model="fake-embedding")) == 1
+    assert store.add_texts("kb_legacy", ["新写入的分段 new chunk"], embedding_model="fake-embedding")["chunk_count"] == 1
+    assert provider.calls == []
+    assert store.get_embeddings("fake-embedding", "kb_empty").model_id == "fake:fake-embedding"
+
+
+def test_openai_provider_reuses_its_embedding_client(monkeypatch):
+    """Batched embedding calls share one client (and connection pool) instead of one per batch."""
+    from types import SimpleNamespace
+    from app.models import openai_provider
+
+    created = []
+
+    class FakeAsyncOpenAI:
+        def __init__(self, **kwargs):
+            created.append(kwargs)
+
+            async def create(input, model):
+                return SimpleNamespace(data=[SimpleNamespace(embedding=[float(len(text))]) for text in input])
+            self.embeddings = SimpleNamespace(create=create)
+
+    monkeypatch.setattr(openai_provider.openai, "AsyncOpenAI", FakeAsyncOpenAI)
+    provider = openai_provider.OpenAIProvider(ModelConfig(api_key="sk-test", model="text-embedding-3-small"))
+    embeddings = RemoteEmbeddings(provider, "text-embedding-3-small", batch_size=10)
+    assert embeddings.embed_documents(make_texts(50)) == [[float(len(t))] for t in make_texts(50)]
+    assert embeddings.embed_query("chunk-1") == [7.0]
+    assert embeddings.requests_sent == 6 and len(created) == 1
@@ -0,0 +1,99 @@
+import numpy as np
+
+from app.vectorstore.chroma_store import ChromaStore
+from app.vectorstore.embedding_cache import CachedEmbeddings
+from app.vectorstore.hashing_embeddings import HashingEmbeddings
+from app.vectorstore.semantic_splitter import SemanticTextSplitter, split_sentences
+
+DATABASE = ["向量数据库存储高维嵌入向量。", "近似最近邻索引加速向量检索。", "HNSW 索引在向量检索中很常见。",
+            "向量数据库支持元数据过滤。"]
+COOKING = ["红烧肉需要五花肉和冰糖。", "先把五花肉焯水再炒糖色。", "小火慢炖一小时红烧肉更入味。",
+           "出锅前大火收汁红烧肉更亮。"]
+
+
+def test_split_sentences_keeps_all_text():
+    text = "第一句。第二句！\nThird sentence. Fourth? 最后没有标点"
+    sentences = split_sentences(text)
+    assert "".join(sentences) == text
+    assert sentences[:2] == ["第一句。", "第二句！\n"]
+
+
+def test_semantic_splitter_cuts_at_topic_change():
+    splitter = SemanticTextSplitter(HashingEmbeddings(dim=256), breakpoint_percentile=80,
+                                    buffer_size=0, min_chunk_ratio=0.0, chunk_size=1000)
+    chunks = splitter.split_text("".join(DATABASE * 2 + COOKING * 2))
+    assert len(chunks) >= 2
+    assert any(chunk.endswith(DATABASE[-1]) for chunk in chunks)
+    assert all(not ("向量" in chunk and "红烧肉" in chunk) for chunk in chunks)
+
+
+def test_semantic_splitter_respects_chunk_size():
+    splitter = SemanticTextSplitter(HashingEmbeddings(dim=128), chunk_size=40)
+    text = "".join((DATABASE + COOKING) * 5) + "超长的句子" * 30 + "。"
+    chunks = splitter.split_text(text)
+    assert all(len(chunk) <= 40 for chunk in chunks)
+    assert "".join(chunks) == text.replace("\n", "")
+
+
+def test_semantic_splitter_does_not_update_idf_statistics(tmp_path):
+    store = ChromaStore(persist_directory=str(tmp_path))
+    embeddings = store.get_embeddings("hashing-idf-128", "kb_semantic")
+    splitter = store._create_text_splitter("semantic", chunk_size=200, embeddings=embeddings)
+    assert isinstance(splitter, SemanticTextSplitter)
+    assert store._create_text_splitter("semantic", chunk_size=200, embeddings=embeddings) is splitter
+    splitter.split_text("".join(DATABASE + COOKING))
+    assert embeddings.idf.documents == 0
+    assert np.all(embeddings.idf.df == 0)
+
+
+def test_semantic_splitter_cuts_at_the_strongest_topic_change():
+    """A weak early spike does not end the chunk when a stronger one follows within chunk_size."""
+    class ScriptedSplitter(SemanticTextSplitter):
+        def _distances(self, sentences):
+            distances = np.full(len(sentences) - 1, 0.1)
+            distances[1], distances[4] = 0.6, 0.9
+            return distances, 0.5
+
+    splitter = ScriptedSplitter(HashingEmbeddings(dim=64), chunk_size=70, min_chunk_ratio=0.0)
+    sentences = [f"第{i}句话。" for i in range(10)]
+    chunks = splitter.split_text("".join(sentences))
+    assert chunks[0] == "".join(sentences[:5])
+
+
+def test_semantic_sentence_embeddings_bypass_the_document_cache(tmp_path):
+    store = ChromaStore(persist_directory=str(tmp_path))
+    embeddings = store.get_embeddings(None, "kb_semantic_cache")
+    assert isinstance(embeddings, CachedEmbeddings)
+    splitter = store._create_text_splitter("semantic", chunk_size=200, embeddings=embeddings)
+    assert splitter.embeddings is embeddings.underlying
+    before = store.embedding_cache.stats()
+    splitter.split_text("".join(DATABASE + COOKING))
+    after = store.embedding_cache.stats()
+    assert (after["hits"], after["misses"]) == (before["hits"], before["misses"])
+
+
+def test_semantic_splitter_fills_chunks_without_topic_changes():
+    """Without a distance above the threshold, chunks are filled toward chunk_size instead of cut early."""
+    class FlatSplitter(SemanticTextSplitter):
+        def _distances(self, sentences):
+            distances = np.full(len(sentences) - 1, 0.1)
+            distances[::3] = 0.3
+            return distances, 0.5
+
+    sentences = [f"第{i:02d}句话语。" for i in range(40)]
+    chunks = FlatSplitter(HashingEmbeddings(dim=64), chunk_size=70).split_text("".join(sentences))
+    assert [len(chunk) for chunk in chunks] == [70] * 4
+
+
+def test_semantic_splitter_does_not_produce_more_chunks_than_recursive():
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    rng = np.random.default_rng(0)
+    paragraphs = []
+    for section in range(30):
+        topic = DATABASE if section % 2 else COOKING
+        for _ in range(rng.integers(2, 5)):
+            paragraphs.append("".join(rng.choice(topic, size=rng.integers(3, 8))))
+    text = "\n".join(paragraphs)
+    semantic = SemanticTextSplitter(HashingEmbeddings(dim=256), chunk_size=300).split_text(text)
+    recursive = RecursiveCharacterTextSplitter(chunk_size=300, chunk_overlap=0).split_text(text)
+    assert len(semantic) <= len(recursive)
@@ -0,0 +1,48 @@
+import re
+import unicodedata
+
+from app.vectorstore.ingest_pipeline import iter_text_windows
+from app.vectorstore.text_cleaning import CLEANING_RULES, get_cleaning_pipeline
+
+SAMPLE = (
+    "第一段  包含ＡＢＣ全角字符 and   extra   spaces ☃.\n\n\n\n"
+    "访问 https://example.com/a?b=1 或联系 admin@example.org 获取帮助 ★\n"
+    "第三行\t\t制表符\n\n\n\n\n第四段 café ﬁ"
+)
+
+
+def reference_clean(text, cleaning_rules):
+    """Per-rule implementation the compiled pipeline must stay compatible with."""
+    if "remove_extra_whitespace" in cleaning_rules:
+        text = re.sub(r'\s+', ' ', text).strip()
+    if "remove_urls_emails" in cleaning_rules:
+        text = re.sub(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', '', text)
+        text = re.sub(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', '', text)
+    if "normalize_unicode" in cleaning_rules:
+        text = unicodedata.normalize('NFKC', text)
+    if "remove_special_chars" in cleaning_rules:
+        text = re.sub(r'[^\w\s\u4e00-\u9fff.,!?;:(){}[\]"\'`~@#$%^&*+=|\\/<>-]', '', text)
+    if "preserve_structure" in cleaning_rules:
+        text = re.sub(r'\n{3,}', '\n\n', text)
+    return text
+
+
+def test_pipeline_matches_reference_for_each_rule_and_all_rules():
+    for rules in [[rule] for rule in CLEANING_RULES] + [list(CLEANING_RULES)]:
+        assert get_cleaning_pipeline(rules)(SAMPLE) == reference_clean(SAMPLE, rules), rules
+
+
+def test_pipeline_is_compiled_once_per_rule_set():
+    pipeline = get_cleaning_pipeline("preserve_structure, remove_urls_emails")
+    assert pipeline is get_cleaning_pipeline(["remove_urls_emails", "preserve_structure", ""])
+    assert pipeline.config_string == "remove_urls_emails,preserve_structure"
+    assert not get_cleaning_pipeline("") and not get_cleaning_pipeline(None)
+
+
+def test_window_wise_cleaning_matches_whole_text():
+    rules = ["remove_urls_emails", "normalize_unicode", "remove_special_chars", "preserve_structure"]
+    text = SAMPLE * 200
+    pipeline = get_cleaning_pipeline(rules)
+    windows = list(iter_text_windows(text, window_size=1000))
+    assert len(windows) > 10
+    assert "".join(pipeline(window) for window in windows) == reference_clean(text, rules)
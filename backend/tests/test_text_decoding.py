@@ -0,0 +1,41 @@
+import pytest
+
+from app.services import knowledge_service as knowledge_module
+from app.services.text_decoding import detect_encoding, iter_decoded_text
+
+TEXT = "知识库文档，包含中文与 English 混合内容。第{}行\n"
+
+
+def write(tmp_path, name, text, encoding):
+    path = tmp_path / name
+    path.write_bytes(text.encode(encoding))
+    return str(path)
+
+
+@pytest.mark.parametrize("encoding, expected", [("utf-8", "utf-8"), ("utf-8-sig", "utf-8-sig"),
+                                                ("utf-16", "utf-16"), ("gbk", "gbk")])
+def test_detect_encoding_on_large_file_samples(tmp_path, encoding, expected):
+    text = "".join(TEXT.format(i) for i in range(20000))
+    path = write(tmp_path, "doc.txt", text, encoding)
+    assert detect_encoding(path, sample_size=4096) == expected
+    assert "".join(iter_decoded_text(path, expected, block_size=1001)) == text
+
+
+def test_iter_decoded_text_replaces_bytes_outside_samples(tmp_path):
+    path = tmp_path / "doc.txt"
+    path.write_bytes("前文".encode() + b"\xff" + "后文".encode())
+    assert "".join(iter_decoded_text(str(path), "utf-8", block_size=4)) == "前文�后文"
+
+
+def test_process_document_records_and_reuses_encoding(tmp_path, monkeypatch, knowledge_service):
+    path = write(tmp_path, "doc.txt", "".join(TEXT.format(i) for i in range(50)), "gbk")
+    service = knowledge_service
+    result = service.process_document(path, "kb_encoding", chunk_size=200, chunk_overlap=20)
+    assert result["encoding"] == "gbk"
+
+    def fail(file_path):
+        raise AssertionError("detection should be skipped")
+
+    monkeypatch.setattr(knowledge_module, "detect_encoding", fail)
+    again = service.process_document(path, "kb_encoding_2", chunk_size=200, chunk_overlap=20, encoding="gbk")
+    assert again["encoding"] == "gbk" and again["chunk_count"] == result["chunk_count"]
@@ -0,0 +1,91 @@
+import pytest
+
+from app.vectorstore.text_stats import TextStats
+from app.vectorstore.tokenizer import WordPieceTokenCounter, get_token_counter
+
+
+def write_vocab(tmp_path, tokens):
+    path = tmp_path / "vocab.txt"
+    path.write_text("\n".join(["[UNK]"] + tokens) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def test_chinese_text_counts_one_token_per_character():
+    counter = get_token_counter()
+    text = "向量数据库是一种专门存储向量的数据库。"
+    assert counter.count(text) == len(text)
+    assert counter.count("知识库 knowledge base，检索") == 3 + 2 + 1 + 2
+
+
+# BERT-Base Uncased 对这些文本的切分结果（前两条取自 google-research/bert 的 README）
+KNOWN_TOKENIZATIONS = {
+    "unaffable": ["una", "##ffa", "##ble"],
+    "Jim Henson was a puppeteer": ["jim", "henson", "was", "a", "puppet", "##eer"],
+    "Hello, world!": ["hello", ",", "world", "!"],
+    "Retrieval-augmented generation (RAG)": ["retrieval", "-", "augmented", "generation", "(", "rag", ")"],
+    "naïve café": ["naive", "cafe"],
+    "├── backend/": ["[UNK]", "back", "##end", "/"],
+    "⭐⭐⭐ 5/5": ["[UNK]", "5", "/", "5"],
+    "向量数据库 embeddings": ["[UNK]", "[UNK]", "[UNK]", "[UNK]", "[UNK]", "em", "##bed", "##ding", "##s"],
+}
+
+
+def test_vendored_vocab_is_bert_base_uncased():
+    counter = get_token_counter()
+    assert len(counter.vocab) == 30522
+    assert {"[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", "the", "##ization"} <= counter.vocab
+
+
+def test_counts_match_known_bert_tokenizations():
+    counter = get_token_counter()
+    for text, tokens in KNOWN_TOKENIZATIONS.items():
+        assert counter.count(text) == len(tokens), text
+
+
+def test_counts_match_reference_tokenizer():
+    """Optional cross-check against the Hugging Face tokenizers implementation when it is installed."""
+    tokenizers = pytest.importorskip("tokenizers")
+    counter = get_token_counter()
+    reference = tokenizers.BertWordPieceTokenizer(counter.vocab_path, lowercase=True, strip_accents=True)
+    texts = list(KNOWN_TOKENIZATIONS) + [
+        "使用Python开发 the API, v2 版本！\n第二段 second paragraph",
+        "Ünïcödé — “quotes” ½ °C ™ ©2024 \x07bell İstanbul ﬁne Ⅻ ①\u3000end",
+        "e-mail: a_b@c.com; GPT-4o costs $0.15/1M tokens (50% off)",
+        "supercalifragilisticexpialidocious " * 3,
+    ]
+    for text in texts:
+        assert counter.count(text) == len(reference.encode(text, add_special_tokens=False).tokens), text
+
+
+def test_wordpiece_longest_match(tmp_path):
+    counter = WordPieceTokenCounter(write_vocab(tmp_path, ["token", "##ization", "##s", "!"]))
+    assert counter.count("Tokenization tokens!") == 5
+    # 无法完整切分的单词记为一个 [UNK]
+    assert counter.count("tokenizer") == 1
+    assert counter.count("") == 0
+
+
+def test_segment_counts_are_memoized(tmp_path):
+    counter = WordPieceTokenCounter(write_vocab(tmp_path, ["a", "##b"]))
+    for _ in range(3):
+        counter.count("ab ab 向量 ab")
+    info = counter.cache_info()
+    assert info.misses == 2
+    assert info.hits == 10
+
+
+def test_shared_counter_is_loaded_once():
+    assert get_token_counter() is get_token_counter(None)
+
+
+def test_text_stats_accumulate_across_windows():
+    text = "使用Python开发 the API, v2 版本！\n第二段 second paragraph"
+    whole = TextStats(get_token_counter())
+    whole.update(text)
+    assert whole.as_dict() == {"word_count": 10 + 3 + 2, "char_count": len(text), "cjk_count": 9,
+                               "token_count": get_token_counter().count(text)}
+    # 按换行分窗累计的结果与整篇一次统计相同
+    windows = TextStats(get_token_counter())
+    for line in text.splitlines(keepends=True):
+        windows.update(line)
+    assert windows.as_dict() == whole.as_dict()
@@ -0,0 +1,121 @@
+import asyncio
+import io
+import time
+
+import numpy as np
+import pytest
+from fastapi import UploadFile
+
+from app.api import knowledge
+from app.auth import User
+from app.vectorstore.chroma_store import ChromaStore
+from app.vectorstore.hashing_embeddings import IdfStatistics
+
+USER = User(id="u1", username="tester")
+TEXT = "\n\n".join(f"员工手册 employee handbook section {i} 内容" for i in range(120)).encode()
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(knowledge, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(knowledge, "documents_store", {})
+    store = ChromaStore(persist_directory=str(tmp_path / "db"))
+    monkeypatch.setattr(knowledge.knowledge_service, "vector_store", store)
+    return store
+
+
+def create_kb(**config):
+    config.setdefault("embedding_model", "hashing-128")
+    request = knowledge.CreateKnowledgeBaseRequest(name="kb", chunk_size=150, chunk_overlap=10, **config)
+    return asyncio.run(knowledge.create_knowledge_base(request, current_user=USER))["data"]
+
+
+def upload(kb, data=TEXT, filename="handbook.txt"):
+    file = UploadFile(io.BytesIO(data), filename=filename)
+    document = asyncio.run(knowledge.upload_document(kb["id"], file=file, current_user=USER))["data"]
+    for _ in range(500):
+        if knowledge.documents_store[document["id"]]["status"] != "processing":
+            break
+        time.sleep(0.02)
+    return knowledge.documents_store[document["id"]]
+
+
+def stored_chunks(store, kb):
+    collection = store.create_collection(kb["id"], "hashing-128")
+    stored = collection._collection.get(include=["documents", "metadatas", "embeddings"])
+    if hasattr(collection, "get_embeddings"):
+        stored["embeddings"] = collection.get_embeddings(stored["ids"]).tolist()
+    return sorted(zip(stored["documents"], map(tuple, stored["embeddings"]), stored["metadatas"]),
+                  key=lambda item: item[2]["chunk_index"])
+
+
+def test_repeat_upload_to_same_kb_is_a_no_op(store):
+    kb = create_kb()
+    first = upload(kb)
+    again = upload(kb, filename="handbook-copy.txt")
+    assert again["id"] == first["id"]
+    assert sum(doc["knowledge_base_id"] == kb["id"] for doc in knowledge.documents_store.values()) == 1
+    assert len(stored_chunks(store, kb)) == first["chunk_count"]
+
+
+def test_upload_to_other_kb_reuses_chunks_and_vectors(store, monkeypatch):
+    source_kb, target_kb = create_kb(), create_kb(vector_storage="int8")
+    source = upload(source_kb)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("document should not be re-processed")
+
+    monkeypatch.setattr(knowledge.knowledge_service, "process_document", fail)
+    copied = upload(target_kb, filename="handbook-v1.txt")
+    assert copied["status"] == "completed" and copied["reused_from"] == source["id"]
+    assert copied["chunk_count"] == source["chunk_count"] > 0
+
+    source_chunks, target_chunks = stored_chunks(store, source_kb), stored_chunks(store, target_kb)
+    assert [text for text, _, _ in target_chunks] == [text for text, _, _ in source_chunks]
+    np.testing.assert_allclose([vector for _, vector, _ in target_chunks],
+                               [vector for _, vector, _ in source_chunks], rtol=1e-6)
+    assert {meta["document_id"] for _, _, meta in target_chunks} == {copied["id"]}
+    assert {meta["filename"] for _, _, meta in target_chunks} == {"handbook-v1.txt"}
+
+
+def test_different_chunk_config_is_processed_again(store):
+    source = upload(create_kb())
+    other = upload(create_kb(splitter_type="character"))
+    assert other["status"] == "completed" and other.get("reused_from") is None
+    assert other["id"] != source["id"]
+
+
+def test_reused_chunks_count_towards_target_idf(store):
+    source_kb, target_kb = create_kb(embedding_model="hashing-idf-128"), create_kb(embedding_model="hashing-idf-128")
+    source = upload(source_kb)
+    copied = upload(target_kb, filename="handbook-v1.txt")
+    assert copied["reused_from"] == source["id"]
+    idf = IdfStatistics(store._idf_path(target_kb["id"]), 128)
+    assert idf.documents == copied["chunk_count"] > 0
+
+
+def test_reuse_falls_back_to_processing_when_source_chunks_are_gone(store, monkeypatch):
+    source_kb, target_kb = create_kb(), create_kb()
+    source = upload(source_kb)
+    assert source["encoding"]
+    store.create_collection(source_kb["id"], "hashing-128")._collection.delete(where={"document_id": source["id"]})
+
+    def fail(file_path):
+        raise AssertionError("the source document's encoding should be reused")
+
+    monkeypatch.setattr("app.services.knowledge_service.detect_encoding", fail)
+    copied = upload(target_kb, filename="handbook-v1.txt")
+    assert copied["status"] == "completed" and copied.get("reused_from") is None
+    assert copied["chunk_count"] == source["chunk_count"] == len(stored_chunks(store, target_kb)) > 0
+
+
+def test_deleted_document_can_be_uploaded_again(store):
+    kb = create_kb(dedup_threshold=0.9)
+    first = upload(kb)
+    assert first["chunk_count"] > 0
+    asyncio.run(knowledge.delete_document(kb["id"], first["id"], current_user=USER))
+    assert stored_chunks(store, kb) == []
+
+    again = upload(kb)
+    assert again["id"] != first["id"] and again["status"] == "completed"
+    assert again["chunk_count"] == first["chunk_count"] == len(stored_chunks(store, kb))
@@ -0,0 +1,61 @@
+import asyncio
+import hashlib
+import io
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from app.api import knowledge
+from app.auth import User
+from app.core.config import settings
+from app.services.upload_storage import UploadTooLarge, save_upload
+
+
+class CountingStream(io.BytesIO):
+    """记录被读取的字节数"""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.bytes_read += len(chunk)
+        return chunk
+
+
+def test_save_upload_streams_to_disk_and_hashes(tmp_path):
+    data = bytes(range(256)) * 5000
+    path = tmp_path / "upload.bin"
+    size, digest = asyncio.run(save_upload(UploadFile(io.BytesIO(data)), str(path), max_size=len(data), chunk_size=4096))
+    assert size == len(data) and digest == hashlib.sha256(data).hexdigest()
+    assert path.read_bytes() == data
+
+
+def test_save_upload_stops_at_limit_and_removes_partial_file(tmp_path):
+    stream = CountingStream(b"x" * 100_000)
+    path = tmp_path / "upload.bin"
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(save_upload(UploadFile(stream), str(path), max_size=10_000, chunk_size=4096))
+    assert stream.bytes_read <= 10_000 + 4096
+    assert not path.exists()
+
+
+def test_save_upload_rejects_known_size_without_reading(tmp_path):
+    stream = CountingStream(b"x" * 100)
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(save_upload(UploadFile(stream, size=100), str(tmp_path / "upload.bin"), max_size=10))
+    assert stream.bytes_read == 0
+
+
+def test_upload_document_returns_413_over_max_file_size(tmp_path, monkeypatch):
+    monkeypatch.setattr(knowledge, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "max_file_size", 1000)
+    user = User(id="u1", username="tester")
+    kb = asyncio.run(knowledge.create_knowledge_base(
+        knowledge.CreateKnowledgeBaseRequest(name="kb", embedding_model="hashing-128"), current_user=user))["data"]
+    upload = UploadFile(io.BytesIO(b"a" * 5000), filename="big.txt")
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(knowledge.upload_document(kb["id"], file=upload, current_user=user))
+    assert error.value.status_code == 413
+    assert list(tmp_path.iterdir()) == []